@@ -0,0 +1,96 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+'''
+A micro-benchmark of serializer dispatch.
+
+Times serialize.serialize() on every node of a large generated sheet,
+against the chain of isinstance() tests it used to make, and then the
+serialization of the whole sheet.
+'''
+
+import functools
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir))
+
+import generate
+from css import css, serialize
+
+def chain(obj, printer=str):
+    '''The isinstance() dispatch that the type table replaced.'''
+    if isinstance(obj, css.Hexcolor):
+        return serialize.serialize_Hexcolor(obj, printer)
+    elif isinstance(obj, css.Color):
+        return serialize.serialize_Color(obj, printer)
+    elif isinstance(obj, css.Function):
+        return serialize.serialize_Function(obj, printer)
+    elif isinstance(obj, css.Uri):
+        return serialize.serialize_Uri(obj, printer)
+    elif isinstance(obj, css.String):
+        return serialize.serialize_String(obj, printer)
+    elif isinstance(obj, css.Ident):
+        return serialize.serialize_Ident(obj, printer)
+    elif isinstance(obj, css.Term):
+        return serialize.serialize_Term(obj, printer)
+    elif isinstance(obj, css.Expression):
+        return serialize.serialize_Expression(obj, printer)
+    elif isinstance(obj, css.Declaration):
+        return serialize.serialize_Declaration(obj, printer)
+    elif isinstance(obj, css.Ruleset):
+        return serialize.serialize_Ruleset(obj, printer)
+    elif isinstance(obj, css.Charset):
+        return serialize.serialize_Charset(obj, printer)
+    elif isinstance(obj, css.Page):
+        return serialize.serialize_Page(obj, printer)
+    elif isinstance(obj, css.Media):
+        return serialize.serialize_Media(obj, printer)
+    elif isinstance(obj, css.Import):
+        return serialize.serialize_Import(obj, printer)
+    elif isinstance(obj, css.Stylesheet):
+        return serialize.serialize_Stylesheet(obj, printer)
+    else:
+        return printer(obj)
+
+def best(function, repeat):
+    return min(timeit.repeat(function, number=1, repeat=repeat))
+
+def main(rules, repeat):
+    sheet = generate.stylesheet(rules)
+    # leaves first, so that the cost measured is mostly dispatch
+    nodes = [x for x in css.walk(sheet)
+             if not isinstance(x, (css.Stylesheet, css.Ruleset))]
+
+    # Each run gets a printer of its own, so that none of the text
+    # cached by an earlier run is reused.
+    def run(dispatch):
+        def nodes_only():
+            printer = functools.partial(unicode)
+            for x in nodes:
+                dispatch(x, printer)
+        return nodes_only
+
+    assert serialize.serialize(sheet) == chain(sheet)
+
+    t_chain = best(run(chain), repeat)
+    t_table = best(run(serialize.serialize), repeat)
+    t_sheet = best(lambda: serialize.serialize(
+        sheet, functools.partial(unicode)), repeat)
+
+    print '%d rules, %d nodes dispatched' % (rules, len(nodes))
+    print 'isinstance chain: %8.3f ms' % (t_chain * 1000,)
+    print 'type table:       %8.3f ms  (%.2fx)' % (t_table * 1000,
+                                                   t_chain / t_table)
+    print 'whole sheet:      %8.3f ms' % (t_sheet * 1000,)
+
+if '__main__' == __name__:
+    from optparse import OptionParser
+    opts = OptionParser("usage: %prog [options]")
+    opts.add_option('-n', '--rules', type='int', default=5000,
+                    help='number of rulesets in the generated sheet')
+    opts.add_option('-r', '--repeat', type='int', default=5,
+                    help='number of timing runs; the best is reported')
+
+    options, args = opts.parse_args()
+    main(options.rules, options.repeat)
@@ -0,0 +1,209 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+'''
+The benchmark suite: lexing, parsing and serialization throughput,
+memory per rule and cold start time.
+
+Runs over the stylesheets in benchmarks/corpus, or the given files, and
+the synthetic inputs of generate.py.  For each input it measures
+
+  - lex:       tokens per second from csslex
+  - parse:     bytes per second through parse.parse(), lexing included
+  - serialize: bytes per second of serialize.serialize() output
+  - memory:    bytes of syntax tree per ruleset, not counting the
+               source text it keeps
+
+and once, the time to start a new interpreter, import the package and
+parse a rule.  The results are printed and, with --output, written as
+JSON.  With --compare, they are compared with the JSON of an earlier
+run, e.g. of another revision, and any measure worse by more than
+--threshold is reported as a regression, with exit status 1.
+'''
+
+import functools
+import gc
+import glob
+import json
+import os
+import subprocess
+import sys
+import timeit
+import types
+
+root = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir)
+sys.path.insert(0, root)
+
+import generate
+from css import css, csslex, parse, serialize
+
+corpus = os.path.join(os.path.dirname(__file__), 'corpus')
+
+# measure => whether more is better
+measures = (('lex_tokens_per_s', True),
+            ('parse_bytes_per_s', True),
+            ('serialize_bytes_per_s', True),
+            ('memory_per_rule', False))
+
+def best(function, repeat):
+    return min(timeit.repeat(function, number=1, repeat=repeat))
+
+def tokens(data):
+    '''Returns the number of tokens in data.'''
+    lexer = csslex.lex()
+    lexer.input(data)
+    n = 0
+    while lexer.token():
+        n += 1
+    return n
+
+def tree_size(stylesheet, data):
+    '''
+    Returns the bytes taken by the objects of a syntax tree, less the
+    source text.
+    '''
+    skip = (type, types.ModuleType, types.FunctionType,
+            types.BuiltinFunctionType)
+    seen, pending, total = set([id(data)]), [stylesheet], 0
+    while pending:
+        x = pending.pop()
+        if id(x) in seen or isinstance(x, skip):
+            continue
+        seen.add(id(x))
+        total += sys.getsizeof(x)
+        pending.extend(gc.get_referents(x))
+    return total
+
+def rulesets(stylesheet):
+    return len([x for x in css.walk(stylesheet)
+                if isinstance(x, (css.Ruleset, css.Page))])
+
+def measure(data, repeat):
+    '''Returns the measures of one input.'''
+    n_tokens = tokens(data)
+    t_lex = best(lambda: tokens(data), repeat)
+    t_parse = best(lambda: parse.parse(data), repeat)
+
+    stylesheet = parse.parse(data)
+    n_rules = rulesets(stylesheet)
+    memory = tree_size(stylesheet, data)
+    # Time the serializer itself, not a copy of the source, with a new
+    # printer each run so that nothing cached is reused.
+    stylesheet.discard_source()
+    n_output = len(serialize.serialize(stylesheet, unicode))
+    t_serialize = best(lambda: serialize.serialize(
+        stylesheet, functools.partial(unicode)), repeat)
+
+    return {'bytes': len(data), 'tokens': n_tokens, 'rulesets': n_rules,
+            'lex_tokens_per_s': n_tokens / t_lex,
+            'parse_bytes_per_s': len(data) / t_parse,
+            'serialize_bytes_per_s': n_output / t_serialize,
+            'memory_per_rule': memory / max(n_rules, 1)}
+
+def cold_start(repeat):
+    '''
+    Returns the time taken by a new interpreter to import the package
+    and parse a rule.
+    '''
+    script = ('import sys; sys.path.insert(0, %r); from css import parse; '
+              'parse.parse(u"a { color: red }")' % (root,))
+    null = open(os.devnull, 'w')
+    try:
+        return best(lambda: subprocess.call([sys.executable, '-c', script],
+                                            stdout=null, stderr=null),
+                    repeat)
+    finally:
+        null.close()
+
+def revision():
+    '''Returns the git revision of the tree, if any.'''
+    try:
+        p = subprocess.Popen(['git', 'rev-parse', 'HEAD'], cwd=root,
+                             stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        out = p.communicate()[0].strip()
+        return p.returncode == 0 and out or None
+    except OSError:
+        return None
+
+def run(filenames, repeat):
+    '''Runs the suite and returns its results.'''
+    inputs = {}
+    for filename in filenames:
+        data = open(filename, 'rb').read().decode('utf-8')
+        inputs[os.path.basename(filename)] = measure(data, repeat)
+    for name, generator in generate.synthetic:
+        inputs[name] = measure(generator(), repeat)
+    return {'revision': revision(), 'python': sys.version.split()[0],
+            'repeat': repeat, 'cold_start': cold_start(repeat),
+            'inputs': inputs}
+
+def report(results):
+    print '%-20s %9s %8s %12s %12s %12s %9s' % (
+        'input', 'bytes', 'rules', 'lex tok/s', 'parse MB/s', 'ser MB/s',
+        'B/rule')
+    for name in sorted(results['inputs']):
+        x = results['inputs'][name]
+        print '%-20s %9d %8d %12.0f %12.3f %12.3f %9.0f' % (
+            name, x['bytes'], x['rulesets'], x['lex_tokens_per_s'],
+            x['parse_bytes_per_s'] / 1e6, x['serialize_bytes_per_s'] / 1e6,
+            x['memory_per_rule'])
+    print 'cold start: %.3f s' % (results['cold_start'],)
+
+def compare(old, new, threshold):
+    '''
+    Prints the change in each measure from the old results to the new,
+    and returns the regressions: changes for the worse by more than
+    the threshold, a fraction.
+    '''
+    regressions = []
+    changes = [('cold_start', 'cold_start', old['cold_start'],
+                new['cold_start'], False)]
+    for name in sorted(new['inputs']):
+        if name in old['inputs']:
+            for key, higher in measures:
+                changes.append((name, key, old['inputs'][name][key],
+                                new['inputs'][name][key], higher))
+    print 'compared with %s' % (old.get('revision') or 'earlier run',)
+    for name, key, before, after, higher in changes:
+        change = (after - before) / before
+        worse = -change if higher else change
+        flag = ''
+        if worse > threshold:
+            flag = '  REGRESSION'
+            regressions.append((name, key, change))
+        print '%-20s %-22s %+7.1f%%%s' % (name, key, change * 100, flag)
+    return regressions
+
+
+if '__main__' == __name__:
+    from optparse import OptionParser
+    opts = OptionParser("usage: %prog [options] [filename...]")
+    opts.add_option('-r', '--repeat', type='int', default=3,
+                    help='number of timing runs; the best is reported')
+    opts.add_option('-o', '--output', metavar='FILE',
+                    help='write the results to FILE as JSON')
+    opts.add_option('-c', '--compare', metavar='FILE',
+                    help='compare with the JSON results in FILE')
+    opts.add_option('-t', '--threshold', type='float', default=0.1,
+                    help='fraction by which a measure may get worse '
+                         '(default 0.1)')
+
+    options, args = opts.parse_args()
+    results = run(args or sorted(glob.glob(os.path.join(corpus, '*.css'))),
+                  options.repeat)
+    report(results)
+
+    if options.output:
+        f = open(options.output, 'w')
+        try:
+            json.dump(results, f, indent=2, sort_keys=True)
+        finally:
+            f.close()
+
+    if options.compare:
+        f = open(options.compare)
+        try:
+            old = json.load(f)
+        finally:
+            f.close()
+        if compare(old, results, options.threshold):
+            sys.exit(1)
@@ -0,0 +1,103 @@
+# -*- coding: utf-8 -*-
+'''
+Generators of synthetic stylesheets for the benchmarks.
+'''
+
+import os
+import sys
+import base64
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir))
+
+from css import css
+
+__all__ = ('stylesheet', 'small_rules', 'large_block', 'selector_lists',
+           'long_strings', 'data_uris', 'synthetic')
+
+properties = (u'color', u'margin', u'font', u'background', u'border',
+              u'padding', u'width', u'line-height')
+
+def value(n):
+    '''Returns one of a rotating set of values of every kind of term.'''
+    kind = n % 8
+    if 0 == kind:
+        return css.Hexcolor(u'#%06x' % (n * 2654435761 % 0xffffff))
+    elif 1 == kind:
+        return css.Expression([css.Term(u'0'), css.Term(u'%dpx' % (n % 40)),
+                               css.Term(u'1.5em'), css.Term(u'auto')])
+    elif 2 == kind:
+        return css.Expression([css.Term(u'12px'), css.Term(u'1.5'),
+                               css.Ident(u'serif')], [u'/', u' '])
+    elif 3 == kind:
+        return css.Expression([css.Ident(u'white'),
+                               css.Uri(u'images/bg%d.png' % n),
+                               css.Ident(u'no-repeat')])
+    elif 4 == kind:
+        return css.Expression([css.Term(u'1px'), css.Ident(u'solid'),
+                               css.Function(u'rgb', css.Expression(
+                                   [css.Term(u'10'), css.Term(u'20'),
+                                    css.Term(u'30')], [u',', u',']))])
+    elif 5 == kind:
+        return css.Term(u'%dem' % (n % 5), u'-')
+    elif 6 == kind:
+        return css.Term(u'%d%%' % (n % 100))
+    return css.String(u'quoted "value" %d' % n)
+
+def stylesheet(rules=1000, declarations=8, selectors=2):
+    '''Builds a stylesheet of rulesets with the given shape.'''
+    statements = []
+    n = 0
+    for i in xrange(rules):
+        group = [u'div.c%d > p#i%d a:hover' % (i, i + j)
+                 for j in xrange(selectors)]
+        decls = []
+        for j in xrange(declarations):
+            decls.append(css.Declaration(
+                css.Ident(properties[j % len(properties)]), value(n),
+                0 == n % 13))
+            n += 1
+        statements.append(css.Ruleset(group, decls))
+    return css.Stylesheet(statements)
+
+# Generators of stylesheet text, in shapes that stress different parts
+# of the lexer and parser.
+
+def small_rules(n=5000):
+    '''Returns many small rulesets of one declaration each.'''
+    return u''.join([u'.c%d { color: #%03x }\n' % (i, i % 0xfff)
+                     for i in xrange(n)])
+
+def large_block(n=5000):
+    '''Returns one ruleset with a huge declaration block.'''
+    decls = [u'  %s: %dpx;\n' % (properties[i % len(properties)], i)
+             for i in xrange(n)]
+    return u'body {\n%s}\n' % (u''.join(decls),)
+
+def selector_lists(n=250, selectors=20):
+    '''Returns rulesets with long lists of deep selectors.'''
+    rules = []
+    for i in xrange(n):
+        group = [u'html body div#m%d > ul.nav li + li a.x%d:hover' % (i, j)
+                 for j in xrange(selectors)]
+        rules.append(u'%s { margin: 0 }\n' % (u',\n'.join(group),))
+    return u''.join(rules)
+
+def long_strings(n=100, length=5000):
+    '''Returns rulesets with long quoted strings.'''
+    text = (u'lorem \\"ipsum\\" dolor ' * (length // 20 + 1))[:length]
+    return u''.join([u'.q%d:before { content: "%s" }\n' % (i, text)
+                     for i in xrange(n)])
+
+def data_uris(n=50, length=20000):
+    '''Returns rulesets with large data: URIs.'''
+    data = base64.b64encode(''.join([chr(i * 7 % 256)
+                                     for i in xrange(length * 3 // 4)]))
+    return u''.join([u'.i%d { background: url(data:image/png;base64,%s) }\n'
+                     % (i, data) for i in xrange(n)])
+
+# name => generator, in the order they are run
+synthetic = (('small_rules', small_rules),
+             ('large_block', large_block),
+             ('selector_lists', selector_lists),
+             ('long_strings', long_strings),
+             ('data_uris', data_uris))
@@ -17,6 +17,10 @@ for rule in parse(data):
 
 '''
 
-__all__ = ('csslex', 'cssyacc', 'css', 'serialize', 'parse')
+__all__ = ('csslex', 'cssyacc', 'css', 'serialize', 'parse', 'index',
+           'numeric', 'colors', 'minify', 'shorthand', 'optimize',
+           'sourcemap', 'inline', 'fetch', 'background',
+           'stats', 'events', 'rulefilter', 'selector', 'document',
+           'prune', 'critical', 'watch')
 
 
@@ -0,0 +1,99 @@
+# -*- coding: utf-8 -*-
+'''
+Parsing and loading of stylesheets in the background.
+
+A `Pool` parses stylesheets in worker processes, so that parsing holds
+up neither the calling thread nor, through the interpreter lock, any
+other thread of the process.  It loads stylesheets and their imports in
+worker threads, which mostly wait on the network.  Each call returns at
+once with an AsyncResult, and takes an optional callback, which is
+called with the result from a thread of the pool:
+
+    pool = background.Pool(processes=4, loads=16)
+    result = pool.load('http://example.com/site.css')
+    ...
+    stylesheet = result.get(timeout=10)
+
+At most `processes` stylesheets are parsed and `loads` stylesheets are
+loaded at once; further calls wait their turn.
+'''
+
+import multiprocessing
+from multiprocessing.pool import ThreadPool
+import inline
+
+__all__ = ('Pool',)
+
+class Pool(object):
+    '''
+    Worker processes that parse stylesheets and worker threads that
+    load them.  `fetch` and `fetchers` are passed on to inline.load().
+    '''
+    def __init__(self, processes=None, loads=8, fetch=inline.read_url,
+                 fetchers=4):
+        self.fetch = fetch
+        self.fetchers = fetchers
+        self._processes = multiprocessing.Pool(processes)
+        self._threads = ThreadPool(loads)
+        self._closed = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+        self.join()
+
+    def _parse(self, data):
+        # Called from a worker thread, which waits on a worker process.
+        return self._processes.apply(inline.parse_data, (data,))
+
+    def _inline(self, stylesheet, base):
+        return inline.inline(stylesheet, base, self.fetch, self.fetchers,
+                             self._parse)
+
+    def _load(self, url):
+        return inline.load(url, self.fetch, self.fetchers, self._parse)
+
+    def parse(self, data, callback=None):
+        '''
+        Parses the content of a stylesheet, bytes or unicode, in a
+        worker process.  Returns an AsyncResult for the stylesheet.
+        '''
+        return self._processes.apply_async(inline.parse_data, (data,),
+                                           callback=callback)
+
+    def inline(self, stylesheet, base, callback=None):
+        '''
+        Inlines the imports of a stylesheet read from the URL base, as
+        inline.inline() does.  Returns an AsyncResult for the result.
+        '''
+        return self._threads.apply_async(self._inline, (stylesheet, base),
+                                         callback=callback)
+
+    def load(self, url, callback=None):
+        '''
+        Fetches the stylesheet at url and its imports, parses them and
+        inlines the imports, as inline.load() does.  Returns an
+        AsyncResult for the result.
+        '''
+        return self._threads.apply_async(self._load, (url,),
+                                         callback=callback)
+
+    def close(self):
+        '''Lets the work already given finish, and accepts no more.'''
+        self._closed = True
+        self._threads.close()
+
+    def join(self):
+        '''Waits for the workers to exit, after close() or terminate().'''
+        self._threads.join()
+        # Loads still running needed the processes until now.
+        if self._closed:
+            self._processes.close()
+        self._processes.join()
+
+    def terminate(self):
+        '''Stops the workers at once, abandoning any work left.'''
+        self._threads.terminate()
+        self._processes.terminate()
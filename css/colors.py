@@ -0,0 +1,370 @@
+# -*- coding: utf-8 -*-
+'''
+Colors: reading them from terms, writing them out, and transforming
+every color in a stylesheet at once.
+
+A color may be written as a Hexcolor, an rgb() or rgba() Function, or
+a named Ident; `from_term()` normalizes all of them to a css.Color.
+The batch API collects the colors beneath a syntax object into a NumPy
+array, transforms them with array operations, and stores only the
+changed colors back into the tree.
+
+The batch API requires NumPy.
+
+Example:
+
+    c = colors.extract(stylesheet)
+    c.remap({u'#336699': u'#224466'})
+    c.contrast(1.2)
+    c.shortest()
+    c.store()
+'''
+
+import re
+import css
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+__all__ = ('from_term', 'parse', 'text', 'Colors', 'extract', 'NAMES')
+
+# The CSS3 color keywords.
+NAMES = {
+    u'aliceblue': 0xf0f8ff, u'antiquewhite': 0xfaebd7, u'aqua': 0x00ffff,
+    u'aquamarine': 0x7fffd4, u'azure': 0xf0ffff, u'beige': 0xf5f5dc,
+    u'bisque': 0xffe4c4, u'black': 0x000000, u'blanchedalmond': 0xffebcd,
+    u'blue': 0x0000ff, u'blueviolet': 0x8a2be2, u'brown': 0xa52a2a,
+    u'burlywood': 0xdeb887, u'cadetblue': 0x5f9ea0, u'chartreuse': 0x7fff00,
+    u'chocolate': 0xd2691e, u'coral': 0xff7f50, u'cornflowerblue': 0x6495ed,
+    u'cornsilk': 0xfff8dc, u'crimson': 0xdc143c, u'cyan': 0x00ffff,
+    u'darkblue': 0x00008b, u'darkcyan': 0x008b8b, u'darkgoldenrod': 0xb8860b,
+    u'darkgray': 0xa9a9a9, u'darkgreen': 0x006400, u'darkgrey': 0xa9a9a9,
+    u'darkkhaki': 0xbdb76b, u'darkmagenta': 0x8b008b,
+    u'darkolivegreen': 0x556b2f, u'darkorange': 0xff8c00,
+    u'darkorchid': 0x9932cc, u'darkred': 0x8b0000, u'darksalmon': 0xe9967a,
+    u'darkseagreen': 0x8fbc8f, u'darkslateblue': 0x483d8b,
+    u'darkslategray': 0x2f4f4f, u'darkslategrey': 0x2f4f4f,
+    u'darkturquoise': 0x00ced1, u'darkviolet': 0x9400d3,
+    u'deeppink': 0xff1493, u'deepskyblue': 0x00bfff, u'dimgray': 0x696969,
+    u'dimgrey': 0x696969, u'dodgerblue': 0x1e90ff, u'firebrick': 0xb22222,
+    u'floralwhite': 0xfffaf0, u'forestgreen': 0x228b22, u'fuchsia': 0xff00ff,
+    u'gainsboro': 0xdcdcdc, u'ghostwhite': 0xf8f8ff, u'gold': 0xffd700,
+    u'goldenrod': 0xdaa520, u'gray': 0x808080, u'green': 0x008000,
+    u'greenyellow': 0xadff2f, u'grey': 0x808080, u'honeydew': 0xf0fff0,
+    u'hotpink': 0xff69b4, u'indianred': 0xcd5c5c, u'indigo': 0x4b0082,
+    u'ivory': 0xfffff0, u'khaki': 0xf0e68c, u'lavender': 0xe6e6fa,
+    u'lavenderblush': 0xfff0f5, u'lawngreen': 0x7cfc00,
+    u'lemonchiffon': 0xfffacd, u'lightblue': 0xadd8e6,
+    u'lightcoral': 0xf08080, u'lightcyan': 0xe0ffff,
+    u'lightgoldenrodyellow': 0xfafad2, u'lightgray': 0xd3d3d3,
+    u'lightgreen': 0x90ee90, u'lightgrey': 0xd3d3d3, u'lightpink': 0xffb6c1,
+    u'lightsalmon': 0xffa07a, u'lightseagreen': 0x20b2aa,
+    u'lightskyblue': 0x87cefa, u'lightslategray': 0x778899,
+    u'lightslategrey': 0x778899, u'lightsteelblue': 0xb0c4de,
+    u'lightyellow': 0xffffe0, u'lime': 0x00ff00, u'limegreen': 0x32cd32,
+    u'linen': 0xfaf0e6, u'magenta': 0xff00ff, u'maroon': 0x800000,
+    u'mediumaquamarine': 0x66cdaa, u'mediumblue': 0x0000cd,
+    u'mediumorchid': 0xba55d3, u'mediumpurple': 0x9370db,
+    u'mediumseagreen': 0x3cb371, u'mediumslateblue': 0x7b68ee,
+    u'mediumspringgreen': 0x00fa9a, u'mediumturquoise': 0x48d1cc,
+    u'mediumvioletred': 0xc71585, u'midnightblue': 0x191970,
+    u'mintcream': 0xf5fffa, u'mistyrose': 0xffe4e1, u'moccasin': 0xffe4b5,
+    u'navajowhite': 0xffdead, u'navy': 0x000080, u'oldlace': 0xfdf5e6,
+    u'olive': 0x808000, u'olivedrab': 0x6b8e23, u'orange': 0xffa500,
+    u'orangered': 0xff4500, u'orchid': 0xda70d6, u'palegoldenrod': 0xeee8aa,
+    u'palegreen': 0x98fb98, u'paleturquoise': 0xafeeee,
+    u'palevioletred': 0xdb7093, u'papayawhip': 0xffefd5,
+    u'peachpuff': 0xffdab9, u'peru': 0xcd853f, u'pink': 0xffc0cb,
+    u'plum': 0xdda0dd, u'powderblue': 0xb0e0e6, u'purple': 0x800080,
+    u'red': 0xff0000, u'rosybrown': 0xbc8f8f, u'royalblue': 0x4169e1,
+    u'saddlebrown': 0x8b4513, u'salmon': 0xfa8072, u'sandybrown': 0xf4a460,
+    u'seagreen': 0x2e8b57, u'seashell': 0xfff5ee, u'sienna': 0xa0522d,
+    u'silver': 0xc0c0c0, u'skyblue': 0x87ceeb, u'slateblue': 0x6a5acd,
+    u'slategray': 0x708090, u'slategrey': 0x708090, u'snow': 0xfffafa,
+    u'springgreen': 0x00ff7f, u'steelblue': 0x4682b4, u'tan': 0xd2b48c,
+    u'teal': 0x008080, u'thistle': 0xd8bfd8, u'tomato': 0xff6347,
+    u'turquoise': 0x40e0d0, u'violet': 0xee82ee, u'wheat': 0xf5deb3,
+    u'white': 0xffffff, u'whitesmoke': 0xf5f5f5, u'yellow': 0xffff00,
+    u'yellowgreen': 0x9acd32,
+    }
+
+# The shortest name of each named color, for writing colors out.
+_shortest_names = {}
+for _name, _rgb in sorted(NAMES.items()):
+    if len(_name) < len(_shortest_names.get(_rgb, _name + u' ')):
+        _shortest_names[_rgb] = _name
+del _name, _rgb
+
+# Properties whose values may contain color keywords.  Hex and
+# functional colors are recognized in any property, but an identifier
+# such as "tan" is only taken for a color here.
+re_color_property = re.compile(
+    r'(?:.*-)?color$|'
+    r'(?:-\w+-)?(?:background|outline|column-rule|text-decoration|'
+    r'box-shadow|text-shadow|fill|stroke|border(?:-top|-right|-bottom|'
+    r'-left|-block(?:-start|-end)?|-inline(?:-start|-end)?)?)$')
+
+# rgb() and rgba() colors written out as strings.
+re_function = re.compile(r'(rgba?)\((.*)\)$', re.I)
+
+def _channel(term, scale):
+    if not isinstance(term, css.Term) or term.number is None:
+        return None
+    if u'%' == term.unit:
+        value = term.number * 255 / 100.
+    elif u'' == term.unit:
+        value = term.number * scale
+    else:
+        return None
+    if u'-' == term.unary_operator:
+        value = -value
+    return int(min(255, max(0, value + 0.5)))
+
+def _function(obj):
+    name = obj.name.lower()
+    if name not in (u'rgb', u'rgba'):
+        return None
+    parameters = obj.parameters
+    if not isinstance(parameters, css.Expression):
+        return None
+    if [x for x in parameters.operators if x != u',']:
+        return None
+    terms = parameters.terms
+    if len(terms) != len(name):
+        return None
+    rgba = [_channel(x, 1) for x in terms[:3]]
+    if 4 == len(terms):
+        rgba.append(_channel(terms[3], 255))
+    else:
+        rgba.append(255)
+    if None in rgba:
+        return None
+    return css.Color(form='rgb', *rgba)
+
+def from_term(term, property=None):
+    '''
+    Returns the css.Color for a term, or None if the term is not a color.
+
+    Named colors are only recognized when the name of the property they
+    belong to is given and can take a color.
+    '''
+    if isinstance(term, css.Color):
+        return term
+    elif isinstance(term, css.Hexcolor):
+        digits = term.value
+        if 3 == len(digits):
+            digits = u''.join([x + x for x in digits])
+        elif 6 != len(digits):
+            return None
+        rgb = int(digits, 16)
+        return css.Color(rgb >> 16, (rgb >> 8) & 0xff, rgb & 0xff,
+                         form='hex')
+    elif isinstance(term, css.Function):
+        return _function(term)
+    elif isinstance(term, css.Ident) and property:
+        if not re.match(re_color_property, property.lower()):
+            return None
+        name = term.name.lower()
+        if u'transparent' == name:
+            return css.Color(0, 0, 0, 0, form='name')
+        if name in NAMES:
+            rgb = NAMES[name]
+            return css.Color(rgb >> 16, (rgb >> 8) & 0xff, rgb & 0xff,
+                             form='name')
+    return None
+
+def parse(s):
+    '''
+    Returns the css.Color for a string such as u'#fc0', u'red' or
+    u'rgba(255,204,0,.5)', or None if the string is not a color.
+    '''
+    s = s.strip()
+    if s.startswith(u'#'):
+        return from_term(css.Hexcolor(s))
+    m = re_function.match(s)
+    if m:
+        terms = []
+        for x in m.group(2).split(u','):
+            x = x.strip()
+            if x[:1] in (u'-', u'+'):
+                terms.append(css.Term(x[1:], x[0]))
+            else:
+                terms.append(css.Term(x))
+        parameters = css.Expression(terms, [u','] * (len(terms) - 1))
+        return from_term(css.Function(m.group(1), parameters))
+    return from_term(css.Ident(s), u'color')
+
+def _alpha(alpha):
+    '''
+    Writes an alpha channel in 0..255 as the shortest fraction that
+    reads back as the same channel.
+    '''
+    for digits in (1, 2):
+        value = round(alpha / 255., digits)
+        if alpha == int(value * 255 + 0.5):
+            return css.format_number(value)
+    # Channels are 1/255 apart, so three digits always tell them apart.
+    return css.format_number(round(alpha / 255., 3))
+
+def text(color):
+    '''Writes a css.Color in its form, or its shortest form.'''
+    r, g, b, a = color.rgba
+    if 255 != a:
+        if 0 == a and (0, 0, 0) == (r, g, b) and color.form != 'rgb':
+            return u'transparent'
+        return u'rgba(%d,%d,%d,%s)' % (r, g, b, _alpha(a))
+
+    if 'rgb' == color.form:
+        return u'rgb(%d,%d,%d)' % (r, g, b)
+
+    rgb = (r << 16) | (g << 8) | b
+    name = _shortest_names.get(rgb)
+    if 'name' == color.form and name:
+        return name
+
+    h = u'%06x' % rgb
+    if h[0] == h[1] and h[2] == h[3] and h[4] == h[5]:
+        h = h[0] + h[2] + h[4]
+    h = u'#' + h
+    if color.form is None and name and len(name) < len(h):
+        return name
+    return h
+
+def _sites(obj):
+    '''
+    Generates (container, key, color) for each color beneath obj.
+
+    The container is a Declaration, Function or Expression, and `key`
+    is the attribute name or term index of the color.
+    '''
+    for decl in css.walk(obj):
+        if not isinstance(decl, css.Declaration):
+            continue
+        property = decl.property.name
+        stack = [(decl, 'value', decl.value)]
+        while stack:
+            container, key, term = stack.pop()
+            color = from_term(term, property)
+            if color is not None:
+                yield container, key, color
+            elif isinstance(term, css.Expression):
+                for i in range(len(term.terms) - 1, -1, -1):
+                    stack.append((term, i, term.terms[i]))
+            elif isinstance(term, css.Function):
+                stack.append((term, 'parameters', term.parameters))
+
+def _pack(rgba):
+    '''Packs an N*4 array of channels into one integer per color.'''
+    rgba = rgba.astype(numpy.uint32)
+    return ((rgba[:, 0] << 24) | (rgba[:, 1] << 16) |
+            (rgba[:, 2] << 8) | rgba[:, 3])
+
+class Colors(object):
+    '''
+    The colors beneath a syntax object.
+
+    `rgba` is an N*4 integer array of red, green, blue and alpha in
+    document order, and `forms` the notation to write each color in.
+    Transform them with the methods below or directly, then call
+    `store()`.
+    '''
+    def __init__(self, sites):
+        if numpy is None:
+            raise ImportError, 'css.colors requires NumPy.'
+        self.sites = sites
+        self.rgba = numpy.array([x[2].rgba for x in sites],
+                                dtype=int).reshape((len(sites), 4))
+        self.forms = numpy.array([x[2].form for x in sites], dtype=object)
+        self._rgba = self.rgba.copy()
+        self._forms = self.forms.copy()
+
+    def __repr__(self):
+        return '<Colors of %d terms>' % (len(self.sites),)
+
+    def __len__(self):
+        return len(self.sites)
+
+    def apply(self, function):
+        '''
+        Replaces the colors with `function(rgba)`.
+
+        The function receives and returns an N*4 array; results are
+        rounded and clipped to 0..255.
+        '''
+        rgba = numpy.asarray(function(self.rgba.astype(float)))
+        self.rgba = numpy.clip(numpy.round(rgba), 0, 255).astype(int)
+
+    def remap(self, mapping):
+        '''
+        Replaces colors by a theme mapping of old color => new color.
+
+        Keys and values are css.Color objects or strings like u'#fc0'
+        or u'rgb(255,204,0)'; a string that is not a color raises
+        ValueError.
+        '''
+        if not mapping:
+            return
+        pairs = []
+        for old, new in mapping.items():
+            pair = []
+            for value in (old, new):
+                color = value
+                if not isinstance(color, css.Color):
+                    color = parse(value)
+                    if color is None:
+                        raise ValueError, 'Not a color: %r' % (value,)
+                pair.append(color.rgba)
+            pairs.append(pair)
+        old = numpy.array([x[0] for x in pairs], dtype=int)
+        new = numpy.array([x[1] for x in pairs], dtype=int)
+
+        keys = _pack(old)
+        order = numpy.argsort(keys)
+        keys, new = keys[order], new[order]
+        packed = _pack(self.rgba)
+        position = numpy.clip(numpy.searchsorted(keys, packed),
+                              0, len(keys) - 1)
+        found = keys[position] == packed
+        self.rgba[found] = new[position[found]]
+
+    def contrast(self, factor, pivot=127.5):
+        '''
+        Scales the distance of each channel from a pivot by a factor;
+        a factor above 1 increases contrast.  Alpha is unchanged.
+        '''
+        def adjust(rgba):
+            rgba[:, :3] = (rgba[:, :3] - pivot) * factor + pivot
+            return rgba
+        self.apply(adjust)
+
+    def shortest(self):
+        '''Writes every color in its shortest notation.'''
+        self.forms[:] = None
+
+    def store(self):
+        '''
+        Writes changed colors back into the tree.
+
+        Returns the number of colors modified.
+        '''
+        changed = ((self.rgba != self._rgba).any(axis=1) |
+                   (self.forms != self._forms))
+        indices = numpy.flatnonzero(changed)
+        for i in indices:
+            container, key, old = self.sites[i]
+            color = css.Color(form=self.forms[i],
+                              *[int(x) for x in self.rgba[i]])
+            if isinstance(key, int):
+                container[key] = color
+            else:
+                setattr(container, key, color)
+            self.sites[i] = (container, key, color)
+        self._rgba = self.rgba.copy()
+        self._forms = self.forms.copy()
+        return len(indices)
+
+def extract(obj):
+    '''Collects the colors beneath a syntax object.'''
+    return Colors(list(_sites(obj)))
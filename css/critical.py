@@ -0,0 +1,226 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+'''
+Extraction of the rules needed to render the top of a page.
+
+The part of an HTML document shown before any scrolling is marked with
+an attribute, by default `data-above-fold`, on the elements containing
+it.  `split()` divides a stylesheet into two:
+
+  - the critical sheet, of the rulesets with a selector matching an
+    element in the marked part or one of the elements containing it,
+    such as <body>, whose inherited properties reach into it; with the
+    @media rules around them and the @charset rule
+
+  - the deferred sheet, of everything else: the other rulesets, with
+    their @media rules, and the @import and @page rules
+
+    critical, deferred = split(stylesheet, document.read('index.html'))
+
+The critical sheet is meant to be inlined in the page, and the deferred
+one loaded after it.  Rulesets keep their order within each sheet, but
+a rule of the deferred sheet now follows the critical ones; where an
+element below the fold is matched by rules of both that set the same
+property with the same specificity, the cascade may differ from that
+of the whole stylesheet.
+
+Selectors are matched as browsers do, from the right, against only the
+rulesets whose rightmost simple selector names the element's id, one
+of its classes or its tag, or none of them, and that need of its
+ancestors nothing, or an id, class or tag one of them has.  A selector
+is tested in full only once the ids, classes and tags it needs of the
+ancestors are known to be among theirs, so few are.  Pseudo-classes
+other than :first-child are taken to hold, so that a ruleset for e.g.
+a:hover is critical along with the links it is for.
+'''
+
+import sys
+import copy
+import itertools
+import css, document, selector
+
+__all__ = ('region', 'critical_rulesets', 'split')
+
+def region(root, attribute='data-above-fold'):
+    '''
+    Returns the elements of a document in the marked part of it, and
+    those containing them.  Raises ValueError if no element is marked.
+    '''
+    result = []
+    seen = set()
+    for element in document.walk(root):
+        if attribute not in element.attributes:
+            continue
+        ancestor = element.parent
+        while ancestor is not None and id(ancestor) not in seen:
+            seen.add(id(ancestor))
+            result.append(ancestor)
+            ancestor = ancestor.parent
+        for x in document.walk(element):
+            if id(x) not in seen:
+                seen.add(id(x))
+                result.append(x)
+    if not result:
+        raise ValueError, 'No element of the document has %s.' % (attribute,)
+    return result
+
+def _rulesets(stylesheet):
+    for statement in stylesheet.statements:
+        if isinstance(statement, css.Media):
+            for ruleset in statement.rulesets:
+                yield ruleset
+        elif isinstance(statement, css.Ruleset):
+            yield statement
+
+def _element_keys(element):
+    result = [('tag', element.tag)]
+    result.extend([('class', x) for x in element.classes])
+    if element.id is not None:
+        result.append(('id', element.id))
+    return result
+
+def _ancestor_keys(compounds):
+    '''
+    Returns the tags, ids and classes that the ancestors of an element
+    matched by the selector must have among them.
+    '''
+    result = set()
+    for i in xrange(len(compounds) - 1):
+        # only a simple selector followed by ' ' or '>' is an ancestor
+        if compounds[i + 1].combinator in (u' ', u'>'):
+            result.update([x for x in selector.keys(compounds[i])
+                           if x[0] in ('tag', 'id', 'class')])
+    return frozenset(result)
+
+def _bucket(keys):
+    '''Returns the most selective of the keys of simple selectors.'''
+    for kind in ('id', 'class', 'tag'):
+        for key in keys:
+            if kind == key[0]:
+                return key
+    return None
+
+def critical_rulesets(stylesheet, elements):
+    '''
+    Returns the set of the ids of the rulesets of a stylesheet with a
+    selector matching one of the given elements.  Rulesets with a
+    selector that cannot be read are counted in.
+    '''
+    result = set()
+    # most selective key of the rightmost simple selector =>
+    # most selective key needed of the ancestors =>
+    # [(compounds, keys needed of the ancestors, ruleset)]
+    buckets = {}
+    for ruleset in _rulesets(stylesheet):
+        for text in ruleset.selectors:
+            try:
+                compounds = selector.parse(text)
+            except ValueError:
+                result.add(id(ruleset))
+                continue
+            needed = _ancestor_keys(compounds)
+            bucket = buckets.setdefault(
+                _bucket(selector.keys(compounds[-1])), {})
+            bucket.setdefault(_bucket(needed), []).append(
+                (compounds, needed, ruleset))
+
+    # id(element) => keys of its ancestors
+    ancestors = {}
+    def ancestor_keys(element):
+        parent = element.parent
+        if parent is None or parent.tag is None:
+            return frozenset()
+        try:
+            return ancestors[id(parent)]
+        except KeyError:
+            keys = ancestor_keys(parent).union(_element_keys(parent))
+            ancestors[id(parent)] = keys
+            return keys
+
+    for element in elements:
+        if element.tag is None:
+            continue
+        above = ancestor_keys(element)
+        for key in [None] + _element_keys(element):
+            bucket = buckets.get(key)
+            if bucket is None:
+                continue
+            for ancestor in itertools.chain([None], above):
+                for compounds, needed, ruleset in bucket.get(ancestor, ()):
+                    if (id(ruleset) not in result and needed <= above and
+                            selector.match(compounds, element)):
+                        result.add(id(ruleset))
+    return result
+
+def split(stylesheet, root, attribute='data-above-fold'):
+    '''
+    Returns the (critical, deferred) Stylesheets for the marked part
+    of a document, of copies of the rules of the stylesheet given.
+    '''
+    stylesheet = copy.deepcopy(stylesheet)
+    needed = critical_rulesets(stylesheet, region(root, attribute))
+
+    critical, deferred = [], []
+    for statement in stylesheet.statements:
+        if isinstance(statement, css.Media):
+            now = [x for x in statement.rulesets if id(x) in needed]
+            later = [x for x in statement.rulesets if id(x) not in needed]
+            if not later:
+                critical.append(statement)
+            elif not now:
+                deferred.append(statement)
+            else:
+                critical.append(css.Media(list(statement.media_types), now))
+                deferred.append(css.Media(list(statement.media_types), later))
+        elif isinstance(statement, css.Ruleset) and id(statement) in needed:
+            critical.append(statement)
+        else:
+            deferred.append(statement)
+
+    charset = stylesheet.charset
+    return (css.Stylesheet(critical, charset=copy.deepcopy(charset)),
+            css.Stylesheet(deferred, stylesheet.imports, charset))
+
+
+if '__main__' == __name__:
+    from optparse import OptionParser
+    import parse, serialize
+    opts = OptionParser("usage: %prog [options] stylesheet document")
+    opts.add_option('-a', '--attribute', default='data-above-fold',
+                    help='attribute marking the top of the page '
+                         '(default: %default)')
+    opts.add_option('-o', '--output', metavar='FILE',
+                    help='write the critical rules to FILE, not stdout')
+    opts.add_option('-d', '--deferred', metavar='FILE',
+                    help='write the other rules to FILE')
+    opts.add_option('-m', '--minify', action='store_true', default=False,
+                    help='minify the stylesheets written')
+
+    options, args = opts.parse_args()
+
+    if 2 != len(args):
+        opts.error("a stylesheet and a document must be given")
+
+    if options.minify:
+        import minify
+        encode = minify.encode
+    else:
+        encode = serialize.encode
+
+    stylesheet = parse.parse(parse.read_file(args[0]))
+    try:
+        critical, deferred = split(stylesheet, document.read(args[1]),
+                                   options.attribute)
+    except ValueError, e:
+        opts.error(str(e))
+
+    for sheet, filename in ((critical, options.output),
+                            (deferred, options.deferred)):
+        if filename:
+            f = open(filename, 'wb')
+            try:
+                f.write(encode(sheet))
+            finally:
+                f.close()
+        elif sheet is critical:
+            sys.stdout.write(encode(sheet))
@@ -4,15 +4,93 @@ Classes representing CSS syntactic concepts.
 '''
 
 import re
+import decimal
 import itertools
-import serialize
 
-__all__ = ('Hexcolor', 'Function', 'Uri', 'String', 'Ident',
-           'Term', 'Declaration', 'Ruleset', 'Charset', 'Page',
-           'Media', 'Import', 'Stylesheet')
+__all__ = ('Hexcolor', 'Color', 'Function', 'Uri', 'String', 'Ident',
+           'Term', 'Expression', 'Declaration', 'Ruleset', 'Charset',
+           'Page', 'Media', 'Import', 'Stylesheet', 'walk')
+
+def _adopt(parent, value):
+    '''Makes parent the parent of value, or of each object in value.'''
+    if isinstance(value, SyntaxObject):
+        value.__dict__['_parent'] = parent
+    elif isinstance(value, list):
+        for x in value:
+            if isinstance(x, SyntaxObject):
+                x.__dict__['_parent'] = parent
 
 class SyntaxObject(object):
-    '''An abstract type of syntactic construct.'''
+    '''
+    An abstract type of syntactic construct.
+
+    Each object knows the object it was last placed beneath, and
+    assigning to a public attribute, or adding a child through
+    `append()` or item assignment, calls `changed()`, which discards
+    the serializations cached on the object and every object above it,
+    along with the source text they were parsed from.  Lists modified
+    in place by other means need a call to `changed()` on their owner.
+    '''
+    _parent = None
+    # (printer, text) of the last serialization, if it is cached
+    _cache = None
+    # (input, start, end) of the source text, while it is unmodified
+    _source = None
+    # (input, start, end) of the source text of a statement, for good
+    _origin = None
+
+    def __setattr__(self, name, value):
+        object.__setattr__(self, name, value)
+        if '_' != name[0]:
+            if isinstance(value, (SyntaxObject, list)):
+                _adopt(self, value)
+            if self._cache is not None or self._parent is not None:
+                self.changed()
+
+    def __getstate__(self):
+        # Copies and pickles leave the parent and the cache behind.
+        state = self.__dict__.copy()
+        state.pop('_parent', None)
+        state.pop('_cache', None)
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        for value in state.values():
+            _adopt(self, value)
+
+    def changed(self):
+        '''
+        Discards the cached serializations of this object and of every
+        object above it.
+        '''
+        node = self
+        while node is not None:
+            node.__dict__['_cache'] = None
+            node.__dict__['_source'] = None
+            node = node._parent
+
+    def discard_source(self):
+        '''
+        Discards the source text kept for this object and everything
+        beneath it, so that it is serialized from its syntax alone.
+        '''
+        self.changed()
+        for x in walk(self):
+            x.__dict__['_cache'] = None
+            x.__dict__['_source'] = None
+            x.__dict__['_origin'] = None
+
+    @property
+    def span(self):
+        '''
+        The (start, end) offsets of the text the object was parsed from
+        in its source, or None if it has since been modified.
+        '''
+        if self._source is None:
+            return None
+        return self._source[1:]
+
     def __str__(self):
         '''
         Returns an ASCII string representation.
@@ -29,6 +107,36 @@ class SyntaxObject(object):
         '''
         return self.datum(unicode)
 
+    def children(self):
+        '''Returns the syntax objects directly beneath this one.'''
+        return ()
+
+def walk(obj):
+    '''
+    Generates the given syntax object and every object beneath it,
+    depth first and in document order.
+    '''
+    yield obj
+    for child in obj.children():
+        if isinstance(child, SyntaxObject):
+            for x in walk(child):
+                yield x
+
+re_quantity = re.compile(r'([0-9]*\.?[0-9]+)(.*)$')
+
+def format_number(number):
+    '''
+    Formats a number the way CSS writes it: no exponent, no trailing
+    zeros and no decimal point for whole numbers.  The digits are the
+    fewest that read back as the same float.
+    '''
+    s = unicode(format(decimal.Decimal(repr(float(number))), 'f'))
+    if u'.' in s:
+        s = s.rstrip(u'0').rstrip(u'.')
+    if s in (u'', u'-0'):
+        s = u'0'
+    return s
+
 re_hexcolor = re.compile(r'#[0-9a-fA-F]{3,6}$')
 
 class Hexcolor(SyntaxObject):
@@ -50,7 +158,48 @@ class Hexcolor(SyntaxObject):
     def datum(self, serializer):
         return serialize.serialize_Hexcolor(self, serializer)
 
-class Function(object):
+class Color(SyntaxObject):
+    '''
+    A color normalized to red, green, blue and alpha integers in 0..255.
+
+    The `form` is the notation used to write the color: 'hex', 'rgb' or
+    'name', or None for whichever is shortest.  A color that is not
+    opaque is always written in rgba() notation.  See `css.colors` for
+    reading colors out of Hexcolor, Function and Ident terms.
+    '''
+    def __init__(self, red, green, blue, alpha=255, form=None):
+        self.red = red
+        self.green = green
+        self.blue = blue
+        self.alpha = alpha
+        self.form = form
+
+    def __repr__(self):
+        r = 'Color(%r, %r, %r' % (self.red, self.green, self.blue)
+        if 255 != self.alpha:
+            r += ', alpha=%r' % (self.alpha,)
+        if self.form:
+            r += ', form=%r' % (self.form,)
+        r += ')'
+        return r
+
+    def __eq__(self, other):
+        return isinstance(other, Color) and self.rgba == other.rgba
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __hash__(self):
+        return hash(self.rgba)
+
+    @property
+    def rgba(self):
+        return (self.red, self.green, self.blue, self.alpha)
+
+    def datum(self, serializer):
+        return serialize.serialize_Color(self, serializer)
+
+class Function(SyntaxObject):
     '''
     A term in functional notation, e.g. colors specified with rgb().
     
@@ -64,6 +213,9 @@ class Function(object):
     def __repr__(self):
         return 'Function(%r, %r)' % (self.name, self.parameters)
 
+    def children(self):
+        return (self.parameters,)
+
     def datum(self, serializer):
         return serialize.serialize_Function(self, serializer)
     
@@ -115,6 +267,11 @@ class Term(SyntaxObject):
     
     Quantitative terms, such as EMS may have a - or + sign as
     a unary operator.
+
+    A quantity is parsed once into `number` and `unit`, e.g. u'12px'
+    into 12.0 and u'px'; `number` does not include the sign.  Assigning
+    to either one rewrites `value`.  Values that are not quantities
+    have a `number` and `unit` of None.
     '''
     def __init__(self, value, unary_operator=None):
         if unary_operator and -1 == '-+'.find(unary_operator):
@@ -122,6 +279,48 @@ class Term(SyntaxObject):
         self.value = value
         self.unary_operator = unary_operator
 
+    def _get_value(self):
+        if self._value is None:
+            self._value = format_number(self._number) + self._unit
+        return self._value
+
+    def _set_value(self, value):
+        m = re_quantity.match(value)
+        if m:
+            self._number = float(m.group(1))
+            self._unit = m.group(2)
+        else:
+            self._number = None
+            self._unit = None
+        self._value = value
+
+    value = property(_get_value, _set_value,
+                     doc='''The text of the term, without the sign.''')
+
+    def _get_number(self):
+        return self._number
+
+    def _set_number(self, number):
+        if self._number is None:
+            raise ValueError, '''term is not a quantity'''
+        self._number = number
+        self._value = None
+
+    number = property(_get_number, _set_number,
+                      doc='''The magnitude of a quantity, as a float.''')
+
+    def _get_unit(self):
+        return self._unit
+
+    def _set_unit(self, unit):
+        if self._number is None:
+            raise ValueError, '''term is not a quantity'''
+        self._unit = unit
+        self._value = None
+
+    unit = property(_get_unit, _set_unit,
+                    doc='''The unit of a quantity, e.g. u'px', u'%' or u''.''')
+
     def __repr__(self):
         r = 'Term(' + repr(self.value)
         if self.unary_operator:
@@ -131,12 +330,71 @@ class Term(SyntaxObject):
 
     def datum(self, serializer):
         return serialize.serialize_Term(self, serializer)
-    
+
+class Expression(SyntaxObject):
+    '''
+    A value made of several terms.
+
+    `operators[i]` is the operator between `terms[i]` and `terms[i+1]`:
+    u',' or u'/', or u' ' for terms that are simply juxtaposed.
+    '''
+    def __init__(self, terms, operators=None):
+        self.terms = terms
+        if operators is None:
+            operators = [u' '] * (len(terms) - 1)
+        self.operators = operators
+
+    def __repr__(self):
+        r = 'Expression(' + repr(self.terms)
+        if [x for x in self.operators if x != u' ']:
+            r += ', operators=' + repr(self.operators)
+        r += ')'
+        return r
+
+    def __iter__(self):
+        '''Iterates the list of terms.'''
+        return iter(self.terms)
+
+    def __len__(self):
+        '''Returns the number of terms.'''
+        return len(self.terms)
+
+    def __getitem__(self, index):
+        '''Returns the term at the given index.'''
+        return self.terms[index]
+
+    def append(self, term, operator=u' '):
+        '''
+        Appends a term, separated from the last one by the given operator.
+
+        Modifies the Expression *in place.*
+        '''
+        if self.terms:
+            self.operators.append(operator)
+        self.terms.append(term)
+        _adopt(self, term)
+        self.changed()
+
+    def __setitem__(self, index, term):
+        '''Replaces the term at the given index.'''
+        self.terms[index] = term
+        _adopt(self, term)
+        self.changed()
+
+    def children(self):
+        return self.terms
+
+    def datum(self, serializer):
+        return serialize.serialize_Expression(self, serializer)
+
 
 class Declaration(SyntaxObject):
     '''
     A property-value declaration with an optional important flag.
     '''
+    # The offset in the source at which it begins, if parsed.
+    position = None
+
     def __init__(self, property, value, important=False):
         self.property = property
         self.value = value
@@ -150,6 +408,15 @@ class Declaration(SyntaxObject):
         r += ')'
         return r
 
+    def children(self):
+        return (self.property, self.value)
+
+    def terms(self):
+        '''Returns the list of terms in the value.'''
+        if isinstance(self.value, Expression):
+            return list(self.value.terms)
+        return [self.value]
+
     def datum(self, serializer):
         return serialize.serialize_Declaration(self, serializer)
     
@@ -158,6 +425,9 @@ class Ruleset(SyntaxObject):
     '''
     A list of declarations for a given list of selectors.
     '''
+    # The offset in the source at which it begins, if parsed.
+    position = None
+
     def __init__(self, selectors, declarations=None):
         # Implementation detail: declarations are stored in a list, rather
         # than a property => value mapping, because a property may be
@@ -185,6 +455,12 @@ class Ruleset(SyntaxObject):
         '''Returns the declaration at the given index.'''
         return self.declarations[index]
 
+    def __setitem__(self, index, declaration):
+        '''Replaces the declaration at the given index.'''
+        self.declarations[index] = declaration
+        _adopt(self, declaration)
+        self.changed()
+
     def __contains__(self, declaration):
         '''Indicates whether the given declaration is present.'''
         return declaration in self.declarations
@@ -198,6 +474,11 @@ class Ruleset(SyntaxObject):
         if not isinstance(declaration, Declaration):
             raise ArgumentError, 'Expected a Declaration.'
         self.declarations.append(declaration)
+        _adopt(self, declaration)
+        self.changed()
+
+    def children(self):
+        return self.declarations
 
     def datum(self, serializer):
         return serialize.serialize_Ruleset(self, serializer)
@@ -213,7 +494,7 @@ class Charset(SyntaxObject):
         return 'Charset(%r)' % (self.encoding,)
 
     def datum(self, serializer):
-        return serialize.serialize_charset(self, serializer)
+        return serialize.serialize_Charset(self, serializer)
     
 
 class Page(SyntaxObject):
@@ -244,6 +525,12 @@ class Page(SyntaxObject):
     def __getitem__(self, index):
         '''Returns the declaration at the given index.'''
         return self.declarations[index]
+
+    def __setitem__(self, index, declaration):
+        '''Replaces the declaration at the given index.'''
+        self.declarations[index] = declaration
+        _adopt(self, declaration)
+        self.changed()
  
     def __contains__(self, item):
         '''Indicates whether the given declaration is present.'''
@@ -258,6 +545,11 @@ class Page(SyntaxObject):
         if not isinstance(declaration, Declaration):
             raise ArgumentError, 'Expected a Declaration.'
         self.declarations.append(declaration)
+        _adopt(self, declaration)
+        self.changed()
+
+    def children(self):
+        return self.declarations
 
     def datum(self, serializer):
         return serialize.serialize_Page(self, serializer)
@@ -288,6 +580,12 @@ class Media(SyntaxObject):
         '''Returns the ruleset at the given index.'''
         return self.rulesets[index]
 
+    def __setitem__(self, index, ruleset):
+        '''Replaces the ruleset at the given index.'''
+        self.rulesets[index] = ruleset
+        _adopt(self, ruleset)
+        self.changed()
+
     def __contains__(self, item):
         '''Indicates whether the given ruleset is present.'''
         return item in self.rulesets
@@ -300,7 +598,12 @@ class Media(SyntaxObject):
         '''
         if not isinstance(ruleset, Ruleset):
             raise ArgumentError, 'Expected a Ruleset.'
-        self.ruleset.append(ruleset)
+        self.rulesets.append(ruleset)
+        _adopt(self, ruleset)
+        self.changed()
+
+    def children(self):
+        return self.rulesets
 
     def datum(self, serializer):
         return serialize.serialize_Media(self, serializer)
@@ -324,6 +627,9 @@ class Import(SyntaxObject):
         r += ')'
         return r
 
+    def children(self):
+        return (self.source,)
+
     def datum(self, serializer):
         return serialize.serialize_Import(self, serializer)
 
@@ -387,16 +693,21 @@ class Stylesheet(SyntaxObject):
         '''
         if isinstance(rule, Charset):
             self.charset = rule
+            return
         elif isinstance(rule, Import):
             self.imports.append(rule)
         else:
             self.statements.append(rule)
+        _adopt(self, rule)
+        self.changed()
 
 
-    def datum(self, serializer):
-        return serialize.serialize_Stylesheet(self, serializer)        
-
-
+    def children(self):
+        return list(self)
 
-    
+    def datum(self, serializer):
+        return serialize.serialize_Stylesheet(self, serializer)
 
+# The serializer registers itself against the classes above, so it is
+# imported once they are all defined.
+import serialize
@@ -27,8 +27,16 @@ def r_opt(rx):
 
 # lexer
 
+# Every pattern that repeats has one way only to match a given text:
+# the alternatives of each repetition begin with different characters,
+# and optional parts are taken whenever they can be.  A pattern that
+# fails therefore fails without backtracking, in time linear in the
+# input, which would otherwise be exponential on texts such as an
+# unclosed string of escapes (see tests/test_adversarial.py).
 
-softsp         = r_opt(r_or(ur'\r\n', ur'[ \t\r\n\f]'))
+# The white space after an escape, which is part of it if present.
+softsp         = r_or(ur'\r\n', ur'\r(?!\n)', ur'[ \t\n\f]',
+                      ur'(?![ \t\r\n\f])')
 
 s              = r_plus(ur'[ \t\r\n\f]')
 w              = r_opt(s)
@@ -36,7 +44,8 @@ nl             = ur'\n|\r\n|\r|\f'
 
 h              = ur'[0-9a-fA-F]'
 nonascii       = ur'[^\0-\177]'
-unicode        = ur'\\' + h + ur'{1,6}' + softsp
+unicode        = ur'\\' + r_or(h + ur'{6}', h + ur'{1,5}(?!' + h + ur')') + \
+                 softsp
 escape         = r_or(unicode, ur'\\[^\r\n\f0-9a-fA-F]')
 nmstart        = r_or(ur'[_a-zA-Z]', nonascii, escape)
 nmchar         = r_or(ur'[_a-zA-Z0-9-]', nonascii, escape)
@@ -53,10 +62,9 @@ invalid2       = r"'%s" % r_star(r_or(ur"[^\n\r\f\\']",
                                       ur'\\'+nl,
                                       escape))
 
-comment        = ur'\/\*[^*]*\*+(?:[^/][^*]*\*+)*\/'
-comment = ur'\/\*' + r_star(ur'[^*]') + r_plus(ur'\*') + \
-          r_star(ur'[^/]' + r_star(ur'[^*]') + r_plus(ur'\*')) + \
-          ur'\/'
+# A comment left open runs to the end of the stylesheet, as CSS 2.1
+# has it, rather than being scanned again from each '/*' in it.
+comment        = ur'\/\*[^*]*(?:\*+[^/*][^*]*)*(?:\*+\/|\*+\Z|\Z)'
 
 ident          = r_opt(ur'-') + nmstart + r_star(nmchar)
 name           = r_plus(nmchar)
@@ -64,7 +72,7 @@ num            = r_or(r_star(ur'[0-9]') + ur'\.' + r_plus(ur'[0-9]'),
                       r_plus(ur'[0-9]'))
 string         = r_or(string1, string2)
 invalid        = r_or(invalid1, invalid2)
-url            = r_star(r_or(ur'[!#$%&*-~]', nonascii, escape))
+url            = r_star(r_or(ur'[!#$%&*-\[\]-~]', nonascii, escape))
 
 def letter(c):
     return r_or(c.lower(),
@@ -162,7 +170,7 @@ class csslexer(object):
     t_CHARSET_SYM  = ur'@charset\ '
     
     t_IMPORTANT_SYM = ur'\!' + \
-        r_star(r_or(w,comment)) + \
+        r_star(r_or(ur'[ \t\r\n\f]', comment)) + \
         I + M + P + O + R + T + A + N + T
         
     @_lex.TOKEN(num + E + M)
@@ -4,6 +4,7 @@ A parser for CSS.
 '''
 
 import re
+import sys
 from ply import yacc as ply_yacc
 from csslex import csslexer
 import css
@@ -26,10 +27,36 @@ def STRING_value(x):
     q = x[0]
     return css.String(x[1:-1].replace(u'\\'+q,q))
 
+def end_declaration(declaration, data, end):
+    '''
+    Records the source text of a declaration that ends before the given
+    offset, less any white space before it.
+    '''
+    if declaration is not None and declaration._source is None:
+        while end > declaration.position and data[end - 1] in ' \t\r\n\f':
+            end -= 1
+        declaration._source = (data, declaration.position, end)
+
 
 class cssparser(object):
     tokens = csslexer.tokens
 
+    def __init__(self):
+        # the messages of the syntax errors met, in order
+        self.errors = []
+
+    # The offset in the input at which each Ruleset and Declaration
+    # begins is kept as its `position`.  PLY only knows the positions
+    # of tokens, so the rules leading down from a ruleset to its first
+    # token pass that token's position up with set_lexpos(), which is
+    # cheaper than having yacc track positions for every rule.
+    #
+    # Statements and declarations also keep the input and the span of
+    # it they were parsed from as their `_source`, for the serializer
+    # to copy while they are unmodified, and statements keep it as
+    # their `_origin` for good.  A declaration's text ends at the ';'
+    # or '}' after it, which is only seen by the rule above.
+
     def p_stylesheet(self, p):
         '''
         stylesheet : charset spaces_or_sgml_comments imports statements
@@ -39,7 +66,6 @@ class cssparser(object):
             p[0] = css.Stylesheet(p[4], p[3], p[1])
         else:
             p[0] = css.Stylesheet(p[3], p[2])
-        print p.slice
 
     def p_charset(self, p):
         '''
@@ -52,6 +78,7 @@ class cssparser(object):
         media : MEDIA_SYM spaces media_types LBRACE spaces rulesets '}' spaces
         '''
         p[0] = css.Media(p[3], p[6])
+        p[0]._source = p[0]._origin = (p.lexer.lexdata, p.lexpos(1), p.lexpos(7) + 1)
 
     def p_medium(self, p):
         '''
@@ -68,6 +95,10 @@ class cssparser(object):
             p[0] = css.Page(p[6], p[3])
         else:
             p[0] = css.Page(p[4])
+        end = p.lexpos(len(p) - 2)
+        if p[0].declarations:
+            end_declaration(p[0].declarations[-1], p.lexer.lexdata, end)
+        p[0]._source = p[0]._origin = (p.lexer.lexdata, p.lexpos(1), end + 1)
 
     def p_pseudo_page(self, p):
         '''
@@ -84,6 +115,8 @@ class cssparser(object):
             p[0] = css.Import(p[3], p[4])
         else:
             p[0] = css.Import(p[3])
+        end = p.lexpos(len(p) - 2) + 1
+        p[0]._source = p[0]._origin = (p.lexer.lexdata, p.lexpos(1), end)
 
     def p_operator(self, p):
         '''
@@ -113,18 +146,24 @@ class cssparser(object):
         property : IDENT spaces
         '''
         p[0] = css.Ident(p[1])
+        p.set_lexpos(0, p.lexpos(1))
 
     def p_ruleset(self, p):
         '''
         ruleset : ruleset_selector_group LBRACE spaces block_declarations '}' spaces
         '''
         p[0] = css.Ruleset(p[1], p[4])
+        p[0].position = p.lexpos(1)
+        if p[4]:
+            end_declaration(p[4][-1], p.lexer.lexdata, p.lexpos(5))
+        p[0]._source = p[0]._origin = (p.lexer.lexdata, p.lexpos(1), p.lexpos(5) + 1)
 
     def p_selector(self, p):
         '''
         selector : simple_selector simple_selectors
         '''
         p[0] = u''.join(p[1:])
+        p.set_lexpos(0, p.lexpos(1))
 
     def p_simple_selector(self, p):
         '''
@@ -132,6 +171,7 @@ class cssparser(object):
                         | simple_selector_component simple_selector_components
         '''
         p[0] = u''.join(p[1:])
+        p.set_lexpos(0, p.lexpos(1))
 
     def p_simple_selectors(self, p):
         '''
@@ -149,6 +189,7 @@ class cssparser(object):
                                   | pseudo
         '''
         p[0] = p[1]
+        p.set_lexpos(0, p.lexpos(1))
 
     def p_simple_selector_components(self, p):
         '''
@@ -162,6 +203,7 @@ class cssparser(object):
         class : '.' IDENT
         '''
         p[0] = u''.join(p[1:])
+        p.set_lexpos(0, p.lexpos(1))
 
     def p_element_name(self, p):
         '''
@@ -169,12 +211,14 @@ class cssparser(object):
                      | '*'
         '''
         p[0] = p[1]
+        p.set_lexpos(0, p.lexpos(1))
 
     def p_attrib(self, p):
         '''
         attrib : '[' spaces IDENT spaces attrib_match ']'
         '''
         p[0] = u''.join(p[1:])
+        p.set_lexpos(0, p.lexpos(1))
 
     def p_pseudo(self, p):
         '''
@@ -183,6 +227,7 @@ class cssparser(object):
                | ':' FUNCTION spaces ')'
         '''
         p[0] = u''.join(p[1:])
+        p.set_lexpos(0, p.lexpos(1))
 
     def p_declaration(self, p):
         '''
@@ -195,6 +240,7 @@ class cssparser(object):
         else:
             important = len(p) == 6
             p[0] = css.Declaration(p[1], p[4], important)
+            p[0].position = p.lexpos(1)
 
     def p_prio(self, p):
         '''
@@ -208,12 +254,17 @@ class cssparser(object):
              | expr term
              | term
         '''
+        if len(p) == 2:
+            p[0] = p[1]
+            return
+        if isinstance(p[1], css.Expression):
+            p[0] = p[1]
+        else:
+            p[0] = css.Expression([p[1]])
         if len(p) == 4:
-            p[0] = u''.join([unicode(x) for x in p[1:]])
-        elif len(p) == 3:
-            p[0] = unicode(p[1]) + u' ' + unicode(p[2])
+            p[0].append(p[3], p[2].strip() or u' ')
         else:
-            p[0] = p[1]
+            p[0].append(p[2])
     
     def p_term(self, p):
         '''
@@ -351,6 +402,7 @@ class cssparser(object):
             p[0] = p[1:]
         else:
             p[0] = p[1] + p[4:]
+        p.set_lexpos(0, p.lexpos(1))
 
     def p_block_declarations(self, p):
         '''
@@ -363,6 +415,8 @@ class cssparser(object):
                 p[0].append(p[1])
         else:
             p[0] = p[1]
+            if p[0]:
+                end_declaration(p[0][-1], p.lexer.lexdata, p.lexpos(2))
             if p[4]:
                 p[0].append(p[4])
 
@@ -401,11 +455,14 @@ class cssparser(object):
         p[0] = u''
 
     def p_error(self, p):
-        print "Syntax error at '%r'" % (p,)
+        message = "Syntax error at '%r'" % (p,)
+        self.errors.append(message)
+        print >>sys.stderr, message
 
 
 def yacc(**kw):
-    kw['module'] = cssparser()
+    if 'module' not in kw:
+        kw['module'] = cssparser()
     if 'start' not in kw:
         kw['start'] = 'stylesheet'
     return ply_yacc.yacc(**kw)
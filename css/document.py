@@ -0,0 +1,274 @@
+# -*- coding: utf-8 -*-
+'''
+HTML documents, read into trees of elements for selectors to be
+matched against.
+
+    root = document.read('index.html')
+    for element in document.walk(root):
+        print element.tag, element.classes
+
+The tree is built as browsers would for well-formed documents: void
+elements such as <br> have no children, and an end tag closes every
+element left open inside the element it ends.  The end tags HTML lets
+be left out, e.g. of <li>, <p>, <td> and <option>, are implied by the
+start tags that follow, so that <ul><li>a<li>b</ul> has two sibling
+items.  The <html>, <head> and <body> elements are always there,
+whether or not their tags are, and a <tbody> is implied around rows
+written directly in a <table>.  Text and comments are not kept.
+'''
+
+import re
+import codecs
+from HTMLParser import HTMLParser
+
+__all__ = ('Element', 'parse', 'read', 'walk', 'keys')
+
+# elements that never have content or an end tag
+void = frozenset(['area', 'base', 'br', 'col', 'command', 'embed', 'hr',
+                  'img', 'input', 'keygen', 'link', 'meta', 'param',
+                  'source', 'track', 'wbr'])
+
+# elements that go in the <head> when they come before the <body>
+head = frozenset(['base', 'link', 'meta', 'noscript', 'script', 'style',
+                  'template', 'title'])
+
+# elements whose rows are in an implied <tbody> when directly in them
+table = frozenset(['table'])
+
+# elements whose cells are in an implied <tr> when directly in them
+sections = frozenset(['table', 'tbody', 'tfoot', 'thead'])
+
+# elements whose start tag ends an open <p>
+closes_p = frozenset(['address', 'article', 'aside', 'blockquote', 'dd',
+                      'details', 'dialog', 'div', 'dl', 'dt', 'fieldset',
+                      'figcaption', 'figure', 'footer', 'form', 'h1', 'h2',
+                      'h3', 'h4', 'h5', 'h6', 'header', 'hgroup', 'hr', 'li',
+                      'main', 'menu', 'nav', 'ol', 'p', 'pre', 'section',
+                      'summary', 'table', 'ul'])
+
+# elements an open <p> is not ended beyond
+p_scope = frozenset(['applet', 'button', 'caption', 'marquee', 'object',
+                     'table', 'td', 'template', 'th'])
+
+# tag => (the elements its start tag ends, those they are not ended
+# beyond)
+ends = {'li': (frozenset(['li']), frozenset(['menu', 'ol', 'ul'])),
+        'dd': (frozenset(['dd', 'dt']), frozenset(['dl'])),
+        'dt': (frozenset(['dd', 'dt']), frozenset(['dl'])),
+        'tr': (frozenset(['tr']), sections),
+        'td': (frozenset(['td', 'th']), sections | frozenset(['tr'])),
+        'th': (frozenset(['td', 'th']), sections | frozenset(['tr'])),
+        'tbody': (frozenset(['tbody', 'tfoot', 'thead']), table),
+        'tfoot': (frozenset(['tbody', 'tfoot', 'thead']), table),
+        'thead': (frozenset(['tbody', 'tfoot', 'thead']), table),
+        'option': (frozenset(['option']),
+                   frozenset(['datalist', 'optgroup', 'select'])),
+        'optgroup': (frozenset(['optgroup', 'option']),
+                     frozenset(['datalist', 'select']))}
+
+# an encoding declared in a <meta> element, as bytes
+re_charset = re.compile(r'<meta[^>]+charset=["\']?([-_.:a-zA-Z0-9]+)', re.I)
+
+class Element(object):
+    '''
+    An element: its tag name and attributes, in lowercase, and the
+    elements around it.  The root of a document is an Element whose
+    tag is None.
+    '''
+    def __init__(self, tag, attributes=None, parent=None):
+        self.tag = tag
+        # name => value
+        self.attributes = attributes or dict()
+        self.parent = parent
+        self.children = list()
+        # its position among its parent's children
+        self.index = 0
+
+    def __repr__(self):
+        return '<Element %s>' % (self.tag,)
+
+    @property
+    def id(self):
+        return self.attributes.get('id')
+
+    @property
+    def classes(self):
+        return self.attributes.get('class', u'').split()
+
+    @property
+    def previous(self):
+        '''The element just before this one in its parent, or None.'''
+        if self.parent is None or 0 == self.index:
+            return None
+        return self.parent.children[self.index - 1]
+
+class _Builder(HTMLParser):
+    def __init__(self):
+        HTMLParser.__init__(self)
+        self.root = Element(None)
+        self.open = [self.root]
+        self.html = self.head = self.body = None
+
+    def _push(self, tag, attributes=None):
+        parent = self.open[-1]
+        element = Element(tag, attributes, parent)
+        element.index = len(parent.children)
+        parent.children.append(element)
+        if tag not in void:
+            self.open.append(element)
+        return element
+
+    def _close(self, element):
+        '''Closes an element, if open, and those open inside it.'''
+        if element in self.open:
+            del self.open[self.open.index(element):]
+
+    def _end(self, tags, scope):
+        '''
+        Closes the innermost open element of the given tags, if it is
+        inside the <body> and any element of the scope given.
+        '''
+        for i in xrange(len(self.open) - 1, 0, -1):
+            element = self.open[i]
+            if element.tag in tags:
+                del self.open[i:]
+                return
+            if element.tag in scope or element is self.body:
+                return
+
+    def _implied(self, tag):
+        '''Opens the elements the start tag of an element implies.'''
+        if 'html' == tag:
+            return
+        if self.html is None:
+            self.html = self._push('html')
+        if self.body is None:
+            if tag in head or 'head' == tag:
+                if self.head is None:
+                    if 'head' != tag:
+                        self.head = self._push('head')
+                elif self.head not in self.open:
+                    # back into the <head> closed before
+                    self.open.append(self.head)
+                return
+            if self.head is None:
+                self.head = self._push('head')
+            self._close(self.head)
+            if 'body' != tag:
+                self.body = self._push('body')
+        if tag in ends:
+            self._end(*ends[tag])
+        if tag in closes_p:
+            self._end(('p',), p_scope)
+        parent = self.open[-1].tag
+        if tag in ('td', 'th') and parent in sections:
+            if parent in table:
+                self._push('tbody')
+            self._push('tr')
+        elif 'tr' == tag and parent in table:
+            self._push('tbody')
+
+    def handle_starttag(self, tag, attrs):
+        attributes = dict([(name, value or u'') for name, value in attrs])
+        first = {'html': self.html, 'head': self.head,
+                 'body': self.body}.get(tag)
+        if first is not None:
+            # Another <html>, <head> or <body> adds its attributes to
+            # the first.
+            for name, value in attributes.iteritems():
+                first.attributes.setdefault(name, value)
+            return
+        self._implied(tag)
+        element = self._push(tag, attributes)
+        if 'html' == tag:
+            self.html = element
+        elif 'head' == tag:
+            self.head = element
+        elif 'body' == tag:
+            self.body = element
+
+    def handle_data(self, data):
+        # Text outside the <head> begins the <body>.
+        if self.body is None and data.strip() and (
+                self.head is None or self.head not in self.open):
+            self._implied(None)
+
+    def handle_startendtag(self, tag, attrs):
+        self.handle_starttag(tag, attrs)
+        # <html/>, <head/> and <body/> are left open, as their end tags
+        # would be implied anyway.
+        if tag not in void and tag not in ('html', 'head', 'body'):
+            self.open.pop()
+
+    def handle_endtag(self, tag):
+        # Whatever follows </body> or </html> is still in the <body>.
+        if tag in ('html', 'body'):
+            return
+        for i in xrange(len(self.open) - 1, 0, -1):
+            if tag == self.open[i].tag:
+                del self.open[i:]
+                return
+
+def parse(data):
+    '''Returns the root Element of an HTML document's text.'''
+    builder = _Builder()
+    builder.feed(data)
+    builder.close()
+    return builder.root
+
+def _encoding(head):
+    for bom, encoding in ((codecs.BOM_UTF8, 'utf-8-sig'),
+                          (codecs.BOM_UTF16_LE, 'utf-16'),
+                          (codecs.BOM_UTF16_BE, 'utf-16')):
+        if head.startswith(bom):
+            return encoding
+    m = re_charset.search(head)
+    if m:
+        try:
+            return codecs.lookup(m.group(1)).name
+        except LookupError:
+            pass
+    return 'utf-8'
+
+def read(filename):
+    '''
+    Returns the root Element of an HTML file, decoded by its byte order
+    mark, its <meta> charset or, lacking both, as UTF-8.
+    '''
+    f = open(filename, 'rb')
+    try:
+        data = f.read()
+    finally:
+        f.close()
+    return parse(data.decode(_encoding(data[:1024]), 'replace'))
+
+def walk(element):
+    '''Generates the element and every element beneath it, in order.'''
+    stack = [element]
+    while stack:
+        element = stack.pop()
+        yield element
+        stack.extend(reversed(element.children))
+
+def keys(root):
+    '''
+    Returns the set of tags, ids, classes and attributes of the
+    elements of a document, as keys in the form of selector.keys().
+    '''
+    result = set()
+    add = result.add
+    for element in walk(root):
+        if element.tag is None:
+            continue
+        add(('tag', element.tag))
+        for name, value in element.attributes.iteritems():
+            add(('attr', name))
+            add(('attr=', name, value.lower()))
+            for word in value.lower().split():
+                add(('attr~', name, word))
+            if 'id' == name:
+                add(('id', value))
+            elif 'class' == name:
+                for word in value.split():
+                    add(('class', word))
+    return result
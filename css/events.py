@@ -0,0 +1,326 @@
+# -*- coding: utf-8 -*-
+'''
+Event-based parsing: the grammar calls a handler as it goes, in the
+order of the stylesheet, and no syntax objects are built.
+
+    class Properties(events.Handler):
+        def __init__(self):
+            self.names = set()
+        def declaration(self, property, value, important):
+            self.names.add(property)
+
+    names = events.parse(data, Properties()).names
+
+Selectors, media types, URLs and values are passed as text: values
+with their terms written as the serializer writes them, separated by
+their operators.  Memory use does not grow with the stylesheet, since
+nothing is kept once it has been passed on.
+
+The parser reduces a ruleset only after its declarations, so the event
+grammar splits the head off each ruleset, @media and @page rule, for
+start_ruleset() and the like to be called before the declarations.  Its
+tables are kept in their own module, `eventtab`.
+
+A syntax error discards the rules it is in, even those already
+started: their end_ruleset() and the like are called right after
+error(), so each start_*() is always matched by its end_*().
+'''
+
+import sys
+import csslex, cssyacc
+from cssyacc import normalize
+
+__all__ = ('Handler', 'eventparser', 'yacc', 'parse')
+
+class Handler(object):
+    '''
+    The events of a stylesheet.  Each method does nothing; a subclass
+    overrides those it needs.
+
+    Every start_*() call is matched by the end_*() call of the same
+    rule, nested like the rules themselves.  When a syntax error
+    discards a rule that was started, its end_*() is called after
+    error(), with no more of its declarations passed on.
+    '''
+    def start_stylesheet(self):
+        pass
+
+    def end_stylesheet(self):
+        pass
+
+    def charset(self, encoding):
+        pass
+
+    def import_(self, url, media_types):
+        '''An @import rule; media_types is empty for all media.'''
+        pass
+
+    def start_media(self, media_types):
+        pass
+
+    def end_media(self):
+        pass
+
+    def start_page(self, pseudo_page):
+        '''An @page rule; pseudo_page is e.g. u'first', or None.'''
+        pass
+
+    def end_page(self):
+        pass
+
+    def start_ruleset(self, selectors):
+        pass
+
+    def end_ruleset(self):
+        pass
+
+    def declaration(self, property, value, important):
+        pass
+
+    def error(self, message):
+        '''A syntax error, which the parser recovers from if it can.'''
+        print >>sys.stderr, message
+
+def _string(x):
+    '''Returns the value of a STRING token.'''
+    q = x[0]
+    return x[1:-1].replace(u'\\' + q, q)
+
+def _url(x):
+    '''Returns the URL of a URI token.'''
+    url = normalize(x)[4:-1].strip()
+    if -1 != '"\''.find(url[0]):
+        url = _string(url)
+    return url
+
+class eventparser(cssyacc.cssparser):
+    '''
+    The grammar of cssparser, calling a Handler instead of building
+    syntax objects.
+    '''
+    def __init__(self, handler):
+        cssyacc.cssparser.__init__(self)
+        self.handler = handler
+        # the kinds of the rules started and not yet ended, outermost
+        # first
+        self.open = []
+
+    def _start(self, p, kind):
+        '''
+        Records the start of a rule, first ending those that error
+        recovery has discarded: the heads of the rules still open are
+        on the parser's stack.
+        '''
+        self._end(len([x for x in p.stack if x.type.endswith('_head')]))
+        self.open.append(kind)
+
+    def _end(self, depth=0):
+        '''Ends the open rules beyond the given depth, innermost first.'''
+        while depth < len(self.open):
+            getattr(self.handler, 'end_' + self.open.pop())()
+
+    def p_stylesheet(self, p):
+        '''
+        stylesheet : charset spaces_or_sgml_comments imports statements
+                   | spaces_or_sgml_comments imports statements
+        '''
+        p[0] = None
+
+    def p_charset(self, p):
+        '''
+        charset : CHARSET_SYM STRING ';'
+        '''
+        self.handler.charset(_string(p[2]))
+        p[0] = True
+
+    def p_imports(self, p):
+        '''
+        imports : imports import spaces_or_sgml_comments
+                | import spaces_or_sgml_comments
+                | empty
+        '''
+        p[0] = None
+
+    def p_import(self, p):
+        '''
+        import : IMPORT_SYM spaces import_source media_types spaces ';' spaces
+               | IMPORT_SYM spaces import_source ';' spaces
+        '''
+        if isinstance(p[4], list):
+            self.handler.import_(p[3], p[4])
+        else:
+            self.handler.import_(p[3], [])
+
+    def p_import_source(self, p):
+        '''
+        import_source : STRING spaces
+                      | URI spaces
+        '''
+        if p.slice[1].type == 'URI':
+            p[0] = _url(p[1])
+        else:
+            p[0] = _string(p[1])
+
+    def p_statements(self, p):
+        '''
+        statements : statements ruleset spaces_or_sgml_comments
+                   | statements media spaces_or_sgml_comments
+                   | statements page spaces_or_sgml_comments
+                   | ruleset spaces_or_sgml_comments
+                   | media spaces_or_sgml_comments
+                   | page spaces_or_sgml_comments
+                   | empty
+        '''
+        p[0] = None
+
+    def p_media_head(self, p):
+        '''
+        media_head : MEDIA_SYM spaces media_types LBRACE
+        '''
+        self._start(p, 'media')
+        self.handler.start_media(p[3])
+
+    def p_media(self, p):
+        '''
+        media : media_head spaces rulesets '}' spaces
+        '''
+        self._end(len(self.open) - 1)
+
+    def p_rulesets(self, p):
+        '''
+        rulesets : rulesets ruleset
+                 | ruleset
+                 | empty
+        '''
+        p[0] = None
+
+    def p_page_head(self, p):
+        '''
+        page_head : PAGE_SYM spaces pseudo_page spaces LBRACE
+                  | PAGE_SYM spaces LBRACE
+        '''
+        self._start(p, 'page')
+        if len(p) == 6:
+            self.handler.start_page(p[3])
+        else:
+            self.handler.start_page(None)
+
+    def p_page(self, p):
+        '''
+        page : page_head block_declarations '}' spaces
+        '''
+        self._end(len(self.open) - 1)
+
+    def p_pseudo_page(self, p):
+        '''
+        pseudo_page : ':' IDENT
+        '''
+        p[0] = p[2]
+
+    def p_ruleset_head(self, p):
+        '''
+        ruleset_head : ruleset_selector_group LBRACE
+        '''
+        self._start(p, 'ruleset')
+        self.handler.start_ruleset(p[1])
+
+    def p_ruleset(self, p):
+        '''
+        ruleset : ruleset_head spaces block_declarations '}' spaces
+        '''
+        self._end(len(self.open) - 1)
+
+    def p_block_declarations(self, p):
+        '''
+        block_declarations : block_declarations ';' spaces declaration
+                           | declaration
+        '''
+        p[0] = None
+
+    def p_declaration(self, p):
+        '''
+        declaration : property ':' spaces expr prio
+                    | property ':' spaces expr
+                    | empty
+        '''
+        if len(p) != 2:
+            self.handler.declaration(p[1], p[4], len(p) == 6)
+
+    def p_property(self, p):
+        '''
+        property : IDENT spaces
+        '''
+        p[0] = p[1]
+
+    def p_expr(self, p):
+        '''
+        expr : expr operator term
+             | expr term
+             | term
+        '''
+        if len(p) == 2:
+            p[0] = p[1]
+        elif len(p) == 4:
+            p[0] = p[1] + (p[2].strip() or u' ') + p[3]
+        else:
+            p[0] = p[1] + u' ' + p[2]
+
+    def p_term(self, p):
+        '''
+        term : unary_operator term_quant spaces
+             | term_quant spaces
+             | STRING spaces
+             | IDENT spaces
+             | URI spaces
+             | hexcolor
+             | function
+        '''
+        kind = p.slice[1].type
+        if kind == 'unary_operator':
+            p[0] = p[1] + p[2]
+        elif kind == 'STRING':
+            p[0] = u'"' + _string(p[1]).replace(u'"', u'\\"') + u'"'
+        elif kind == 'URI':
+            p[0] = u'url(' + _url(p[1]) + u')'
+        else:
+            p[0] = p[1]
+
+    def p_function(self, p):
+        '''
+        function : FUNCTION spaces expr ')' spaces
+        '''
+        p[0] = p[1] + p[3] + u')'
+
+    def p_hexcolor(self, p):
+        '''
+        hexcolor : HASH spaces
+        '''
+        p[0] = p[1]
+
+    def p_error(self, p):
+        message = "Syntax error at '%r'" % (p,)
+        self.errors.append(message)
+        self.handler.error(message)
+        # The grammar has no error rules, so recovery discards every
+        # rule the error is in.
+        self._end()
+
+def yacc(handler, **kw):
+    '''Returns a parser that calls the given Handler.'''
+    kw['module'] = eventparser(handler)
+    kw.setdefault('start', 'stylesheet')
+    kw.setdefault('tabmodule', 'eventtab')
+    # The debugging output would take the place of the main grammar's.
+    kw.setdefault('debug', False)
+    return cssyacc.ply_yacc.yacc(**kw)
+
+def parse(data, handler):
+    '''
+    Parses a stylesheet, calling the methods of handler for each part
+    of it in turn, and returns the handler.
+    '''
+    parser = yacc(handler)
+    handler.start_stylesheet()
+    parser.parse(data, lexer=csslex.lex())
+    handler.end_stylesheet()
+    return handler
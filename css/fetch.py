@@ -0,0 +1,224 @@
+# -*- coding: utf-8 -*-
+'''
+Fetching of stylesheets through a persistent cache.
+
+A `Cache` keeps what it fetches over HTTP in a directory, with the
+ETag and Last-Modified headers of each response.  A cached stylesheet
+younger than `max_age` seconds is used as it is; an older one is
+revalidated with a conditional request, and only downloaded again if
+it has changed.  In `offline` mode nothing is requested, and any URL
+that is not cached is an error.
+
+Connections are kept alive and reused for each host, so fetching the
+many stylesheets of an import graph from one server costs one
+connection per worker thread.  A Cache can be passed as the `fetch`
+function of `css.inline`:
+
+    cache = fetch.Cache('~/.cache/css', max_age=3600)
+    stylesheet = inline.load('http://example.com/site.css', fetch=cache)
+
+URLs other than http:// and https:// ones, e.g. file:// URLs, are read
+directly and not cached.
+'''
+
+import os
+import time
+import json
+import hashlib
+import httplib
+import urllib2
+import urlparse
+import threading
+from uri import uri
+
+__all__ = ('Cache', 'FetchError')
+
+class FetchError(IOError):
+    '''A stylesheet could not be fetched.'''
+    pass
+
+# Redirects followed for one request, at most.
+max_redirects = 5
+
+class Cache(object):
+    '''
+    A cache of fetched stylesheets in a directory, which is created if
+    need be.
+    '''
+    def __init__(self, directory, max_age=0, offline=False, timeout=30):
+        self.directory = os.path.expanduser(directory)
+        if not os.path.isdir(self.directory):
+            os.makedirs(self.directory)
+        self.max_age = max_age
+        self.offline = offline
+        self.timeout = timeout
+        # (scheme, host, port) => idle connections
+        self._connections = {}
+        self._lock = threading.Lock()
+        # counts of stylesheets served without a request, revalidated
+        # with a 304 response, and downloaded
+        self.hits = self.revalidated = self.downloaded = 0
+
+    def __repr__(self):
+        return 'Cache(%r)' % (self.directory,)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        '''Closes the connections kept alive.'''
+        self._lock.acquire()
+        try:
+            for connections in self._connections.values():
+                for connection in connections:
+                    connection.close()
+            self._connections.clear()
+        finally:
+            self._lock.release()
+
+    def _paths(self, url):
+        if isinstance(url, unicode):
+            url = url.encode('utf-8')
+        name = os.path.join(self.directory, hashlib.sha1(url).hexdigest())
+        return name + '.json', name + '.css'
+
+    def _read(self, url):
+        '''Returns the cached (headers, content) of a URL, or None.'''
+        meta, body = self._paths(url)
+        try:
+            f = open(meta, 'rb')
+            try:
+                entry = json.load(f)
+            finally:
+                f.close()
+            f = open(body, 'rb')
+            try:
+                return entry, f.read()
+            finally:
+                f.close()
+        except (IOError, ValueError):
+            return None
+
+    def _write(self, url, entry, content=None):
+        '''Stores the headers and, if given, the content of a URL.'''
+        meta, body = self._paths(url)
+        # The content is written first, and each file is renamed into
+        # place whole, so a reader never sees a partial entry.
+        files = [(meta, json.dumps(entry))]
+        if content is not None:
+            files.insert(0, (body, content))
+        for path, data in files:
+            temporary = '%s.%d.%d' % (path, os.getpid(),
+                                      threading.current_thread().ident)
+            f = open(temporary, 'wb')
+            try:
+                f.write(data)
+            finally:
+                f.close()
+            os.rename(temporary, path)
+
+    def _connect(self, key):
+        self._lock.acquire()
+        try:
+            idle = self._connections.get(key)
+            if idle:
+                return idle.pop(), True
+        finally:
+            self._lock.release()
+        scheme, host, port = key
+        if 'https' == scheme:
+            connection = httplib.HTTPSConnection(host, port,
+                                                 timeout=self.timeout)
+        else:
+            connection = httplib.HTTPConnection(host, port,
+                                                timeout=self.timeout)
+        return connection, False
+
+    def _release(self, key, connection):
+        self._lock.acquire()
+        try:
+            self._connections.setdefault(key, []).append(connection)
+        finally:
+            self._lock.release()
+
+    def _request(self, url, headers):
+        '''
+        Makes a GET request on a kept-alive connection and returns the
+        status, headers and content of the response.
+        '''
+        parts = urlparse.urlsplit(url)
+        key = (parts.scheme, parts.hostname, parts.port)
+        path = parts.path or '/'
+        if parts.query:
+            path += '?' + parts.query
+        while True:
+            connection, reused = self._connect(key)
+            try:
+                connection.request('GET', path, headers=headers)
+                response = connection.getresponse()
+                content = response.read()
+            except (httplib.HTTPException, EnvironmentError):
+                connection.close()
+                if reused:
+                    # The server may have closed it while it was idle.
+                    continue
+                raise
+            if response.will_close:
+                connection.close()
+            else:
+                self._release(key, connection)
+            return response.status, response, content
+
+    def __call__(self, url):
+        '''Returns the content at a URL, from the cache if it is fresh.'''
+        if not url.startswith(('http://', 'https://')):
+            f = urllib2.urlopen(url)
+            try:
+                return f.read()
+            finally:
+                f.close()
+
+        cached = self._read(url)
+        if cached is not None:
+            entry, content = cached
+            if self.offline or time.time() - entry['time'] <= self.max_age:
+                self.hits += 1
+                return content
+        elif self.offline:
+            raise FetchError, 'not cached: %s' % (url,)
+
+        headers = {}
+        if cached is not None:
+            if entry.get('etag'):
+                headers['If-None-Match'] = entry['etag']
+            if entry.get('last_modified'):
+                headers['If-Modified-Since'] = entry['last_modified']
+
+        location = url
+        for i in xrange(max_redirects + 1):
+            status, response, body = self._request(location, headers)
+            if status in (301, 302, 303, 307, 308):
+                location = uri.resolve(location,
+                                       response.getheader('location', ''))
+                # The validators are those of the URL asked for, not of
+                # where it now leads.
+                headers = {}
+                continue
+            break
+
+        if 304 == status and cached is not None:
+            entry['time'] = time.time()
+            self._write(url, entry)
+            self.revalidated += 1
+            return content
+        if 200 != status:
+            raise FetchError, 'HTTP %d: %s' % (status, location)
+        entry = {'url': url, 'time': time.time(),
+                 'etag': response.getheader('etag'),
+                 'last_modified': response.getheader('last-modified')}
+        self._write(url, entry, body)
+        self.downloaded += 1
+        return body
@@ -0,0 +1,335 @@
+# -*- coding: utf-8 -*-
+'''
+A read-only, memory-mapped index of a stylesheet.
+
+An index file is written once with `write()` and opened with `Index`,
+which maps the file into memory and queries it in place.  Rules are
+decoded only when they are accessed, and processes that open the same
+index share a single copy of it through the page cache.
+
+Layout of an index file (all integers are little-endian):
+
+    header      magic, version and the number of rules, declarations
+                and selectors
+    rules       one entry per rule: kind, text span, media span and
+                the ranges of its declarations and selectors
+    decls       one entry per declaration: property span, value span
+                and the important flag
+    selectors   one entry per selector: selector span and rule number,
+                in stylesheet order
+    order       the selector numbers sorted by selector text, so that
+                lookups can bisect in place
+    text        the UTF-8 text that all of the spans point into
+
+Rulesets nested in an @media rule are indexed as rules of their own
+and carry the media types of the enclosing rule.
+
+Example:
+
+    index.write(stylesheet, 'bundle.idx')
+
+    idx = index.Index('bundle.idx')
+    for rule in idx.lookup(u'p:first-line'):
+        print rule.media_types, rule.declarations()
+'''
+
+import mmap
+import struct
+import css, serialize
+
+__all__ = ('write', 'Index', 'Rule', 'InvalidIndex',
+           'CHARSET', 'IMPORT', 'RULESET', 'PAGE')
+
+class InvalidIndex(ValueError):
+    pass
+
+MAGIC = 'CSSINDEX'
+VERSION = 1
+
+# rule kinds
+CHARSET, IMPORT, RULESET, PAGE = range(4)
+
+header_format = struct.Struct('<8sIIIII')
+rule_format = struct.Struct('<BIIIIIIII')
+decl_format = struct.Struct('<IIIIB')
+selector_format = struct.Struct('<III')
+order_format = struct.Struct('<I')
+
+class _Text(object):
+    '''Accumulates the UTF-8 text section and hands out spans into it.'''
+    def __init__(self):
+        self.chunks = []
+        self.length = 0
+
+    def add(self, s):
+        data = s.encode('utf-8')
+        span = (self.length, len(data))
+        self.chunks.append(data)
+        self.length += len(data)
+        return span
+
+def _rules(stylesheet):
+    '''Generates (rule, media_types) for every indexed rule.'''
+    for rule in stylesheet:
+        if isinstance(rule, css.Media):
+            for ruleset in rule.rulesets:
+                yield ruleset, rule.media_types
+        else:
+            yield rule, None
+
+def write(stylesheet, f):
+    '''
+    Writes an index of the given Stylesheet.
+
+    `f` is either a filename or a file object open for binary writing.
+    '''
+    text = _Text()
+    rules, decls, selectors = [], [], []
+
+    for rule, media_types in _rules(stylesheet):
+        if media_types:
+            media = text.add(u','.join(media_types))
+        else:
+            media = (0, 0)
+        first, first_selector = len(decls), len(selectors)
+
+        if isinstance(rule, css.Charset):
+            kind = CHARSET
+        elif isinstance(rule, css.Import):
+            kind = IMPORT
+        elif isinstance(rule, css.Page):
+            kind = PAGE
+        else:
+            kind = RULESET
+
+        if kind in (RULESET, PAGE):
+            for decl in rule.declarations:
+                prop = text.add(serialize.serialize(decl.property, unicode))
+                value = text.add(serialize.serialize(decl.value, unicode))
+                decls.append(prop + value + (bool(decl.important),))
+
+        if kind == RULESET:
+            for selector in rule.selectors:
+                selectors.append(text.add(selector) + (len(rules),))
+
+        span = text.add(serialize.serialize(rule, unicode))
+        rules.append((kind,) + span + media +
+                     (first, len(decls) - first,
+                      first_selector, len(selectors) - first_selector))
+
+    # Sorting by the encoded text gives the same order as the
+    # byte-wise comparisons made by Index.lookup().
+    blob = ''.join(text.chunks)
+    order = range(len(selectors))
+    order.sort(key=lambda n: blob[selectors[n][0]:
+                                  selectors[n][0] + selectors[n][1]])
+
+    close = False
+    if isinstance(f, basestring):
+        f = open(f, 'wb')
+        close = True
+    try:
+        f.write(header_format.pack(MAGIC, VERSION, len(rules), len(decls),
+                                   len(selectors), text.length))
+        for entry in rules:
+            f.write(rule_format.pack(*entry))
+        for entry in decls:
+            f.write(decl_format.pack(*entry))
+        for entry in selectors:
+            f.write(selector_format.pack(*entry))
+        for number in order:
+            f.write(order_format.pack(number))
+        f.write(blob)
+    finally:
+        if close:
+            f.close()
+
+class Index(object):
+    '''
+    A memory-mapped stylesheet index.
+
+    Indexing by number returns a `Rule`; nothing is decoded until the
+    rule's attributes are read.
+    '''
+    def __init__(self, filename):
+        f = open(filename, 'rb')
+        try:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        finally:
+            f.close()
+
+        if len(self._map) < header_format.size:
+            raise InvalidIndex, 'File is too short to be a stylesheet index.'
+        (magic, version, self._nrules, self._ndecls,
+         self._nselectors, textlen) = header_format.unpack_from(self._map, 0)
+        if MAGIC != magic or VERSION != version:
+            raise InvalidIndex, 'Not a version %d stylesheet index.' % VERSION
+
+        self._rules = header_format.size
+        self._decls = self._rules + self._nrules * rule_format.size
+        self._selectors = self._decls + self._ndecls * decl_format.size
+        self._order = self._selectors + self._nselectors * selector_format.size
+        self._text = self._order + self._nselectors * order_format.size
+        if len(self._map) != self._text + textlen:
+            raise InvalidIndex, 'Stylesheet index is truncated.'
+
+    def __repr__(self):
+        return '<Index of %d rules>' % (self._nrules,)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        '''Unmaps the index file.'''
+        self._map.close()
+
+    def __len__(self):
+        '''Returns the number of rules.'''
+        return self._nrules
+
+    def __getitem__(self, number):
+        '''Returns the rule with the given number.'''
+        if number < 0:
+            number += self._nrules
+        if not 0 <= number < self._nrules:
+            raise IndexError, 'rule number out of range'
+        return Rule(self, number)
+
+    def __iter__(self):
+        '''Iterates the rules in stylesheet order.'''
+        for number in xrange(self._nrules):
+            yield Rule(self, number)
+
+    def raw(self, offset, length):
+        '''
+        Returns a span of the text section as undecoded bytes.
+
+        The span is a buffer over the mapped file, so nothing is copied;
+        compare it with other buffers, not with strings.
+        '''
+        return buffer(self._map, self._text + offset, length)
+
+    def string(self, offset, length):
+        '''Returns a span of the text section as Unicode.'''
+        return unicode(self.raw(offset, length), 'utf-8')
+
+    def rule_entry(self, number):
+        return rule_format.unpack_from(self._map, self._rules +
+                                       number * rule_format.size)
+
+    def decl_entry(self, number):
+        return decl_format.unpack_from(self._map, self._decls +
+                                       number * decl_format.size)
+
+    def selector_entry(self, number):
+        return selector_format.unpack_from(self._map, self._selectors +
+                                           number * selector_format.size)
+
+    def sorted_selector(self, position):
+        number, = order_format.unpack_from(self._map, self._order +
+                                           position * order_format.size)
+        return self.selector_entry(number)
+
+    def lookup(self, selector):
+        '''
+        Returns the rules having the given selector, in stylesheet order.
+
+        The selector must be written as the serializer writes it.
+        '''
+        key = buffer(selector.encode('utf-8'))
+        lo, hi = 0, self._nselectors
+        while lo < hi:
+            mid = (lo + hi) // 2
+            offset, length, number = self.sorted_selector(mid)
+            if self.raw(offset, length) < key:
+                lo = mid + 1
+            else:
+                hi = mid
+
+        numbers = []
+        while lo < self._nselectors:
+            offset, length, number = self.sorted_selector(lo)
+            if self.raw(offset, length) != key:
+                break
+            numbers.append(number)
+            lo += 1
+        numbers.sort()
+        return [Rule(self, number) for number in numbers]
+
+class Rule(object):
+    '''A lazily decoded view of one rule in an `Index`.'''
+    def __init__(self, index, number):
+        self.index = index
+        self.number = number
+        self._entry = None
+
+    def __repr__(self):
+        return '<Rule %d of %r>' % (self.number, self.index)
+
+    @property
+    def entry(self):
+        if self._entry is None:
+            self._entry = self.index.rule_entry(self.number)
+        return self._entry
+
+    @property
+    def kind(self):
+        '''One of CHARSET, IMPORT, RULESET or PAGE.'''
+        return self.entry[0]
+
+    @property
+    def raw(self):
+        '''The serialized text of the rule as a buffer of UTF-8 bytes.'''
+        return self.index.raw(self.entry[1], self.entry[2])
+
+    @property
+    def text(self):
+        '''The serialized text of the rule.'''
+        return self.index.string(self.entry[1], self.entry[2])
+
+    @property
+    def media_types(self):
+        '''The media types of the enclosing @media rule, if any.'''
+        if not self.entry[4]:
+            return []
+        return self.index.string(self.entry[3], self.entry[4]).split(u',')
+
+    @property
+    def selectors(self):
+        '''Returns the selectors of a ruleset.'''
+        first, count = self.entry[7], self.entry[8]
+        result = []
+        for number in xrange(first, first + count):
+            offset, length, rule = self.index.selector_entry(number)
+            result.append(self.index.string(offset, length))
+        return result
+
+    def declarations(self):
+        '''Returns a list of (property, value, important) tuples.'''
+        first, count = self.entry[5], self.entry[6]
+        result = []
+        for number in xrange(first, first + count):
+            (prop_offset, prop_length, value_offset,
+             value_length, important) = self.index.decl_entry(number)
+            result.append((self.index.string(prop_offset, prop_length),
+                           self.index.string(value_offset, value_length),
+                           bool(important)))
+        return result
+
+    def node(self):
+        '''
+        Parses the rule into a syntax object.
+
+        A ruleset that was nested in an @media rule is returned inside a
+        Media of its own, so that it keeps applying to the same media.
+        '''
+        from parse import parse
+        stylesheet = parse(self.text)
+        rule = iter(stylesheet).next()
+        media_types = self.media_types
+        if media_types:
+            rule = css.Media(media_types, [rule])
+        return rule
@@ -0,0 +1,327 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+'''
+Inlining of @import rules.
+
+`inline()` replaces the @import rules of a stylesheet with the rules of
+the stylesheets they import, directly or not, e.g.
+
+    @import url(print.css) print;
+    a { color: red }
+
+becomes
+
+    @media print { h1 { page-break-after: avoid } }
+    a { color: red }
+
+Imports are resolved against the URL of the stylesheet that makes them.
+The stylesheets of the whole import graph are fetched concurrently,
+with a bounded pool of threads, and each URL is fetched and parsed
+once, however often it is imported.  Import cycles raise CyclicImport.
+
+Relative url() values in imported stylesheets are rewritten to refer to
+the same resources from the importing stylesheet.
+'''
+
+import re
+import sys
+import copy
+import codecs
+import posixpath
+import urllib2
+import Queue
+from multiprocessing.pool import ThreadPool
+import css, parse
+from uri import uri
+
+__all__ = ('inline', 'combine', 'load', 'imports', 'sniff', 'decode',
+           'read_url', 'parse_data', 'CyclicImport')
+
+class CyclicImport(ValueError):
+    '''Stylesheets import each other in a cycle.'''
+    def __init__(self, cycle):
+        ValueError.__init__(self, 'cyclic @import: ' + ' -> '.join(cycle))
+        self.cycle = cycle
+
+# byte order mark => encoding
+boms = ((codecs.BOM_UTF8, 'utf-8'),
+        (codecs.BOM_UTF16_LE, 'utf-16-le'),
+        (codecs.BOM_UTF16_BE, 'utf-16-be'))
+
+re_charset = re.compile(r'@charset "([^"]*)";')
+
+def sniff(head):
+    '''
+    Returns the encoding of a stylesheet given its first bytes, by its
+    byte order mark, its @charset rule or, lacking both, UTF-8, and the
+    length of its byte order mark.
+    '''
+    for bom, encoding in boms:
+        if head.startswith(bom):
+            return encoding, len(bom)
+    m = re_charset.match(head)
+    if m:
+        try:
+            return codecs.lookup(m.group(1)).name, 0
+        except LookupError:
+            pass
+    return 'utf-8', 0
+
+def decode(data):
+    '''
+    Decodes the bytes of a stylesheet by its byte order mark, its
+    @charset rule or, lacking both, as UTF-8.
+    '''
+    if isinstance(data, unicode):
+        return data
+    encoding, start = sniff(data)
+    return data[start:].decode(encoding, 'replace')
+
+def read_url(url):
+    '''Returns the content at a URL, e.g. a file:// or http:// URL.'''
+    f = urllib2.urlopen(url)
+    try:
+        return f.read()
+    finally:
+        f.close()
+
+def parse_data(data):
+    '''Returns the stylesheet parsed from the content at a URL.'''
+    return parse.parse(decode(data))
+
+def _imports(sheet, url):
+    '''Returns the (URL, media types) of each import of a stylesheet.'''
+    return [(uri.resolve(url, rule.source.url), rule.media_types)
+            for rule in sheet.imports]
+
+def imports(stylesheet, url):
+    '''
+    Returns the URLs of the stylesheets imported by the one at url, in
+    order.
+    '''
+    return [x for x, media in _imports(stylesheet, url)]
+
+def _fetch(fetch, url):
+    # Runs in a worker thread: errors are passed back, not raised.
+    try:
+        return url, fetch(url), None
+    except Exception:
+        return url, None, sys.exc_info()
+
+def _rebase(url, base, root):
+    '''
+    Returns a url() value from the stylesheet at base rewritten to
+    refer to the same resource from the stylesheet at root.
+    '''
+    if -1 != uri.scheme_end(url) or url.startswith('#'):
+        return url
+    target = uri.resolve(base, url)
+    if uri.resolve(root, url) == target:
+        return url
+    first = uri.service_end(root)
+    if target[:first] != root[:first]:
+        return target
+    last = uri.hierarchy_end(target, first)
+    folder = posixpath.dirname(root[first:uri.hierarchy_end(root, first)])
+    return posixpath.relpath(target[first:last], folder or '/') + target[last:]
+
+def _rebase_sheet(sheet, url, root):
+    '''Rewrites the url() values of the stylesheet at url for root.'''
+    for statement in sheet.statements:
+        for x in css.walk(statement):
+            if isinstance(x, css.Uri):
+                rebased = _rebase(x.url, url, root)
+                if rebased != x.url:
+                    x.url = rebased
+
+def _load(root, stylesheet, fetch, workers, parser):
+    '''
+    Fetches and parses every stylesheet imported from the one at root,
+    directly or not.  Returns the dict of URL => stylesheet, including
+    root, and the dict of URL => imported URLs.
+    '''
+    sheets = {root: stylesheet}
+    graph = {}
+    results = Queue.Queue()
+    pool = ThreadPool(workers)
+    try:
+        pending = 0
+        parsed = [root]
+        while parsed or pending:
+            # Fetch whatever the sheets parsed so far import, then parse
+            # each sheet as it arrives.  Parsing is left to this thread.
+            while parsed:
+                url = parsed.pop()
+                graph[url] = imports(sheets[url], url)
+                for child in graph[url]:
+                    if child not in sheets:
+                        sheets[child] = None
+                        pool.apply_async(_fetch, (fetch, child),
+                                         callback=results.put)
+                        pending += 1
+            if pending:
+                url, data, error = results.get()
+                pending -= 1
+                if error:
+                    raise error[0], error[1], error[2]
+                sheets[url] = parser(data)
+                _rebase_sheet(sheets[url], url, root)
+                parsed.append(url)
+    finally:
+        pool.terminate()
+    return sheets, graph
+
+def _check(graph, root):
+    '''Raises CyclicImport if any stylesheet imports itself.'''
+    path, done = [], set()
+    def visit(url):
+        path.append(url)
+        for child in graph[url]:
+            if child in path:
+                raise CyclicImport(path[path.index(child):] + [child])
+            if child not in done:
+                visit(child)
+        path.pop()
+        done.add(url)
+    visit(root)
+
+def _types(media_types):
+    '''Returns the media types in lowercase, or None for all media.'''
+    types = [x.lower() for x in media_types or ()]
+    if not types or u'all' in types:
+        return None
+    return types
+
+def _intersect(a, b):
+    '''Returns the media types in both lists, or None for all media.'''
+    a, b = _types(a), _types(b)
+    if a is None:
+        return b
+    if b is None:
+        return a
+    return [x for x in a if x in b]
+
+def _wrap(statements, media):
+    '''
+    Returns statements restricted to the given media types, as they
+    would be if they were imported for them.
+    '''
+    if media is None:
+        return list(statements)
+    result, rulesets = [], []
+    for statement in statements:
+        if isinstance(statement, css.Ruleset):
+            rulesets.append(statement)
+            continue
+        if rulesets:
+            result.append(css.Media(list(media), rulesets))
+            rulesets = []
+        if isinstance(statement, css.Media):
+            # The statement is left as it is, for any copies of it.
+            types = _intersect(media, statement.media_types)
+            if types == _types(statement.media_types):
+                result.append(statement)
+            elif types:
+                result.append(css.Media(types, list(statement.rulesets)))
+        elif isinstance(statement, css.Page):
+            # @page rules cannot be put in @media; they only apply in
+            # print anyway.
+            if u'print' in media:
+                result.append(statement)
+        else:
+            result.append(statement)
+    if rulesets:
+        result.append(css.Media(list(media), rulesets))
+    return result
+
+def _statements(url, media, sheets, used):
+    '''
+    Returns the statements of the stylesheet at url, with its imports
+    inlined, for the given media types.
+    '''
+    sheet = sheets[url]
+    result = []
+    for child, types in _imports(sheet, url):
+        types = _intersect(media, types)
+        if types != []:
+            result.extend(_statements(child, types, sheets, used))
+    statements = sheet.statements
+    if url in used:
+        # imported again: the rules apply again, in a copy of their own
+        statements = copy.deepcopy(statements)
+    used.add(url)
+    result.extend(_wrap(statements, media))
+    return result
+
+def inline(stylesheet, base, fetch=read_url, workers=4, parser=parse_data):
+    '''
+    Returns a stylesheet with the rules of every stylesheet imported by
+    the given one, which was read from the URL base, in place of its
+    @import rules.
+
+    `fetch(url)` returns the content at a URL.  Up to `workers` calls
+    to it are made at once.  `parser(data)` returns the stylesheet
+    parsed from such content.
+
+    The statements of the given stylesheet are moved to the result.
+    '''
+    sheets, graph = _load(base, stylesheet, fetch, workers, parser)
+    _check(graph, base)
+    statements = _statements(base, None, sheets, set())
+    return css.Stylesheet(statements, charset=stylesheet.charset)
+
+def combine(sheets, root):
+    '''
+    Returns the stylesheet at root with its imports inlined from sheets,
+    a dict of URL => stylesheet that holds every stylesheet it imports,
+    directly or not.
+
+    Unlike inline(), this copies the stylesheets, and leaves them as
+    they are.
+    '''
+    graph, pending = {}, [root]
+    while pending:
+        url = pending.pop()
+        if url not in graph:
+            graph[url] = imports(sheets[url], url)
+            pending.extend(graph[url])
+    _check(graph, root)
+    copies = {}
+    for url in graph:
+        copies[url] = copy.deepcopy(sheets[url])
+        if url != root:
+            _rebase_sheet(copies[url], url, root)
+    statements = _statements(root, None, copies, set())
+    return css.Stylesheet(statements, charset=sheets[root].charset)
+
+def load(url, fetch=read_url, workers=4, parser=parse_data):
+    '''
+    Fetches and parses the stylesheet at url, and returns it with its
+    imports inlined.
+    '''
+    return inline(parser(fetch(url)), url, fetch, workers, parser)
+
+
+if '__main__' == __name__:
+    from optparse import OptionParser
+    import serialize, fetch
+    opts = OptionParser("usage: %prog [options] url")
+    opts.add_option('-w', '--workers', type='int', default=4,
+                    help='number of stylesheets fetched at once')
+    opts.add_option('-c', '--cache', metavar='DIR',
+                    help='keep fetched stylesheets in DIR')
+    opts.add_option('-a', '--max-age', type='float', default=0,
+                    help='seconds to use a cached stylesheet unchecked')
+    opts.add_option('-o', '--offline', action='store_true', default=False,
+                    help='use cached stylesheets only')
+
+    options, args = opts.parse_args()
+
+    if 1 != len(args):
+        opts.error("no url given")
+
+    reader = read_url
+    if options.cache:
+        reader = fetch.Cache(options.cache, options.max_age, options.offline)
+    stylesheet = load(args[0], reader, options.workers)
+    sys.stdout.write(serialize.encode(stylesheet))
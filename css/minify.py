@@ -0,0 +1,251 @@
+# -*- coding: utf-8 -*-
+'''
+A minifying serializer for CSS.
+
+Writes the same rules as the serializer with every byte that is not
+needed dropped, and rewrites values to shorter equivalents where that
+is always safe:
+
+  - colors take their shortest form, e.g. #ffcc00 => #fc0 and
+    rgb(255,0,0) => red;
+  - zero lengths lose their unit, e.g. 0px => 0;
+  - numbers lose leading and trailing zeros, e.g. 0.50em => .5em.
+
+Types without a minifier of their own are written by the serializer.
+'''
+
+import inspect
+import css, colors, serialize
+
+__all__ = ('minify', 'iterminify', 'dump', 'encode', 'dump_encoded',
+           'register', 'register_iterator')
+
+# Units of length, which may be dropped from a zero.  (Zero angles,
+# times, frequencies and percentages keep their units.)
+length_units = frozenset((u'px', u'em', u'ex', u'in', u'cm', u'mm',
+                          u'pt', u'pc'))
+
+# type => minifier method, as registered
+minifiers = {}
+
+# type => chunk generator, as registered
+iterators = {}
+
+# (table, type) => method or None, for every type seen
+_dispatch = {}
+
+def _lookup(table, cls):
+    try:
+        return _dispatch[id(table), cls]
+    except KeyError:
+        method = None
+        for base in inspect.getmro(cls):
+            if base in table:
+                method = table[base]
+                break
+        _dispatch[id(table), cls] = method
+        return method
+
+def register(cls, method):
+    '''
+    Registers the minifier method for objects of the given type and,
+    unless they have their own, of its subclasses.
+    '''
+    minifiers[cls] = method
+    _dispatch.clear()
+
+def register_iterator(cls, method):
+    '''
+    Registers the minifying chunk generator for objects of the given
+    type and, unless they have their own, of its subclasses.
+    '''
+    iterators[cls] = method
+    _dispatch.clear()
+
+def minify(obj, printer=str):
+    '''Returns the minified serialization of obj.'''
+    method = _lookup(minifiers, type(obj))
+    if method is None:
+        return serialize.serialize(obj, printer)
+    return method(obj, printer)
+
+def iterminify(obj, printer=str):
+    '''
+    Generates the minified serialization of obj in chunks.
+
+    The chunks join to exactly what minify() returns.
+    '''
+    method = _lookup(iterators, type(obj))
+    if method is None:
+        return iter((minify(obj, printer),))
+    return method(obj, printer)
+
+def dump(obj, fp, printer=str):
+    '''
+    Writes the minified serialization of obj to a file-like object,
+    one chunk at a time.
+    '''
+    write = fp.write
+    for chunk in iterminify(obj, printer):
+        write(chunk)
+
+def encode(obj, encoding=None):
+    '''
+    Returns the minified serialization of obj as a byte string in the
+    given encoding or, by default, that of its @charset rule or UTF-8.
+
+    See serialize.encode().
+    '''
+    buffer = bytearray()
+    for data in serialize.iterencode(iterminify(obj, unicode),
+                                     encoding or serialize.charset(obj)):
+        buffer += data
+    return str(buffer)
+
+def dump_encoded(obj, fp, encoding=None):
+    '''
+    Writes the minified serialization of obj to a binary file-like
+    object in the given encoding or, by default, that of its @charset
+    rule or UTF-8.
+    '''
+    write = fp.write
+    for data in serialize.iterencode(iterminify(obj, unicode),
+                                     encoding or serialize.charset(obj)):
+        write(data)
+
+def minify_number(number):
+    '''Formats a number without leading or trailing zeros.'''
+    s = css.format_number(number)
+    if s.startswith(u'0.'):
+        s = s[1:]
+    return s
+
+def minify_Color(obj, printer):
+    return printer(colors.text(css.Color(*obj.rgba)))
+
+def minify_Hexcolor(obj, printer):
+    color = colors.from_term(obj)
+    if color is None:
+        return serialize.serialize_Hexcolor(obj, printer)
+    return minify_Color(color, printer)
+
+def minify_Function(obj, printer):
+    color = colors.from_term(obj)
+    if color is not None:
+        return minify_Color(color, printer)
+    return (printer(obj.name) + printer('(') +
+            minify(obj.parameters, printer) + printer(')'))
+
+def minify_Term(obj, printer):
+    if obj.number is None:
+        return serialize.serialize_Term(obj, printer)
+    if 0 == obj.number and obj.unit in length_units:
+        return printer('0')
+    # The number is written in the fewest digits that read back as the
+    # same value, unless the text it has is as short.
+    s = minify_number(obj.number) + obj.unit
+    if len(obj.value) <= len(s):
+        s = obj.value
+    s = printer(s)
+    if u'-' == obj.unary_operator and 0 != obj.number:
+        s = printer('-') + s
+    return s
+
+def minify_Expression(obj, printer):
+    s = minify(obj.terms[0], printer)
+    for operator, term in zip(obj.operators, obj.terms[1:]):
+        s += printer(operator) + minify(term, printer)
+    return s
+
+def minify_Declaration(obj, printer):
+    s = serialize.serialize_Ident(obj.property, printer)
+    s += printer(':') + minify(obj.value, printer)
+    if obj.important:
+        s += printer('!important')
+    return s
+
+def minify_Import(obj, printer):
+    # @import"a.css"print; is as valid as @import url(a.css) print;
+    source = obj.source
+    if isinstance(source, css.Uri):
+        source = css.String(source.url)
+    s = printer('@import') + serialize.serialize(source, printer)
+    if obj.media_types:
+        s += printer(',').join((printer(x) for x in obj.media_types))
+    return s + printer(';')
+
+def minify_Ruleset(obj, printer):
+    return printer('').join(iter_Ruleset(obj, printer))
+
+def minify_Page(obj, printer):
+    return printer('').join(iter_Page(obj, printer))
+
+def minify_Media(obj, printer):
+    return printer('').join(iter_Media(obj, printer))
+
+def minify_Stylesheet(obj, printer):
+    return printer('').join(iter_Stylesheet(obj, printer))
+
+def iter_Declaration_block(declarations, printer):
+    mark = getattr(printer, 'mark', None)
+    yield printer('{')
+    separator = printer(';')
+    for i, declaration in enumerate(declarations):
+        if i:
+            yield separator
+        if mark:
+            mark(declaration)
+        yield minify_Declaration(declaration, printer)
+    yield printer('}')
+
+def iter_Ruleset(obj, printer):
+    mark = getattr(printer, 'mark', None)
+    if mark:
+        mark(obj)
+    yield serialize.serialize_Selector_group(obj.selectors, printer)
+    for chunk in iter_Declaration_block(obj.declarations, printer):
+        yield chunk
+
+def iter_Page(obj, printer):
+    s = printer('@page')
+    if obj.pseudo_page:
+        s += serialize.serialize_Pseudo(obj.pseudo_page, printer)
+    yield s
+    for chunk in iter_Declaration_block(obj.declarations, printer):
+        yield chunk
+
+def iter_Media(obj, printer):
+    s = printer('@media ')
+    s += printer(',').join((printer(x) for x in obj.media_types))
+    yield s + printer('{')
+    for ruleset in obj.rulesets:
+        for chunk in iter_Ruleset(ruleset, printer):
+            yield chunk
+    yield printer('}')
+
+def iter_Stylesheet(obj, printer):
+    if obj.charset:
+        # The @charset rule must be written exactly, with its space.
+        yield serialize.serialize_Charset(obj.charset, printer)
+    for x in obj.imports:
+        yield minify_Import(x, printer)
+    for statement in obj.statements:
+        for chunk in iterminify(statement, printer):
+            yield chunk
+
+register(css.Color, minify_Color)
+register(css.Hexcolor, minify_Hexcolor)
+register(css.Function, minify_Function)
+register(css.Term, minify_Term)
+register(css.Expression, minify_Expression)
+register(css.Declaration, minify_Declaration)
+register(css.Import, minify_Import)
+register(css.Ruleset, minify_Ruleset)
+register(css.Page, minify_Page)
+register(css.Media, minify_Media)
+register(css.Stylesheet, minify_Stylesheet)
+
+register_iterator(css.Ruleset, iter_Ruleset)
+register_iterator(css.Page, iter_Page)
+register_iterator(css.Media, iter_Media)
+register_iterator(css.Stylesheet, iter_Stylesheet)
@@ -0,0 +1,147 @@
+# -*- coding: utf-8 -*-
+'''
+Bulk rewriting of the numeric terms in a stylesheet.
+
+The quantities under a syntax object are pulled into NumPy arrays once,
+rewritten with array operations, and stored back into their terms.
+Only terms whose value actually changed are touched, so the rest keep
+their original text.
+
+Requires NumPy.
+
+Example:
+
+    # px => rem, then round to three decimal places
+    q = numeric.extract(stylesheet)
+    q.convert(u'px', u'rem', 1/16.)
+    q.round(3, u'rem')
+    q.store()
+'''
+
+import css
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+__all__ = ('Quantities', 'extract', 'convert', 'scale', 'round')
+
+class Quantities(object):
+    '''
+    The numeric terms beneath a syntax object.
+
+    `values` holds the signed number of each term and `units` its unit,
+    both as NumPy arrays in document order.  Modify them directly or
+    with the methods below, then call `store()`.
+
+    Methods that take `units` restrict themselves to terms having one of
+    the given units; with no units they apply to every term.
+    '''
+    def __init__(self, terms):
+        if numpy is None:
+            raise ImportError, 'css.numeric requires NumPy.'
+        self.terms = terms
+        self.values = numpy.array([_signed(t) for t in terms], dtype=float)
+        self.units = numpy.array([t.unit for t in terms], dtype=unicode)
+        self._values = self.values.copy()
+        self._units = self.units.copy()
+
+    def __repr__(self):
+        return '<Quantities of %d terms>' % (len(self.terms),)
+
+    def __len__(self):
+        return len(self.terms)
+
+    def select(self, *units):
+        '''Returns a boolean mask of the terms having one of the units.'''
+        if not units:
+            return numpy.ones(len(self.terms), dtype=bool)
+        return numpy.in1d(self.units, numpy.array(units, dtype=unicode))
+
+    def apply(self, function, *units):
+        '''
+        Replaces the selected values with `function(values)`.
+
+        The function receives and returns an array.
+        '''
+        mask = self.select(*units)
+        self.values[mask] = function(self.values[mask])
+
+    def scale(self, factor, *units):
+        '''Multiplies the selected values by a factor.'''
+        mask = self.select(*units)
+        self.values[mask] *= factor
+
+    def round(self, decimals=0, *units):
+        '''Rounds the selected values to a number of decimal places.'''
+        mask = self.select(*units)
+        self.values[mask] = numpy.round(self.values[mask], decimals)
+
+    def convert(self, from_unit, to_unit, factor):
+        '''Converts values in one unit to another by a factor.'''
+        mask = self.units == from_unit
+        self.values[mask] *= factor
+        self.units = numpy.where(mask, to_unit, self.units)
+
+    def store(self):
+        '''
+        Writes changed values back into their terms.
+
+        Returns the number of terms modified.
+        '''
+        changed = ((self.values != self._values) |
+                   (self.units != self._units))
+        indices = numpy.flatnonzero(changed)
+        for i in indices:
+            term, value = self.terms[i], float(self.values[i])
+            term.number = abs(value)
+            term.unit = unicode(self.units[i])
+            if value < 0:
+                term.unary_operator = u'-'
+            elif u'-' == term.unary_operator or 0 == value:
+                term.unary_operator = None
+        self._values = self.values.copy()
+        self._units = self.units.copy()
+        return len(indices)
+
+def _signed(term):
+    if u'-' == term.unary_operator:
+        return -term.number
+    return term.number
+
+def extract(obj):
+    '''Collects the quantities beneath a syntax object.'''
+    return Quantities([x for x in css.walk(obj)
+                       if isinstance(x, css.Term) and x.number is not None])
+
+def convert(obj, from_unit, to_unit, factor):
+    '''
+    Converts every quantity in one unit to another, e.g.
+    `convert(stylesheet, u'px', u'rem', 1/16.)`.
+
+    Returns the number of terms modified.
+    '''
+    q = extract(obj)
+    q.convert(from_unit, to_unit, factor)
+    return q.store()
+
+def scale(obj, factor, *units):
+    '''
+    Multiplies every quantity having one of the units by a factor.
+
+    Returns the number of terms modified.
+    '''
+    q = extract(obj)
+    q.scale(factor, *units)
+    return q.store()
+
+def round(obj, decimals=0, *units):
+    '''
+    Rounds every quantity having one of the units.
+
+    Returns the number of terms modified.
+    '''
+    q = extract(obj)
+    q.round(decimals, *units)
+    return q.store()
@@ -0,0 +1,291 @@
+# -*- coding: utf-8 -*-
+'''
+Elimination of overridden declarations and of duplicate rulesets.
+
+Three rewrites are made, each only where the result of the cascade is
+unchanged:
+
+  - Within a declaration block, a declaration is dropped when it is
+    repeated exactly later on, or when later declarations of at least
+    the same importance, or important declarations anywhere, set every
+    property it sets with values every browser understands: numbers
+    in the units of CSS 2.1, keywords of CSS 2.1, colors, strings and
+    URLs.  Other declarations, e.g. display:grid, width:100px\9 or
+    those using vendor-prefixed keywords, are neither taken to override
+    anything nor dropped, since they are commonly written before or
+    after a fallback for browsers without them.
+
+  - Rulesets with the same selectors are merged into one when no
+    statement between them sets any of the properties being moved past
+    it.
+
+  - Rulesets with the same declarations are merged into one with both
+    groups of selectors, under the same condition, unless either has a
+    pseudo-class or pseudo-element that is vendor-prefixed or not of
+    CSS 2.1: browsers drop a whole rule for one selector they do not
+    understand.
+
+Rulesets are grouped by hashing their selectors and declaration blocks,
+and statements in between are checked with a per-property index of
+statement positions, so the passes run in near-linear time.
+'''
+
+import re
+import bisect
+import css, colors, serialize, shorthand
+
+__all__ = ('collapse', 'collapse_declarations', 'merge_rulesets',
+           'optimize')
+
+def _name(declaration):
+    return declaration.property.name.lower()
+
+# the units of CSS 2.1
+units = frozenset([u'', u'%', u'px', u'em', u'ex', u'in', u'cm', u'mm',
+                   u'pt', u'pc', u'deg', u'rad', u'grad', u'ms', u's',
+                   u'hz', u'khz'])
+
+# the keywords of the values of CSS 2.1
+keywords = frozenset(u'''
+    inherit auto none normal hidden visible scroll collapse separate show
+    hide top bottom left right center middle baseline sub super text-top
+    text-bottom both block inline inline-block list-item run-in table
+    inline-table table-row-group table-header-group table-footer-group
+    table-row table-column-group table-column table-cell table-caption
+    static relative absolute fixed ltr rtl embed bidi-override repeat
+    repeat-x repeat-y no-repeat transparent dotted dashed solid
+    double groove ridge inset outset thin medium thick italic oblique
+    small-caps bold bolder lighter xx-small x-small small large x-large
+    xx-large smaller larger caption icon menu message-box small-caption
+    status-bar serif sans-serif cursive fantasy monospace underline
+    overline line-through blink capitalize uppercase lowercase pre nowrap
+    pre-wrap pre-line justify disc circle square decimal
+    decimal-leading-zero lower-roman upper-roman lower-greek lower-latin
+    upper-latin armenian georgian lower-alpha upper-alpha inside outside
+    crosshair default pointer move e-resize ne-resize nw-resize n-resize
+    se-resize sw-resize s-resize w-resize text wait help progress invert
+    open-quote close-quote no-open-quote no-close-quote avoid always
+    '''.split()) | frozenset(colors.NAMES)
+
+# the functions of the values of CSS 2.1
+functions = frozenset([u'attr', u'counter', u'counters', u'rect', u'rgb'])
+
+# properties that take any identifier, as a font family name
+families = frozenset([u'font', u'font-family'])
+
+def _understood(term, property):
+    '''Indicates whether every browser understands a term.'''
+    if isinstance(term, css.Expression):
+        for x in term.terms:
+            if not _understood(x, property):
+                return False
+        return True
+    if isinstance(term, css.Term):
+        return term.number is not None and term.unit.lower() in units
+    if isinstance(term, css.Ident):
+        name = term.name.lower()
+        return name in keywords or (property in families and
+                                    not name.startswith((u'-', u'\\')))
+    if isinstance(term, css.Hexcolor):
+        return len(term.value) in (3, 6)
+    if isinstance(term, css.Color):
+        return 255 == term.alpha
+    if isinstance(term, css.Function):
+        return (term.name.lower() in functions and
+                _understood(term.parameters, property))
+    return isinstance(term, (css.String, css.Uri))
+
+def _overrides(declaration):
+    '''
+    Indicates whether a declaration may be taken to override others:
+    whether every browser understands its value.
+    '''
+    return _understood(declaration.value, _name(declaration))
+
+def _key(declaration):
+    # Declarations are written by property and value, not copied from
+    # the source, so that the way they were written does not matter.
+    return (_name(declaration), serialize.serialize(declaration.value,
+                                                    unicode),
+            bool(declaration.important))
+
+def collapse_declarations(declarations):
+    '''Returns the declarations that are not overridden in the block.'''
+    # An important declaration wins over normal ones before it, too.
+    winners = set()
+    for declaration in declarations:
+        if declaration.important and _overrides(declaration):
+            winners |= shorthand.leaves(_name(declaration))
+
+    normal, important = set(), set()
+    later = set()
+    kept = []
+    for declaration in reversed(declarations):
+        key = _key(declaration)
+        if key in later:
+            # repeated exactly later on
+            continue
+        later.add(key)
+        leaves = shorthand.leaves(_name(declaration))
+        if declaration.important:
+            covered = leaves <= important
+        else:
+            covered = leaves <= (normal | winners)
+        if not _overrides(declaration):
+            # kept wherever it is, being perhaps a fallback for the
+            # declarations after it or those before
+            kept.append(declaration)
+        elif not covered:
+            kept.append(declaration)
+            if declaration.important:
+                important |= leaves
+            else:
+                normal |= leaves
+    kept.reverse()
+    return kept
+
+def collapse(obj):
+    '''
+    Drops overridden declarations from every declaration block beneath
+    the given syntax object.
+
+    Modifies the declaration blocks *in place.*
+    '''
+    for x in css.walk(obj):
+        if isinstance(x, (css.Ruleset, css.Page)):
+            # Unchanged blocks are left alone, to keep their source text.
+            declarations = collapse_declarations(x.declarations)
+            if len(declarations) != len(x.declarations):
+                x.declarations = declarations
+    return obj
+
+def _properties(statement):
+    '''Returns the set of longhands a statement sets.'''
+    if isinstance(statement, css.Media):
+        blocks = statement.rulesets
+    else:
+        blocks = (statement,)
+    result = set()
+    for block in blocks:
+        for declaration in getattr(block, 'declarations', ()):
+            result |= shorthand.leaves(_name(declaration))
+    return result
+
+class _Index(object):
+    '''The positions of the statements that set each longhand.'''
+    def __init__(self, properties):
+        self.positions = {}
+        for i, leaves in enumerate(properties):
+            self.add(leaves, i)
+
+    def add(self, leaves, i):
+        for leaf in leaves:
+            bisect.insort(self.positions.setdefault(leaf, []), i)
+
+    def between(self, leaves, first, last):
+        '''
+        Indicates whether a statement strictly between two positions
+        sets any of the longhands.
+        '''
+        for leaf in leaves:
+            positions = self.positions.get(leaf)
+            if positions:
+                k = bisect.bisect_right(positions, first)
+                if k < len(positions) and positions[k] < last:
+                    return True
+        return False
+
+# the pseudo-classes and pseudo-elements of CSS 2.1
+known_pseudos = frozenset([u'first-child', u'link', u'visited', u'hover',
+                           u'active', u'focus', u'lang', u'first-line',
+                           u'first-letter', u'before', u'after'])
+
+re_quoted = re.compile(ur'"(?:[^"\\]|\\.)*"|\'(?:[^\'\\]|\\.)*\'')
+re_pseudo = re.compile(ur':(-?[_a-zA-Z][-_a-zA-Z0-9]*)')
+
+def _joinable(ruleset):
+    '''
+    Indicates whether every selector of a ruleset is understood by the
+    browsers that understand any, so that it may join others.
+    '''
+    for selector in ruleset.selectors:
+        for name in re_pseudo.findall(re_quoted.sub(u'""', selector)):
+            if name.lower() not in known_pseudos:
+                return False
+    return True
+
+def _groups(statements, key):
+    groups = {}
+    for i, statement in enumerate(statements):
+        if isinstance(statement, css.Ruleset):
+            groups.setdefault(key(statement), []).append(i)
+    return [x for x in groups.values() if 1 < len(x)]
+
+def _block_key(ruleset):
+    return tuple([_key(x) for x in ruleset.declarations])
+
+def merge_rulesets(statements):
+    '''
+    Returns the list of statements with duplicate rulesets merged.
+
+    Rulesets that are merged away are modified *in place.*
+    '''
+    statements = [x for x in statements
+                  if not isinstance(x, css.Ruleset) or x.declarations]
+    properties = [_properties(x) for x in statements]
+    index = _Index(properties)
+
+    # Rulesets with the same selectors: move the earlier block forward
+    # onto the later one or, failing that, the later one back.
+    for positions in _groups(statements, lambda x: tuple(x.selectors)):
+        anchor = positions[0]
+        for i in positions[1:]:
+            first, second = statements[anchor], statements[i]
+            if not index.between(properties[anchor], anchor, i):
+                second.declarations = collapse_declarations(
+                    first.declarations + second.declarations)
+                statements[anchor] = None
+                properties[i] |= properties[anchor]
+                index.add(properties[anchor], i)
+                anchor = i
+            elif not index.between(properties[i], anchor, i):
+                first.declarations = collapse_declarations(
+                    first.declarations + second.declarations)
+                statements[i] = None
+                properties[anchor] |= properties[i]
+                index.add(properties[i], anchor)
+            else:
+                anchor = i
+
+    # Rulesets with the same declarations: join their selectors.
+    for positions in _groups(statements, _block_key):
+        anchor = positions[0]
+        for i in positions[1:]:
+            first, second = statements[anchor], statements[i]
+            if (_joinable(first) and _joinable(second) and
+                    not index.between(properties[i], anchor, i)):
+                selectors = list(first.selectors)
+                for selector in second.selectors:
+                    if selector not in selectors:
+                        selectors.append(selector)
+                second.selectors = selectors
+                statements[anchor] = None
+            anchor = i
+
+    return [x for x in statements if x is not None]
+
+def optimize(stylesheet):
+    '''
+    Drops overridden declarations and merges duplicate rulesets
+    throughout a stylesheet, including inside @media rules.
+
+    Modifies the stylesheet *in place.*
+    '''
+    collapse(stylesheet)
+    for statement in stylesheet.statements:
+        if isinstance(statement, css.Media):
+            rulesets = merge_rulesets(statement.rulesets)
+            if len(rulesets) != len(statement.rulesets):
+                statement.rulesets = rulesets
+    stylesheet.statements = merge_rulesets(stylesheet.statements)
+    return stylesheet
@@ -1,47 +1,281 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
 
+import os
+import sys
+import glob
+import json
+import mmap
+import time
+import urllib
 from urllib2 import urlopen
-from codecs import EncodedFile
-import css, csslex, cssyacc
-from uri import uri
+import css, csslex, cssyacc, inline, serialize
 
-__all__ = ('parse','export')
+__all__ = ('parse','read_file','export','expand','batch','summary')
 
-def parse(data):
+def parse(data, stats=None, rules=None, media=None, selectors=None):
+    '''
+    Parses a stylesheet, recording the parse in `stats` if given.  Given
+    any of the predicates of rulefilter.parse(), the statements failing
+    them are skipped as they are lexed, rather than parsed.
+    '''
+    if rules is not None or media is not None or selectors is not None:
+        import rulefilter
+        return rulefilter.parse(data, rules, media, selectors, stats)
     parser = cssyacc.yacc()
     parser.lexer = csslex.lex()
-    return parser.parse(data, debug=True)
+    if stats is not None:
+        return stats.parse(parser, data)
+    return parser.parse(data)
+
+def read_file(filename):
+    '''
+    Returns the text of a stylesheet file, decoded by its byte order
+    mark, its @charset rule or, lacking both, as UTF-8.
+
+    The file is mapped into memory rather than read, and decoded from
+    the mapping in one pass, so its bytes are never copied whole.
+    '''
+    f = open(filename, 'rb')
+    try:
+        if not os.fstat(f.fileno()).st_size:
+            # an empty file cannot be mapped
+            return u''
+        data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            # A BOM and an @charset rule are both at the very start.
+            encoding, start = inline.sniff(data[:1024])
+            return unicode(buffer(data, start), encoding, 'replace')
+        finally:
+            data.close()
+    finally:
+        f.close()
+
+def _filename(fileuri):
+    '''Returns the local filename of a path or file: URL, or None.'''
+    if fileuri.startswith('file:'):
+        path = urllib.url2pathname(fileuri[len('file:'):].split('?')[0])
+        if path.startswith('//'):
+            path = path[2:]
+        return path
+    if os.path.exists(fileuri):
+        return fileuri
+    return None
 
 def export(base, stylesheet, recursive=False):
-    def recur(rule):
-        url = rule.source
-        if isinstance(url, css.Uri):
-            url = url.url
-        url = uri.resolve(base, url)
-        export(base, parse(urlopen(url).read()), recursive)
+    if recursive:
+        stylesheet = inline.inline(stylesheet, base)
 
+    # written in the encoding of the stylesheet's @charset rule
+    encoding = serialize.charset(stylesheet)
     for rule in stylesheet:
-        if recursive and isinstance(rule, css.Import):
-            recur(rule)
+        print serialize.serialize(rule, unicode).encode(encoding, 'cssescape')
+
+
+def _base(pattern):
+    '''Returns the directory of a glob pattern before any wildcard.'''
+    parts = pattern.split(os.sep)
+    for i, part in enumerate(parts):
+        if glob.has_magic(part):
+            return os.sep.join(parts[:i])
+    return os.path.dirname(pattern)
+
+def _pattern(path):
+    '''
+    Indicates whether a path is a glob pattern, rather than a URL such
+    as http://example.com/site.css?v=1.
+    '''
+    return ('://' not in path and not path.startswith('file:') and
+            glob.has_magic(path))
+
+def expand(paths):
+    '''
+    Returns the (path, name) of each stylesheet among the given files,
+    directories, which are searched for *.css files, and glob patterns.
+    The name is the path relative to the directory or to the part of
+    the pattern before any wildcard.
+    '''
+    result = []
+    for path in paths:
+        if os.path.isdir(path):
+            for folder, folders, filenames in os.walk(path):
+                folders.sort()
+                for filename in sorted(filenames):
+                    if filename.endswith('.css'):
+                        found = os.path.join(folder, filename)
+                        result.append((found, os.path.relpath(found, path)))
+        elif glob.has_magic(path):
+            base = _base(path) or os.curdir
+            for found in sorted(glob.glob(path)):
+                if os.path.isfile(found):
+                    result.append((found, os.path.relpath(found, base)))
         else:
-            print rule.datum(unicode)
+            result.append((path, os.path.basename(path)))
+    return result
+
+def _write(path, data):
+    folder = os.path.dirname(path)
+    if folder and not os.path.isdir(folder):
+        try:
+            os.makedirs(folder)
+        except OSError:
+            # made meanwhile by another worker
+            if not os.path.isdir(folder):
+                raise
+    f = open(path, 'wb')
+    try:
+        f.write(data)
+    finally:
+        f.close()
+
+def _build(job):
+    '''
+    Parses a stylesheet, writes it out if asked to and returns its
+    statistics.  Runs in a worker process.
+    '''
+    path, name, output, minified = job
+    result = {'file': path, 'bytes': None, 'parse_time': None,
+              'statements': None, 'rulesets': None, 'declarations': None,
+              'output': None, 'output_bytes': None, 'errors': []}
+    try:
+        result['bytes'] = os.path.getsize(path)
+        data = read_file(path)
+
+        module = cssyacc.cssparser()
+        parser = cssyacc.yacc(module=module)
+        parser.lexer = csslex.lex()
+        start = time.time()
+        stylesheet = parser.parse(data)
+        result['parse_time'] = time.time() - start
+        result['errors'].extend(module.errors)
+
+        blocks = []
+        for statement in stylesheet.statements:
+            if isinstance(statement, css.Media):
+                blocks.extend(statement.rulesets)
+            elif isinstance(statement, (css.Ruleset, css.Page)):
+                blocks.append(statement)
+        result['statements'] = len(stylesheet.statements)
+        result['rulesets'] = len([x for x in blocks
+                                  if isinstance(x, css.Ruleset)])
+        result['declarations'] = sum([len(x.declarations) for x in blocks])
 
+        if output:
+            import minify
+            if minified:
+                text = minify.encode(stylesheet)
+            else:
+                text = serialize.encode(stylesheet)
+            result['output'] = os.path.join(output, name)
+            _write(result['output'], text)
+            result['output_bytes'] = len(text)
+    except Exception, e:
+        result['errors'].append('%s: %s' % (type(e).__name__, e))
+    return result
+
+def batch(paths, output=None, minified=False, processes=None):
+    '''
+    Parses the stylesheets among the given files, directories and glob
+    patterns with a pool of worker processes, and writes each, minified
+    if asked to, to the same relative path in the output directory, if
+    one is given.
+
+    Returns the statistics of each stylesheet as a list of dicts.
+    '''
+    import multiprocessing
+    jobs = [(path, name, output, minified) for path, name in expand(paths)]
+    pool = multiprocessing.Pool(processes)
+    try:
+        return pool.map(_build, jobs, chunksize=1)
+    finally:
+        pool.terminate()
+
+def summary(results):
+    '''Returns the totals of the statistics returned by batch().'''
+    total = {'files': len(results),
+             'failed': len([x for x in results if x['errors']])}
+    for key in ('bytes', 'parse_time', 'statements', 'rulesets',
+                'declarations', 'output_bytes'):
+        total[key] = sum([x[key] or 0 for x in results])
+    return total
+
+
+def _url(fileuri):
+    '''
+    Returns the URL of a path or URL: a path is made a file:// URL, for
+    imports to be resolved against and its changes to be watched.
+    '''
+    if fileuri.startswith('file:') or _filename(fileuri) is None:
+        return fileuri
+    return 'file://' + urllib.pathname2url(os.path.abspath(fileuri))
 
 def main(fileuri, options):
-    inputfile = urlopen(fileuri)
+    fileuri = _url(fileuri)
+    if options.watch:
+        # Each change prints the whole stylesheet again.  (watch is
+        # imported here, since it imports inline, which imports this.)
+        import watch
+        def emit(base, stylesheet):
+            export(base, stylesheet)
+            sys.stdout.flush()
+        try:
+            watch.Watcher([fileuri]).watch(emit, options.interval)
+        except KeyboardInterrupt:
+            pass
+        return
+
+    filename = _filename(fileuri)
+    if filename is None:
+        stylesheet = parse(inline.decode(urlopen(fileuri).read()))
+    else:
+        stylesheet = parse(read_file(filename))
+    export(fileuri, stylesheet, options.recursive)
+
+
+def main_batch(paths, options):
+    results = batch(paths, options.output, options.minify, options.jobs)
+    report = {'files': results, 'total': summary(results)}
+    if options.stats:
+        f = open(options.stats, 'w')
+    else:
+        f = sys.stdout
+    json.dump(report, f, indent=2, sort_keys=True)
+    f.write('\n')
+    if f is not sys.stdout:
+        f.close()
+    return report['total']['failed'] and 1 or 0
 
-    stylesheet = parse(inputfile.read())
-    export(fileuri, stylesheet)
-    
 
 if '__main__' == __name__:
     from optparse import OptionParser
-    opts = OptionParser("usage: %prog [options] filename")
+    opts = OptionParser("usage: %prog [options] filename\n"
+                        "       %prog [options] path|pattern...")
+    opts.add_option('-r', '--recursive', action='store_true', default=False,
+                    help='inline the rules of imported stylesheets')
+    opts.add_option('-w', '--watch', action='store_true', default=False,
+                    help='print the inlined rules again on every change')
+    opts.add_option('-i', '--interval', type='float', default=1.0,
+                    help='seconds between checks for changes')
+    opts.add_option('-o', '--output', metavar='DIR',
+                    help='write the parsed stylesheets into DIR')
+    opts.add_option('-m', '--minify', action='store_true', default=False,
+                    help='minify the stylesheets written out')
+    opts.add_option('-j', '--jobs', type='int',
+                    help='number of worker processes (default: one per CPU)')
+    opts.add_option('-s', '--stats', metavar='FILE',
+                    help='write the JSON statistics to FILE, not stdout')
 
     options, args = opts.parse_args()
 
-    if 1 != len(args):
+    if not args:
         opts.error("no filename given")
-        
+
+    # Several files, a directory or a pattern are parsed as a batch,
+    # and their statistics printed as JSON.
+    if (1 < len(args) or options.output or os.path.isdir(args[0])
+            or _pattern(args[0])):
+        if options.watch or options.recursive:
+            opts.error("--watch and --recursive take a single filename")
+        sys.exit(main_batch(args, options))
+
     main(args[0],options)
@@ -0,0 +1,197 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+'''
+Removal of the selectors that match nothing in a set of HTML documents.
+
+    index = prune.Index(stylesheet)
+    for filename in filenames:
+        index.add(document.read(filename))
+    prune.remove(stylesheet, index.unused())
+
+A selector is unused when one of its simple selectors needs a tag, id,
+class or attribute (or attribute value, for [name=value] and
+[name~=value]) that no element of any document has.  That is all that
+is checked, so a selector that could match is always kept; and since
+pseudo-classes are not checked, selectors for states such as :hover
+are kept along with the elements they are for.  Selectors the scripts
+of the documents make use of can be kept by a predicate, `keep`.
+
+Rulesets left with no selectors are dropped, and @media rules left with
+no rulesets.
+
+The selectors are indexed by the parts they need, and only those parts
+are gathered from each document, so the work is linear in the sizes of
+the stylesheet and of the documents, and the memory used does not grow
+with the number of documents.
+'''
+
+import os
+import sys
+import glob
+import css, document, selector
+
+__all__ = ('Index', 'remove', 'prune')
+
+def _rulesets(stylesheet):
+    for statement in stylesheet.statements:
+        if isinstance(statement, css.Media):
+            for ruleset in statement.rulesets:
+                yield ruleset
+        elif isinstance(statement, css.Ruleset):
+            yield statement
+
+class Index(object):
+    '''
+    The selectors of a stylesheet by the parts an element needs for
+    them to match it, and the parts found in the documents added.
+    '''
+    def __init__(self, stylesheet, keep=None):
+        # key => selectors needing it
+        self.selectors = {}
+        self.found = set()
+        for ruleset in _rulesets(stylesheet):
+            for text in ruleset.selectors:
+                if keep is not None and keep(text):
+                    continue
+                try:
+                    compounds = selector.parse(text)
+                except ValueError:
+                    # kept, not being understood
+                    continue
+                for compound in compounds:
+                    for key in selector.keys(compound):
+                        self.selectors.setdefault(key, set()).add(text)
+
+    def add(self, root):
+        '''Gathers the parts needed from a document's root Element.'''
+        selectors = self.selectors
+        self.found.update([key for key in document.keys(root)
+                           if key in selectors])
+
+    def unused(self):
+        '''Returns the set of selectors that match no element found.'''
+        result = set()
+        for key, texts in self.selectors.iteritems():
+            if key not in self.found:
+                result.update(texts)
+        return result
+
+def remove(stylesheet, selectors):
+    '''
+    Removes the given selectors from the rulesets of a stylesheet,
+    dropping rulesets and @media rules left empty.  Returns the number
+    of rulesets dropped.
+
+    Modifies the stylesheet *in place.*
+    '''
+    dropped = [0]
+    def _prune(rulesets):
+        result = []
+        for ruleset in rulesets:
+            live = [x for x in ruleset.selectors if x not in selectors]
+            if not live:
+                dropped[0] += 1
+                continue
+            if len(live) != len(ruleset.selectors):
+                ruleset.selectors = live
+            result.append(ruleset)
+        return result
+
+    statements = []
+    for statement in stylesheet.statements:
+        if isinstance(statement, css.Media):
+            rulesets = _prune(statement.rulesets)
+            if not rulesets:
+                continue
+            if len(rulesets) != len(statement.rulesets):
+                statement.rulesets = rulesets
+        elif isinstance(statement, css.Ruleset):
+            if not _prune([statement]):
+                continue
+        statements.append(statement)
+    if len(statements) != len(stylesheet.statements):
+        stylesheet.statements = statements
+    return dropped[0]
+
+def prune(stylesheet, roots, keep=None):
+    '''
+    Removes the selectors of a stylesheet that match no element of the
+    documents of the given root Elements, which may be generated one
+    at a time.  Returns the set of selectors removed.
+
+    Modifies the stylesheet *in place.*
+    '''
+    index = Index(stylesheet, keep)
+    for root in roots:
+        index.add(root)
+    unused = index.unused()
+    remove(stylesheet, unused)
+    return unused
+
+def expand(paths):
+    '''
+    Returns the HTML files among the given files, directories, which
+    are searched for *.html and *.htm files, and glob patterns.
+    '''
+    result = []
+    for path in paths:
+        if os.path.isdir(path):
+            for folder, folders, filenames in os.walk(path):
+                folders.sort()
+                for filename in sorted(filenames):
+                    if filename.endswith(('.html', '.htm')):
+                        result.append(os.path.join(folder, filename))
+        elif glob.has_magic(path):
+            result.extend(sorted(glob.glob(path)))
+        else:
+            result.append(path)
+    return result
+
+
+if '__main__' == __name__:
+    import re
+    from optparse import OptionParser
+    import parse, serialize
+    opts = OptionParser("usage: %prog [options] stylesheet path|pattern...")
+    opts.add_option('-o', '--output', metavar='FILE',
+                    help='write the pruned stylesheet to FILE, not stdout')
+    opts.add_option('-m', '--minify', action='store_true', default=False,
+                    help='minify the pruned stylesheet')
+    opts.add_option('-k', '--keep', metavar='REGEX', action='append',
+                    default=[],
+                    help='keep the selectors matching REGEX, e.g. those '
+                         'for classes set by scripts (repeatable)')
+
+    options, args = opts.parse_args()
+
+    if 2 > len(args):
+        opts.error("no stylesheet or no documents given")
+
+    keep = None
+    if options.keep:
+        keep = re.compile('|'.join(['(?:%s)' % x
+                                    for x in options.keep])).search
+    stylesheet = parse.parse(parse.read_file(args[0]))
+    filenames = expand(args[1:])
+    index = Index(stylesheet, keep)
+    for filename in filenames:
+        index.add(document.read(filename))
+    unused = index.unused()
+    dropped = remove(stylesheet, unused)
+
+    if options.minify:
+        import minify
+        data = minify.encode(stylesheet)
+    else:
+        data = serialize.encode(stylesheet)
+    if options.output:
+        f = open(options.output, 'wb')
+        try:
+            f.write(data)
+        finally:
+            f.close()
+    else:
+        sys.stdout.write(data)
+    print >>sys.stderr, ('%d documents: %d selectors removed, '
+                         '%d rulesets dropped' % (len(filenames), len(unused),
+                                                  dropped))
@@ -0,0 +1,185 @@
+# -*- coding: utf-8 -*-
+'''
+Parsing of the statements of a stylesheet that pass some predicates.
+
+    # the print rules only
+    stylesheet = rulefilter.parse(data, media=lambda types: 'print' in types)
+
+The predicates are given
+
+  - rules:     the kind of each statement outside @media rules:
+               'charset', 'import', 'media', 'page' or 'ruleset'
+  - media:     the media types of each @media and @import rule, in
+               lowercase; [u'all'] for an @import for all media
+  - selectors: the text of each selector of a ruleset, with its white
+               space collapsed; the ruleset is kept if any passes
+
+and a statement is kept if every predicate given holds for it.  Rulesets
+inside @media rules are filtered too, and @media rules left with none
+are dropped.
+
+The filtering is done between the lexer and the parser: the tokens up
+to each statement's block are held back until the predicates are
+decided, and those of statements rejected are dropped, block and all,
+so that no syntax objects are built for them.  Those of an @media rule
+are held back until a statement in it is accepted, since the grammar
+has no place for the empty @media rule that would be left otherwise.
+'''
+
+import re
+import itertools
+import functools
+import css, csslex, cssyacc
+
+__all__ = ('parse',)
+
+# token type => kind of statement it begins
+kinds = {'CHARSET_SYM': 'charset', 'IMPORT_SYM': 'import',
+         'MEDIA_SYM': 'media', 'PAGE_SYM': 'page'}
+
+# tokens between statements
+spaces = frozenset(['S', 'CDO', 'CDC'])
+
+re_space = re.compile(ur'[ \t\r\n\f]+')
+
+def _selectors(prelude):
+    '''Returns the text of each selector before a ruleset's block.'''
+    result, parts = [], []
+    for t in prelude:
+        if t.type in ('COMMA', 'LBRACE'):
+            result.append(re_space.sub(u' ', u''.join(parts)).strip())
+            parts = []
+        else:
+            parts.append(t.value)
+    return result
+
+def _media_types(kind, prelude):
+    types = [t.value.lower() for t in prelude if t.type == 'IDENT']
+    if not types and 'import' == kind:
+        return [u'all']
+    return types
+
+class _Filter(object):
+    '''The predicates, and the token stream filtered by them.'''
+    def __init__(self, rules, media, selectors):
+        self.rules = rules
+        self.media = media
+        self.selectors = selectors
+        # offsets of the @media rules with rulesets dropped
+        self.pruned = set()
+
+    def accept(self, kind, prelude, nested):
+        if self.rules is not None and not nested and not self.rules(kind):
+            return False
+        if self.media is not None and kind in ('media', 'import'):
+            if not self.media(_media_types(kind, prelude)):
+                return False
+        if self.selectors is not None and 'ruleset' == kind:
+            for selector in _selectors(prelude):
+                if self.selectors(selector):
+                    return True
+            return False
+        return True
+
+    def tokenfunc(self, token):
+        '''
+        Returns a function returning the tokens accepted, in turn, from
+        those the function `token` returns, then None.
+        '''
+        tokens = self.statements(iter(token, None))
+        return functools.partial(next, tokens, None)
+
+    def _block(self, tokens):
+        '''Yields the tokens of a block, up to its closing brace.'''
+        depth = 1
+        for t in tokens:
+            yield t
+            if 'LBRACE' == t.type:
+                depth += 1
+            elif '}' == t.type:
+                depth -= 1
+                if not depth:
+                    return
+
+    def statements(self, tokens, media=None):
+        '''
+        Yields the tokens of the statements accepted, up to the end of
+        the input or, if nested in the @media rule at offset `media`,
+        the brace closing it.
+        '''
+        for t in tokens:
+            if t.type in spaces:
+                yield t
+                continue
+            if media is not None and '}' == t.type:
+                yield t
+                return
+            kind = kinds.get(t.type, 'ruleset')
+            prelude = [t]
+            if t.type not in (';', 'LBRACE'):
+                for t in tokens:
+                    prelude.append(t)
+                    if t.type in (';', 'LBRACE', '}'):
+                        break
+            if prelude[-1].type != 'LBRACE':
+                # an @charset or @import rule, or an error for the
+                # parser to find
+                if (kind not in ('charset', 'import') or
+                        self.accept(kind, prelude, media is not None)):
+                    for t in prelude:
+                        yield t
+                elif media is not None:
+                    self.pruned.add(media)
+                continue
+            if not self.accept(kind, prelude, media is not None):
+                for t in self._block(tokens):
+                    pass
+                if media is not None:
+                    self.pruned.add(media)
+                continue
+            if 'media' == kind:
+                block = self._media(tokens, prelude)
+            else:
+                block = itertools.chain(prelude, self._block(tokens))
+            for t in block:
+                yield t
+
+    def _media(self, tokens, prelude):
+        '''
+        Yields the tokens of an @media rule accepted, holding them back
+        until a statement in it is: one left empty is dropped whole.
+        '''
+        held = prelude
+        block = self.statements(tokens, prelude[0].lexpos)
+        for t in block:
+            held.append(t)
+            if t.type not in spaces and '}' != t.type:
+                break
+        else:
+            return
+        for t in itertools.chain(held, block):
+            yield t
+
+def parse(data, rules=None, media=None, selectors=None, stats=None):
+    '''
+    Parses the statements of a stylesheet that pass the predicates
+    given, and returns the stylesheet of them.  Given a stats.Stats,
+    the parse is recorded in it, with the tokens of the statements
+    dropped counted as lexed.
+    '''
+    parser = cssyacc.yacc()
+    parser.lexer = csslex.lex()
+    predicates = _Filter(rules, media, selectors)
+    if stats is not None:
+        stylesheet = stats.parse(parser, data, predicates.tokenfunc)
+    else:
+        stylesheet = parser.parse(
+            data, lexer=parser.lexer,
+            tokenfunc=predicates.tokenfunc(parser.lexer.token))
+    if stylesheet is None:
+        return None
+    for x in stylesheet.statements:
+        if isinstance(x, css.Media) and x._origin[1] in predicates.pruned:
+            # its source text has the rulesets dropped
+            x.changed()
+    return stylesheet
@@ -0,0 +1,220 @@
+# -*- coding: utf-8 -*-
+'''
+Selectors taken apart into their simple selectors.
+
+The parser keeps each selector of a ruleset as text, e.g.
+u'ul.nav > li a:hover'.  `parse()` splits one into a list of
+`Compound`s, each a simple selector with the combinator joining it to
+the one before:
+
+    >>> parse(u'ul.nav > li')
+    [Compound(u'ul', classes=[u'nav']), Compound(u'li', combinator=u'>')]
+
+`match()` tells whether a selector matches a `document.Element`, and
+`keys()` returns the parts an element must have for a simple selector
+to match it, in the form `document.keys()` returns those of the
+elements of a document:
+
+  - ('tag', name) and ('attr', name), names in lowercase
+  - ('id', id) and ('class', name)
+  - ('attr=', name, value) and ('attr~', name, word), values in
+    lowercase, since many HTML attributes compare without case
+'''
+
+import re
+import csslex
+
+__all__ = ('Compound', 'parse', 'match', 'keys')
+
+def _match(rx):
+    return re.compile(rx, re.UNICODE).match
+
+re_element = _match(ur'\*|' + csslex.ident)
+re_hash = _match(ur'#(' + csslex.name + ur')')
+re_class = _match(ur'\.(' + csslex.ident + ur')')
+re_attrib = _match(ur'\[[ \t\r\n\f]*(' + csslex.ident + ur')[ \t\r\n\f]*'
+                   ur'(?:([~|]?=)[ \t\r\n\f]*(' + csslex.ident + ur'|' +
+                   csslex.string + ur')[ \t\r\n\f]*)?\]')
+re_pseudo = _match(ur':(' + csslex.ident + ur')(?:\(([^)]*)\))?')
+re_combinator = _match(ur'[ \t\r\n\f]*([+>])[ \t\r\n\f]*|[ \t\r\n\f]+')
+
+re_escape = re.compile(ur'\\(?:([0-9a-fA-F]{1,6})(?:\r\n|[ \t\r\n\f])?|'
+                       ur'\r\n|(.))', re.DOTALL)
+
+def _unescape(text):
+    def replace(m):
+        if m.group(1):
+            try:
+                return unichr(int(m.group(1), 16))
+            except ValueError:
+                return u'\ufffd'
+        return m.group(2) or u''
+    return re_escape.sub(replace, text)
+
+def _value(text):
+    '''Returns the value of an identifier or string.'''
+    if text[0] in u'"\'':
+        text = text[1:-1]
+    return _unescape(text)
+
+class Compound(object):
+    '''
+    A simple selector: a type selector, or none for any element, and
+    the id, classes, attribute selectors and pseudo-classes following
+    it.  Attribute selectors are (name, operator, value) tuples, with
+    operator and value None for [name]; pseudo-classes are written
+    without their colon, e.g. u'lang(fr)'.
+    '''
+    def __init__(self, tag=None, id=None, classes=None, attributes=None,
+                 pseudos=None, combinator=None):
+        self.tag = tag
+        self.id = id
+        self.classes = classes or list()
+        self.attributes = attributes or list()
+        self.pseudos = pseudos or list()
+        # u' ', u'>' or u'+'; None for the first simple selector
+        self.combinator = combinator
+
+    def __repr__(self):
+        r = 'Compound(' + repr(self.tag)
+        for name in ('id', 'classes', 'attributes', 'pseudos',
+                     'combinator'):
+            if getattr(self, name):
+                r += ', %s=%r' % (name, getattr(self, name))
+        r += ')'
+        return r
+
+def _compound(text, i, combinator):
+    compound = Compound(combinator=combinator)
+    m = re_element(text, i)
+    found = m is not None
+    if m:
+        if u'*' != m.group(0):
+            compound.tag = _unescape(m.group(0)).lower()
+        i = m.end()
+    while i < len(text):
+        m = re_hash(text, i)
+        if m:
+            compound.id = _unescape(m.group(1))
+        else:
+            m = re_class(text, i)
+            if m:
+                compound.classes.append(_unescape(m.group(1)))
+        if m is None:
+            m = re_attrib(text, i)
+            if m:
+                name, op, value = m.groups()
+                if value is not None:
+                    value = _value(value)
+                compound.attributes.append((_unescape(name).lower(), op,
+                                            value))
+        if m is None:
+            m = re_pseudo(text, i)
+            if m:
+                compound.pseudos.append(m.group(0)[1:].lower())
+        if m is None:
+            break
+        found = True
+        i = m.end()
+    if not found:
+        raise ValueError, 'No simple selector at %d in %r.' % (i, text)
+    return compound, i
+
+def parse(selector):
+    '''
+    Returns the list of Compounds of a selector's text.  Raises
+    ValueError if it is not a selector.
+    '''
+    text = selector.strip()
+    result = []
+    i, combinator = 0, None
+    while True:
+        compound, i = _compound(text, i, combinator)
+        result.append(compound)
+        if len(text) == i:
+            return result
+        m = re_combinator(text, i)
+        if m is None:
+            raise ValueError, 'Unexpected %r at %d in %r.' % (text[i], i,
+                                                              text)
+        combinator = m.group(1) or u' '
+        i = m.end()
+
+def keys(compound):
+    '''
+    Returns the parts an element must have for the simple selector to
+    match it.
+    '''
+    result = []
+    if compound.tag is not None:
+        result.append(('tag', compound.tag))
+    if compound.id is not None:
+        result.append(('id', compound.id))
+    for name in compound.classes:
+        result.append(('class', name))
+    for name, op, value in compound.attributes:
+        result.append(('attr', name))
+        if u'=' == op:
+            result.append(('attr=', name, value.lower()))
+        elif u'~=' == op:
+            result.append(('attr~', name, value.lower()))
+    return result
+
+def _matches(compound, element):
+    if element.tag is None:
+        return False
+    if compound.tag is not None and compound.tag != element.tag:
+        return False
+    if compound.id is not None and compound.id != element.id:
+        return False
+    if compound.classes:
+        classes = element.classes
+        for name in compound.classes:
+            if name not in classes:
+                return False
+    for name, op, value in compound.attributes:
+        actual = element.attributes.get(name)
+        if actual is None:
+            return False
+        if op is None:
+            continue
+        actual, value = actual.lower(), value.lower()
+        if u'=' == op:
+            if actual != value:
+                return False
+        elif u'~=' == op:
+            if value not in actual.split():
+                return False
+        elif actual != value and not actual.startswith(value + u'-'):
+            return False
+    if u'first-child' in compound.pseudos and element.previous is not None:
+        return False
+    return True
+
+def _match_at(compounds, i, element):
+    if not _matches(compounds[i], element):
+        return False
+    if 0 == i:
+        return True
+    combinator = compounds[i].combinator
+    if u'>' == combinator:
+        return (element.parent is not None and
+                _match_at(compounds, i - 1, element.parent))
+    if u'+' == combinator:
+        previous = element.previous
+        return previous is not None and _match_at(compounds, i - 1, previous)
+    element = element.parent
+    while element is not None:
+        if _match_at(compounds, i - 1, element):
+            return True
+        element = element.parent
+    return False
+
+def match(compounds, element):
+    '''
+    Indicates whether the selector of the given Compounds matches a
+    document.Element.  Pseudo-classes other than :first-child, and
+    pseudo-elements, depend on more than the document, and are taken
+    to hold.
+    '''
+    return _match_at(compounds, len(compounds) - 1, element)
@@ -3,56 +3,267 @@
 A serializer for CSS.
 '''
 
+import re
+import codecs
+import inspect
 import css
+import colors
 
 # This module comprises all serialization code for the
 # syntax object of CSS, kept here so that the serialization
 # strategy for the whole system can be modified easily
 # without the need to touch a dozen classes.  
 #
-# Adding a
-# new type of data requires another conditional in
-# serialize(), and possibly a new serialize_<type>()
-# method.  (The data types of CSS are finite and the number
-# relatively small, so this should be a rare occassion.)
+# Serializers are looked up in a table keyed by the exact
+# type of the object; a type with no entry of its own uses the
+# entry of its nearest base class, and the result is cached.
+# Adding a new type of data requires a new serialize_<type>()
+# method and a call to register().  (The data types of CSS
+# are finite and the number relatively small, so this should
+# be a rare occassion.)
 # 
 # Each serializer method takes a `printer` argument,
 # which should be a function that returns a serialized
 # value for objects of builtin types.
+#
+# Declarations and statements keep their last serialization,
+# with the printer it was made for, until they or anything
+# beneath them is changed (see css.SyntaxObject.changed()),
+# so serializing a large stylesheet again after a small change
+# only rebuilds the text of what changed.
+#
+# Declarations and statements that are unmodified since they were
+# parsed are written as they appear in the source, as is the white
+# space and comments between statements that were next to each
+# other there, modified or not.  Only modified objects are written afresh.  To write
+# a whole tree afresh, call its discard_source() first.
+
+# type => serializer method, as registered
+serializers = {}
+
+# type => serializer method or None, for every type seen
+_dispatch = {}
+
+def register(cls, method):
+    '''
+    Registers the serializer method for objects of the given type and,
+    unless they have their own, of its subclasses.
+    '''
+    serializers[cls] = method
+    _dispatch.clear()
+
+def _find(cls, table):
+    for base in inspect.getmro(cls):
+        if base in table:
+            return table[base]
+    return None
+
+def lookup(cls):
+    '''
+    Returns the serializer method for objects of the given type, or None
+    if they are printed as they are.
+    '''
+    try:
+        return _dispatch[cls]
+    except KeyError:
+        method = _dispatch[cls] = _find(cls, serializers)
+        return method
+
+# White space, comments and SGML comment delimiters only.  Each
+# alternative begins with a different character, so a gap that does
+# not match fails without backtracking.
+re_gap = re.compile(ur'(?:[ \t\r\n\f]|/\*[^*]*\*+(?:[^/*][^*]*\*+)*/|<!--|-->)*\Z')
+
+def _source(obj, printer):
+    data, start, end = obj._source
+    return printer(data[start:end])
+
+def _separator(first, second, printer):
+    '''
+    Returns the text between two statements: that of the source if
+    they were next to each other there, otherwise a newline.
+    '''
+    a, b = first._origin, second._origin
+    if (a is not None and b is not None and a[0] is b[0] and
+        a[2] <= b[1] and re_gap.match(a[0], a[2], b[1])):
+        return printer(a[0][a[2]:b[1]])
+    return printer('\n')
+
+def cached(method):
+    '''
+    Returns a serializer method that writes objects unmodified since
+    they were parsed as they appear in the source, and otherwise keeps
+    the text it returns on the object, and returns it again until the
+    object is changed.
+    '''
+    def serialize_cached(obj, printer):
+        cache = obj._cache
+        if cache is not None and cache[0] is printer:
+            return cache[1]
+        if obj._source is not None:
+            return _source(obj, printer)
+        s = method(obj, printer)
+        obj._cache = (printer, s)
+        return s
+    serialize_cached.__name__ = method.__name__
+    return serialize_cached
 
-def serialize(obj, printer=str):
-    if isinstance(obj, css.Hexcolor):
-        return serialize_Hexcolor(obj, printer)
-    elif isinstance(obj, css.Function):
-        return serialize_Function(obj, printer)
-    elif isinstance(obj, css.Uri):
-        return serialize_Uri(obj, printer)
-    elif isinstance(obj, css.String):
-        return serialize_String(obj, printer)
-    elif isinstance(obj, css.Ident):
-        return serialize_Ident(obj, printer)
-    elif isinstance(obj, css.Term):
-        return serialize_Term(obj, printer)
-    elif isinstance(obj, css.Declaration):
-        return serialize_Declaration(obj, printer)
-    elif isinstance(obj, css.Ruleset):
-        return serialize_Ruleset(obj, printer)
-    elif isinstance(obj, css.Charset):
-        return serialize_Charset(obj, printer)
-    elif isinstance(obj, css.Page):
-        return serialize_Page(obj, printer)
-    elif isinstance(obj, css.Media):
-        return serialize_Media(obj, printer)
-    elif isinstance(obj, css.Import):
-        return serialize_Import(obj, printer)
-    elif isinstance(obj, css.Stylesheet):
-        return serialize_Stylesheet(obj, printer)
-    else:
+def serialize(obj, printer=str, stats=None):
+    if stats is not None:
+        # see the stats module
+        return stats.serialize(obj, printer)
+    try:
+        method = _dispatch[type(obj)]
+    except KeyError:
+        method = lookup(type(obj))
+    if method is None:
         return printer(obj)
+    return method(obj, printer)
+
+# Streaming serialization: the iter_<type>() generators yield the
+# same text as the serialize_<type>() methods, in chunks no larger
+# than one declaration or one statement without a block.  They are
+# looked up like the serializers; a type without one is yielded
+# whole.
+#
+# A printer with a `mark` method is told of each Ruleset and
+# Declaration just before the first chunk of it is yielded, so that
+# a consumer can note where in the output each one begins (see the
+# sourcemap module).
+
+# type => chunk generator, as registered
+iterators = {}
+
+# type => chunk generator or None, for every type seen
+_iter_dispatch = {}
+
+def register_iterator(cls, method):
+    '''
+    Registers the chunk generator for objects of the given type and,
+    unless they have their own, of its subclasses.
+    '''
+    iterators[cls] = method
+    _iter_dispatch.clear()
+
+def iterserialize(obj, printer=str):
+    '''
+    Generates the serialization of obj in chunks.
+
+    The chunks join to exactly what serialize() returns.
+    '''
+    try:
+        method = _iter_dispatch[type(obj)]
+    except KeyError:
+        method = _iter_dispatch[type(obj)] = _find(type(obj), iterators)
+    if method is None:
+        return iter((serialize(obj, printer),))
+    return method(obj, printer)
+
+def dump(obj, fp, printer=str):
+    '''
+    Writes the serialization of obj to a file-like object, one chunk
+    at a time.
+    '''
+    write = fp.write
+    for chunk in iterserialize(obj, printer):
+        write(chunk)
+
+# Encoded output: the chunks are encoded one at a time as they are
+# made, in the encoding named by the stylesheet's @charset rule or in
+# UTF-8.  Characters the encoding cannot represent are written as CSS
+# escapes, e.g. u'\u2603' as '\2603' in ISO-8859-1, which is the same
+# character to a CSS reader.
+
+hexdigits = frozenset(u'0123456789abcdefABCDEF')
+
+def escape_errors(error):
+    '''
+    A codec error handler that replaces the characters that cannot be
+    encoded with CSS escapes.  It is registered as 'cssescape'.
+    '''
+    if not isinstance(error, UnicodeEncodeError):
+        raise error
+    text = error.object
+    chars = text[error.start:error.end]
+    escapes = []
+    i = 0
+    while i < len(chars):
+        code = ord(chars[i])
+        # A surrogate pair, from a narrow build, is one character.
+        if (0xd800 <= code < 0xdc00 and i + 1 < len(chars) and
+            0xdc00 <= ord(chars[i + 1]) < 0xe000):
+            low = ord(chars[i + 1]) - 0xdc00
+            code = 0x10000 + ((code - 0xd800) << 10) + low
+            i += 1
+        escapes.append(u'\\%x' % code)
+        i += 1
+    s = u''.join(escapes)
+    # An escape ends at a space, which is dropped, or at anything but a
+    # hex digit; the next chunk is unseen, so the end of one counts.
+    following = text[error.end:error.end + 1]
+    if not following or following in hexdigits or following in u' \t\r\n\f':
+        s += u' '
+    return s, error.end
+
+codecs.register_error('cssescape', escape_errors)
+
+def charset(obj, default='utf-8'):
+    '''
+    Returns the name of the encoding given by a stylesheet's @charset
+    rule, or the default.
+    '''
+    rule = getattr(obj, 'charset', None)
+    if rule is None:
+        return default
+    encoding = rule.encoding
+    if isinstance(encoding, css.String):
+        encoding = encoding.value
+    return encoding
+
+def iterencode(chunks, encoding):
+    '''
+    Generates the encoded bytes of a sequence of unicode chunks, one
+    non-empty string for each chunk that encodes to something.
+    '''
+    encoder = codecs.getincrementalencoder(encoding)('cssescape')
+    for chunk in chunks:
+        data = encoder.encode(chunk)
+        if data:
+            yield data
+    data = encoder.encode(u'', True)
+    if data:
+        yield data
+
+def encode(obj, encoding=None, stats=None):
+    '''
+    Returns the serialization of obj as a byte string in the given
+    encoding or, by default, that of its @charset rule or UTF-8.
+    '''
+    if stats is not None:
+        return stats.encode(obj, encoding)
+    buffer = bytearray()
+    for data in iterencode(iterserialize(obj, unicode),
+                           encoding or charset(obj)):
+        buffer += data
+    return str(buffer)
+
+def dump_encoded(obj, fp, encoding=None):
+    '''
+    Writes the serialization of obj to a binary file-like object, such
+    as a BytesIO, in the given encoding or, by default, that of its
+    @charset rule or UTF-8.
+    '''
+    write = fp.write
+    for data in iterencode(iterserialize(obj, unicode),
+                           encoding or charset(obj)):
+        write(data)
 
 def serialize_Hexcolor(obj, printer):
     return printer('#') + printer(obj.value)
 
+def serialize_Color(obj, printer):
+    return printer(colors.text(obj))
+
 def serialize_Function(obj, printer):
     return printer(obj.name) + printer('(') + printer(obj.parameters) + printer(')')
 
@@ -72,6 +283,12 @@ def serialize_Term(obj, printer):
         s = printer(obj.unary_operator) + s
     return s
 
+def serialize_Expression(obj, printer):
+    s = serialize(obj.terms[0], printer)
+    for operator, term in zip(obj.operators, obj.terms[1:]):
+        s += printer(operator) + serialize(term, printer)
+    return s
+
 def serialize_Declaration(obj, printer):
     s = serialize_Ident(obj.property, printer) 
     s += printer(':') + printer(obj.value)
@@ -97,7 +314,7 @@ def serialize_Page(obj, printer):
 def serialize_Media(obj, printer):
     s = printer('@media ')
     s += printer(',').join((printer(x) for x in obj.media_types))
-    s += printer('{') + printer('\n').join([serialize_Ruleset(x, printer) for x in obj.rulesets]) + printer('}')
+    s += printer('{') + _join(obj.rulesets, printer) + printer('}')
     return s
 
 def serialize_Import(obj, printer):
@@ -108,12 +325,10 @@ def serialize_Import(obj, printer):
     return s
 
 def serialize_Stylesheet(obj, printer):
-    s = printer('')
-    if obj.charset:
-        s += serialize_Charset(obj.charset, printer) + printer('\n')
-    if obj.imports:
-        s += printer('\n').join((serialize_Import(x, printer) for x in obj.imports)) + printer('\n')
-    s += printer('\n').join((serialize(x, printer) for x in obj.statements))
+    rules = list(obj)
+    s = _join(rules, printer)
+    if rules and not obj.statements:
+        s += printer('\n')
     return s
 
 def serialize_Pseudo(obj, printer):
@@ -122,5 +337,115 @@ def serialize_Pseudo(obj, printer):
 def serialize_Selector_group(selectors, printer):
     return printer(',').join((printer(x) for x in selectors))
 
+def _join(statements, printer):
+    '''Serializes a list of statements, each separated from the last.'''
+    pieces = []
+    for i, statement in enumerate(statements):
+        if i:
+            pieces.append(_separator(statements[i - 1], statement, printer))
+        pieces.append(serialize(statement, printer))
+    return printer('').join(pieces)
+
 def serialize_Declaration_block(declarations, printer):
-    return printer('{') + printer(';').join((serialize_Declaration(x, printer) for x in declarations)) + printer('}')
+    return printer('{') + printer(';').join((serialize(x, printer) for x in declarations)) + printer('}')
+
+def iter_source(obj, printer):
+    '''
+    Generates the source text of an unmodified object in one chunk or,
+    for a printer with a `mark` method, in one chunk for each Ruleset
+    and Declaration in it, marking each one.
+    '''
+    data, start, end = obj._source
+    mark = getattr(printer, 'mark', None)
+    if mark:
+        for x in css.walk(obj):
+            if (isinstance(x, (css.Ruleset, css.Declaration)) and
+                x._source is not None):
+                if start < x._source[1]:
+                    yield printer(data[start:x._source[1]])
+                    start = x._source[1]
+                mark(x)
+    yield printer(data[start:end])
+
+def iter_Ruleset(obj, printer):
+    if obj._source is not None:
+        for chunk in iter_source(obj, printer):
+            yield chunk
+        return
+    mark = getattr(printer, 'mark', None)
+    if mark:
+        mark(obj)
+    yield serialize_Selector_group(obj.selectors, printer)
+    for chunk in iter_Declaration_block(obj.declarations, printer):
+        yield chunk
+
+def iter_Page(obj, printer):
+    if obj._source is not None:
+        for chunk in iter_source(obj, printer):
+            yield chunk
+        return
+    s = printer('@page')
+    if obj.pseudo_page:
+        s += serialize_Pseudo(obj.pseudo_page, printer)
+    yield s
+    for chunk in iter_Declaration_block(obj.declarations, printer):
+        yield chunk
+
+def iter_Media(obj, printer):
+    if obj._source is not None:
+        for chunk in iter_source(obj, printer):
+            yield chunk
+        return
+    s = printer('@media ')
+    s += printer(',').join((printer(x) for x in obj.media_types))
+    yield s + printer('{')
+    rulesets = obj.rulesets
+    for i, ruleset in enumerate(rulesets):
+        if i:
+            yield _separator(rulesets[i - 1], ruleset, printer)
+        for chunk in iter_Ruleset(ruleset, printer):
+            yield chunk
+    yield printer('}')
+
+def iter_Stylesheet(obj, printer):
+    rules = list(obj)
+    for i, rule in enumerate(rules):
+        if i:
+            yield _separator(rules[i - 1], rule, printer)
+        for chunk in iterserialize(rule, printer):
+            yield chunk
+    if rules and not obj.statements:
+        yield printer('\n')
+
+def iter_Declaration_block(declarations, printer):
+    mark = getattr(printer, 'mark', None)
+    yield printer('{')
+    separator = printer(';')
+    for i, declaration in enumerate(declarations):
+        if i:
+            yield separator
+        if mark:
+            mark(declaration)
+        yield serialize(declaration, printer)
+    yield printer('}')
+
+register(css.Hexcolor, serialize_Hexcolor)
+register(css.Color, serialize_Color)
+register(css.Function, serialize_Function)
+register(css.Uri, serialize_Uri)
+register(css.String, serialize_String)
+register(css.Ident, serialize_Ident)
+register(css.Term, serialize_Term)
+register(css.Expression, serialize_Expression)
+register(css.Declaration, cached(serialize_Declaration))
+register(css.Ruleset, cached(serialize_Ruleset))
+register(css.Charset, serialize_Charset)
+register(css.Page, cached(serialize_Page))
+register(css.Media, cached(serialize_Media))
+register(css.Import, cached(serialize_Import))
+register(css.Stylesheet, cached(serialize_Stylesheet))
+
+register_iterator(css.Ruleset, iter_Ruleset)
+register_iterator(css.Page, iter_Page)
+register_iterator(css.Media, iter_Media)
+register_iterator(css.Stylesheet, iter_Stylesheet)
@@ -0,0 +1,359 @@
+# -*- coding: utf-8 -*-
+'''
+Coalescing of longhand declarations into shorthands, and expansion of
+shorthands back into longhands.
+
+`coalesce()` replaces a complete set of longhands in a declaration
+block, e.g. margin-top, margin-right, margin-bottom and margin-left,
+with the equivalent shorthand.  A set is only merged when
+
+  - every longhand in it has the same importance;
+  - no other declaration that sets any of the same properties comes
+    between the first and the last of them;
+  - no declaration before the last of them sets a property that the
+    shorthand resets without having it as a longhand, e.g.
+    border-image for border; and
+  - every value can be written in the shorthand.
+
+The shorthand takes the place of the last longhand of the set, so the
+cascade within the block is unchanged.
+
+`expand()` does the reverse, writing out omitted parts of a shorthand
+with their initial values, for analysis.
+'''
+
+import copy
+import css, colors, serialize
+
+__all__ = ('coalesce', 'expand', 'leaves', 'SHORTHANDS')
+
+sides = (u'top', u'right', u'bottom', u'left')
+
+def _sided(name, suffix=u''):
+    return tuple([u'%s-%s%s' % (name, side, suffix) for side in sides])
+
+# shorthand => longhands, in the order they are written
+SHORTHANDS = {
+    u'margin': _sided(u'margin'),
+    u'padding': _sided(u'padding'),
+    u'border-width': _sided(u'border', u'-width'),
+    u'border-style': _sided(u'border', u'-style'),
+    u'border-color': _sided(u'border', u'-color'),
+    u'border-top': (u'border-top-width', u'border-top-style',
+                    u'border-top-color'),
+    u'border-right': (u'border-right-width', u'border-right-style',
+                      u'border-right-color'),
+    u'border-bottom': (u'border-bottom-width', u'border-bottom-style',
+                       u'border-bottom-color'),
+    u'border-left': (u'border-left-width', u'border-left-style',
+                     u'border-left-color'),
+    u'border': (u'border-width', u'border-style', u'border-color'),
+    u'outline': (u'outline-width', u'outline-style', u'outline-color'),
+    u'list-style': (u'list-style-type', u'list-style-position',
+                    u'list-style-image'),
+    }
+
+# shorthand => the properties it also resets to their initial values,
+# without being able to set them
+RESETS = {
+    u'border': (u'border-image', u'border-image-source',
+                u'border-image-slice', u'border-image-width',
+                u'border-image-outset', u'border-image-repeat'),
+    }
+
+# Initial values, for the parts of a shorthand that are left out.
+INITIAL = {
+    u'width': u'medium',
+    u'style': u'none',
+    u'color': u'currentColor',
+    u'outline-color': u'invert',
+    u'list-style-type': u'disc',
+    u'list-style-position': u'outside',
+    u'list-style-image': u'none',
+    }
+
+border_styles = frozenset((u'none', u'hidden', u'dotted', u'dashed',
+                           u'solid', u'double', u'groove', u'ridge',
+                           u'inset', u'outset'))
+border_widths = frozenset((u'thin', u'medium', u'thick'))
+list_positions = frozenset((u'inside', u'outside'))
+
+def leaves(name, _cache={}):
+    '''
+    Returns the set of longhands a property sets: the property itself
+    if it is not a shorthand.
+    '''
+    try:
+        return _cache[name]
+    except KeyError:
+        pass
+    if name in SHORTHANDS:
+        result = set()
+        for longhand in SHORTHANDS[name]:
+            result |= leaves(longhand)
+    else:
+        result = set((name,))
+    _cache[name] = frozenset(result)
+    return _cache[name]
+
+def _name(declaration):
+    return declaration.property.name.lower()
+
+def _text(value):
+    return serialize.serialize(value, unicode)
+
+def _single(values):
+    '''Returns True when each value is a single term other than inherit.'''
+    for value in values:
+        if isinstance(value, css.Expression):
+            return False
+        if isinstance(value, css.Ident) and u'inherit' == value.name.lower():
+            return False
+    return True
+
+def _initial(longhand):
+    for key in (longhand, longhand.split(u'-')[-1]):
+        if key in INITIAL:
+            return INITIAL[key].lower()
+    return None
+
+def _combine_box(values, longhands):
+    if not _single(values):
+        return None
+    top, right, bottom, left = values
+    terms = [top, right, bottom, left]
+    if _text(left) == _text(right):
+        terms.pop()
+        if _text(bottom) == _text(top):
+            terms.pop()
+            if _text(right) == _text(top):
+                terms.pop()
+    if 1 == len(terms):
+        return terms[0]
+    return css.Expression(terms)
+
+def _combine_parts(values, longhands):
+    if not _single(values):
+        return None
+    # Parts left out of a shorthand take their initial values.
+    terms = [value for value, longhand in zip(values, longhands)
+             if _text(value).lower() != _initial(longhand)]
+    if not terms:
+        terms = values[:1]
+    if 1 == len(terms):
+        return terms[0]
+    return css.Expression(terms)
+
+def _combine_same(values, longhands):
+    texts = set([_text(x) for x in values])
+    if 1 != len(texts):
+        return None
+    return values[0]
+
+def _merge(declarations, shorthand, longhands, combine):
+    '''
+    Merges one set of longhands in a list of declarations, if it is
+    complete and can be merged safely.
+    '''
+    last = {}
+    for i, declaration in enumerate(declarations):
+        last[_name(declaration)] = i
+    positions = []
+    for longhand in longhands:
+        if longhand not in last:
+            return declarations
+        positions.append(last[longhand])
+    group = [declarations[i] for i in positions]
+    important = bool(group[0].important)
+    for declaration in group:
+        if bool(declaration.important) != important:
+            return declarations
+
+    touched = set()
+    for longhand in longhands:
+        touched |= leaves(longhand)
+    members = set(positions)
+    for i in xrange(min(positions), max(positions)):
+        if i not in members and touched & leaves(_name(declarations[i])):
+            return declarations
+    # The shorthand would reset these wherever they are set before it.
+    reset = RESETS.get(shorthand, ())
+    for i in xrange(max(positions)):
+        if _name(declarations[i]) in reset:
+            return declarations
+
+    value = combine([x.value for x in group], longhands)
+    if value is None:
+        return declarations
+    merged = css.Declaration(css.Ident(shorthand), value, important)
+    end = max(positions)
+    result = []
+    for i, declaration in enumerate(declarations):
+        if i == end:
+            result.append(merged)
+        elif i not in members:
+            result.append(declaration)
+    return result
+
+# (shorthand, longhands, combine) in the order they are tried
+_passes = ([(name, SHORTHANDS[name], _combine_box)
+            for name in (u'margin', u'padding', u'border-width',
+                         u'border-style', u'border-color')] +
+           [(name, SHORTHANDS[name], _combine_parts)
+            for name in _sided(u'border')] +
+           [(u'border', SHORTHANDS[u'border'], _combine_parts),
+            (u'border', _sided(u'border'), _combine_same),
+            (u'outline', SHORTHANDS[u'outline'], _combine_parts),
+            (u'list-style', SHORTHANDS[u'list-style'], _combine_parts)])
+
+def coalesce_declarations(declarations):
+    '''Returns the list of declarations with longhands coalesced.'''
+    for shorthand, longhands, combine in _passes:
+        declarations = _merge(declarations, shorthand, longhands, combine)
+    return declarations
+
+def _blocks(obj):
+    for x in css.walk(obj):
+        if isinstance(x, (css.Ruleset, css.Page)):
+            yield x
+
+def coalesce(obj):
+    '''
+    Coalesces longhands into shorthands in every declaration block
+    beneath the given syntax object.
+
+    Modifies the declaration blocks *in place.*
+    '''
+    for block in _blocks(obj):
+        declarations = coalesce_declarations(block.declarations)
+        if declarations is not block.declarations:
+            block.declarations = declarations
+    return obj
+
+def _terms(value):
+    if isinstance(value, css.Expression):
+        return list(value.terms)
+    return [value]
+
+def _keyword(term):
+    if isinstance(term, css.Ident):
+        return term.name.lower()
+    return None
+
+def _split_box(value):
+    terms = _terms(value)
+    if not 1 <= len(terms) <= 4:
+        return None
+    top = terms[0]
+    right = terms[1:2] and terms[1] or top
+    bottom = terms[2:3] and terms[2] or top
+    left = terms[3:4] and terms[3] or right
+    return [top, right, bottom, left]
+
+def _split_border(value, color_property):
+    '''Splits a border or outline value into width, style and color.'''
+    width = style = color = None
+    for term in _terms(value):
+        keyword = _keyword(term)
+        if keyword in border_styles and style is None:
+            style = term
+        elif ((keyword in border_widths or
+               isinstance(term, css.Term)) and width is None):
+            width = term
+        elif (colors.from_term(term, color_property) is not None or
+              keyword in (u'invert', u'currentcolor')) and color is None:
+            color = term
+        else:
+            return None
+    return [width or css.Ident(INITIAL[u'width']),
+            style or css.Ident(INITIAL[u'style']),
+            color or css.Ident(INITIAL.get(color_property,
+                                           INITIAL[u'color']))]
+
+def _split_list_style(value):
+    kind = position = image = None
+    nones = 0
+    for term in _terms(value):
+        keyword = _keyword(term)
+        if isinstance(term, css.Uri) and image is None:
+            image = term
+        elif keyword in list_positions and position is None:
+            position = term
+        elif u'none' == keyword:
+            nones += 1
+        elif keyword and kind is None:
+            kind = term
+        else:
+            return None
+    # "none" sets whichever of the type and image is not otherwise set
+    if nones:
+        if kind is None:
+            kind = css.Ident(u'none')
+            nones -= 1
+        if nones and image is None:
+            image = css.Ident(u'none')
+            nones -= 1
+        if nones:
+            return None
+    return [kind or css.Ident(INITIAL[u'list-style-type']),
+            position or css.Ident(INITIAL[u'list-style-position']),
+            image or css.Ident(INITIAL[u'list-style-image'])]
+
+def _split(name, value):
+    '''
+    Returns the values of the longhands of a shorthand, or None if the
+    value is not understood.
+    '''
+    if isinstance(value, css.Ident) and u'inherit' == value.name.lower():
+        return [value] * len(SHORTHANDS[name])
+    if name in (u'margin', u'padding', u'border-width', u'border-style',
+                u'border-color'):
+        return _split_box(value)
+    elif name in _sided(u'border') or u'border' == name:
+        return _split_border(value, u'color')
+    elif u'outline' == name:
+        return _split_border(value, u'outline-color')
+    elif u'list-style' == name:
+        return _split_list_style(value)
+    return None
+
+def expand_declaration(declaration):
+    '''
+    Returns the longhand declarations equivalent to a declaration,
+    which is returned alone if it is not a shorthand that is understood.
+    '''
+    name = _name(declaration)
+    if name not in SHORTHANDS:
+        return [declaration]
+    values = _split(name, declaration.value)
+    if values is None:
+        return [declaration]
+    if u'border' == name:
+        # width, style and color apply to every side
+        longhands = []
+        for side in sides:
+            longhands.extend(zip(SHORTHANDS[u'border-' + side], values))
+    else:
+        longhands = zip(SHORTHANDS[name], values)
+
+    result = []
+    for longhand, value in longhands:
+        result.extend(expand_declaration(
+            css.Declaration(css.Ident(longhand), copy.deepcopy(value),
+                            declaration.important)))
+    return result
+
+def expand(obj):
+    '''
+    Expands shorthands into longhands in every declaration block
+    beneath the given syntax object.
+
+    Modifies the declaration blocks *in place.*
+    '''
+    for block in _blocks(obj):
+        declarations = []
+        for declaration in block.declarations:
+            declarations.extend(expand_declaration(declaration))
+        if len(declarations) != len(block.declarations):
+            block.declarations = declarations
+    return obj
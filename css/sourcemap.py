@@ -0,0 +1,179 @@
+# -*- coding: utf-8 -*-
+'''
+Source maps for serialized and minified stylesheets.
+
+The parser keeps the offset at which each Ruleset and Declaration
+begins in its source as its `position`.  Serializing through
+`iterserialize()` maps the place in the output where each of them is
+written back to that offset, and the mappings are collected in a
+`SourceMap`, which writes the Source Map revision 3 format:
+
+    text, sourcemap = serialize(stylesheet, 'site.css', data,
+                                file='site.min.css', minified=True)
+    text += u'\\n' + comment('site.min.css.map')
+
+Mappings are encoded as they are added, in output order, so building
+the map takes a single pass over the output.
+'''
+
+import re
+import bisect
+import json
+import serialize as _serialize, minify
+
+__all__ = ('SourceMap', 'iterserialize', 'serialize', 'comment', 'vlq')
+
+BASE64 = ('ABCDEFGHIJKLMNOPQRSTUVWXYZ'
+          'abcdefghijklmnopqrstuvwxyz0123456789+/')
+
+re_newline = re.compile(ur'\r\n|[\n\r\f]')
+
+def vlq(value):
+    '''
+    Returns the base64 VLQ encoding of an integer: the sign in the
+    lowest bit, then five bits per digit with the continuation bit set
+    on all but the last.
+    '''
+    if value < 0:
+        value = (-value << 1) | 1
+    else:
+        value <<= 1
+    digits = []
+    while True:
+        digit = value & 31
+        value >>= 5
+        if value:
+            digits.append(BASE64[digit | 32])
+        else:
+            digits.append(BASE64[digit])
+            return ''.join(digits)
+
+class SourceMap(object):
+    '''
+    A mapping from lines and columns of an output file to offsets in
+    its sources.
+    '''
+    def __init__(self, file=None):
+        self.file = file
+        self.sources = []
+        # source name => (index, offsets at which its lines begin)
+        self._sources = {}
+        self._mappings = []
+        self._line = 0
+        # the last segment: column, source, source line, source column
+        self._last = (0, 0, 0, 0)
+
+    def __repr__(self):
+        return 'SourceMap(%r)' % (self.file,)
+
+    def add_source(self, name, data):
+        '''
+        Registers a source by name, with its text, which is needed to
+        turn offsets into lines and columns.
+        '''
+        starts = [0]
+        starts.extend([m.end() for m in re_newline.finditer(data)])
+        self._sources[name] = (len(self.sources), starts)
+        self.sources.append(name)
+
+    def add(self, line, column, source, offset):
+        '''
+        Maps a line and column of the output, counted from zero, to an
+        offset in a registered source.
+
+        Mappings must be added in the order they appear in the output.
+        '''
+        index, starts = self._sources[source]
+        source_line = bisect.bisect_right(starts, offset) - 1
+        segment = (column, index, source_line, offset - starts[source_line])
+        if line != self._line:
+            # Columns are relative to the start of each line, the
+            # other fields to the last segment of any line.
+            self._mappings.append(';' * (line - self._line))
+            self._line = line
+            self._last = (0,) + self._last[1:]
+        elif self._mappings:
+            self._mappings.append(',')
+        for value, last in zip(segment, self._last):
+            self._mappings.append(vlq(value - last))
+        self._last = segment
+
+    @property
+    def mappings(self):
+        '''The encoded mappings.'''
+        return ''.join(self._mappings)
+
+    def as_dict(self):
+        '''Returns the source map as a dict of its JSON fields.'''
+        d = {'version': 3, 'sources': list(self.sources), 'names': [],
+             'mappings': self.mappings}
+        if self.file:
+            d['file'] = self.file
+        return d
+
+    def dumps(self):
+        '''Returns the source map as JSON text.'''
+        return json.dumps(self.as_dict(), sort_keys=True)
+
+    def dump(self, fp):
+        '''Writes the source map as JSON text to a file-like object.'''
+        fp.write(self.dumps())
+
+class _Printer(object):
+    '''A printer that is told where marked syntax objects begin.'''
+    def __init__(self, printer, mark):
+        self.printer = printer
+        self.mark = mark
+
+    def __call__(self, obj):
+        return self.printer(obj)
+
+def iterserialize(obj, sourcemap, source, printer=unicode, minified=False):
+    '''
+    Generates the serialization of obj in chunks, as
+    serialize.iterserialize() or, if minified, minify.iterminify() do,
+    adding to the source map a mapping for each Ruleset and Declaration
+    that has a position in the named source.
+    '''
+    marked = []
+    printer = _Printer(printer, marked.append)
+    if minified:
+        chunks = minify.iterminify(obj, printer)
+    else:
+        chunks = _serialize.iterserialize(obj, printer)
+    line = column = 0
+    cr = False
+    for chunk in chunks:
+        if marked:
+            for x in marked:
+                if x.position is not None:
+                    sourcemap.add(line, column, source, x.position)
+            del marked[:]
+        # Lines end as the lexer ends them.  A \r\n split across two
+        # chunks ends one line, at the \r.
+        start = cr and chunk.startswith('\n') and 1 or 0
+        end = None
+        for m in re_newline.finditer(chunk, start):
+            line += 1
+            end = m.end()
+        if end is None:
+            column += len(chunk) - start
+        else:
+            column = len(chunk) - end
+        if chunk:
+            cr = chunk.endswith('\r')
+        yield chunk
+
+def serialize(obj, source, data, file=None, printer=unicode, minified=False):
+    '''
+    Returns the serialization of obj, parsed from the given source
+    text, and its SourceMap.
+    '''
+    sourcemap = SourceMap(file)
+    sourcemap.add_source(source, data)
+    chunks = iterserialize(obj, sourcemap, source, printer, minified)
+    return printer('').join(chunks), sourcemap
+
+def comment(url):
+    '''Returns the comment that links a stylesheet to its source map.'''
+    return u'/*# sourceMappingURL=%s */' % (url,)
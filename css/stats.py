@@ -0,0 +1,147 @@
+# -*- coding: utf-8 -*-
+'''
+Timings and counts of parsing and serializing, by phase.
+
+Passing a `Stats` to parse.parse(), serialize.serialize() or
+serialize.encode() records, across all the calls it is passed to:
+
+  - the wall time spent in each phase: `lex` (the lexer), `build` (the
+    grammar rules of cssyacc, which build the syntax objects), `reduce`
+    (the rest of the parser) and `serialize`
+  - the number of tokens of each type
+  - the number of reductions by each grammar rule
+  - the number of syntax objects of each type in the trees parsed
+  - the bytes of input parsed and of output serialized
+
+    stats = Stats()
+    stylesheet = parse.parse(data, stats=stats)
+    serialize.encode(stylesheet, stats=stats)
+    print stats.report()
+
+Without one, nothing is instrumented: the lexer and the grammar rules
+are only wrapped for the parsers that are given one.
+'''
+
+import time
+import css, serialize as _serialize
+
+__all__ = ('Stats',)
+
+def _size(text):
+    if isinstance(text, unicode):
+        return len(text.encode('utf-8'))
+    return len(text)
+
+class Stats(object):
+    '''Timings and counts of parsing and serializing.'''
+    def __init__(self):
+        # phase => seconds
+        self.times = {'lex': 0.0, 'build': 0.0, 'reduce': 0.0,
+                      'serialize': 0.0}
+        # token type => count
+        self.tokens = {}
+        # grammar rule => reductions
+        self.reductions = {}
+        # syntax object type name => count
+        self.nodes = {}
+        self.input_bytes = 0
+        self.output_bytes = 0
+
+    def __repr__(self):
+        return 'Stats(%r)' % (self.times,)
+
+    def _tokenfunc(self, lexer):
+        token = lexer.token
+        tokens = self.tokens
+        times = self.times
+        def tokenfunc():
+            start = time.time()
+            t = token()
+            times['lex'] += time.time() - start
+            if t is not None:
+                tokens[t.type] = tokens.get(t.type, 0) + 1
+            return t
+        return tokenfunc
+
+    def _instrument(self, production):
+        method = production.callable
+        rule = production.str
+        reductions = self.reductions
+        times = self.times
+        def reduce(p):
+            start = time.time()
+            try:
+                method(p)
+            finally:
+                times['build'] += time.time() - start
+                reductions[rule] = reductions.get(rule, 0) + 1
+        production.callable = reduce
+
+    def parse(self, parser, data, tokens=None):
+        '''
+        Parses data with a parser from cssyacc.yacc(), whose `lexer` is
+        set, recording the parse.  Given `tokens`, a function from the
+        lexer's token function to the one the parser is to call, e.g.
+        one filtering the tokens, the parser takes them from that.
+        '''
+        for production in parser.productions:
+            if production.callable is not None:
+                self._instrument(production)
+        lex, build = self.times['lex'], self.times['build']
+        tokenfunc = self._tokenfunc(parser.lexer)
+        if tokens is not None:
+            tokenfunc = tokens(tokenfunc)
+        start = time.time()
+        result = parser.parse(data, lexer=parser.lexer, tokenfunc=tokenfunc)
+        elapsed = time.time() - start
+        self.times['reduce'] += (elapsed - (self.times['lex'] - lex) -
+                                 (self.times['build'] - build))
+        self.input_bytes += _size(data)
+        if result is not None:
+            for x in css.walk(result):
+                name = type(x).__name__
+                self.nodes[name] = self.nodes.get(name, 0) + 1
+        return result
+
+    def serialize(self, obj, printer=str):
+        '''Returns serialize.serialize(obj, printer), recording it.'''
+        start = time.time()
+        text = _serialize.serialize(obj, printer)
+        self.times['serialize'] += time.time() - start
+        self.output_bytes += _size(text)
+        return text
+
+    def encode(self, obj, encoding=None):
+        '''Returns serialize.encode(obj, encoding), recording it.'''
+        start = time.time()
+        data = _serialize.encode(obj, encoding)
+        self.times['serialize'] += time.time() - start
+        self.output_bytes += len(data)
+        return data
+
+    def as_dict(self):
+        '''Returns the timings and counts as a dict, e.g. for JSON.'''
+        return {'times': dict(self.times), 'tokens': dict(self.tokens),
+                'reductions': dict(self.reductions),
+                'nodes': dict(self.nodes), 'input_bytes': self.input_bytes,
+                'output_bytes': self.output_bytes}
+
+    def report(self, top=10):
+        '''
+        Returns a summary as text, with the `top` most frequent tokens
+        and reductions.
+        '''
+        lines = []
+        for phase in ('lex', 'build', 'reduce', 'serialize'):
+            lines.append('%-10s %10.3f ms' % (phase,
+                                              self.times[phase] * 1000))
+        lines.append('input      %10d bytes' % (self.input_bytes,))
+        lines.append('output     %10d bytes' % (self.output_bytes,))
+        for title, counts in (('tokens', self.tokens),
+                              ('reductions', self.reductions),
+                              ('nodes', self.nodes)):
+            lines.append('%s: %d' % (title, sum(counts.values())))
+            ranked = sorted(counts.items(), key=lambda x: (-x[1], x[0]))
+            for name, count in ranked[:top]:
+                lines.append('  %8d  %s' % (count, name))
+        return '\n'.join(lines)
@@ -0,0 +1,185 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+'''
+Incremental rebuilding of stylesheets with their imports inlined.
+
+A `Watcher` keeps the parsed stylesheets of the import graphs of some
+root stylesheets, and the @import edges between them.  `poll()` checks
+the modification times of the files among them, parses again only the
+ones that changed, and returns the roots that import them, directly or
+not, which `output()` then inlines from the parsed stylesheets:
+
+    watcher = watch.Watcher(['file:///srv/www/site.css'])
+    watcher.watch(lambda root, stylesheet: ...)
+
+Stylesheets at URLs other than file:// ones are parsed once, and not
+checked for changes.
+'''
+
+import os
+import sys
+import time
+import urllib
+import inline
+
+__all__ = ('Watcher',)
+
+def _mtime(url):
+    '''Returns the modification time of a file:// URL, or None.'''
+    if not url.startswith('file:'):
+        return None
+    path = urllib.url2pathname(url[len('file:'):].split('?')[0])
+    if path.startswith('//'):
+        path = path[2:]
+    try:
+        return os.stat(path).st_mtime
+    except OSError:
+        return None
+
+class Watcher(object):
+    '''
+    The stylesheets imported by some root stylesheets, directly or not,
+    parsed and kept up to date.
+    '''
+    def __init__(self, roots, fetch=inline.read_url,
+                 parser=inline.parse_data):
+        self.roots = list(roots)
+        self.fetch = fetch
+        self.parser = parser
+        # URL => parsed stylesheet
+        self.sheets = {}
+        # URL => imported URLs
+        self.graph = {}
+        # URL => modification time when last parsed
+        self._mtimes = {}
+        # URL => the error fetching or parsing it
+        self.errors = {}
+        self._update(self.roots)
+
+    def __repr__(self):
+        return 'Watcher(%r)' % (self.roots,)
+
+    def _update(self, urls):
+        '''Parses the stylesheets at urls, and any new ones they import.'''
+        pending = list(urls)
+        while pending:
+            url = pending.pop()
+            # A stylesheet that does not parse, e.g. while it is being
+            # edited, is tried again once it changes again.
+            self._mtimes[url] = _mtime(url)
+            try:
+                self.sheets[url] = self.parser(self.fetch(url))
+            except Exception, e:
+                self.errors[url] = e
+                self.graph.setdefault(url, [])
+                continue
+            self.errors.pop(url, None)
+            self.graph[url] = inline.imports(self.sheets[url], url)
+            pending.extend([x for x in self.graph[url]
+                            if x not in self._mtimes and x not in pending])
+
+    def _reachable(self, root):
+        '''Returns the URLs of root and every stylesheet it imports.'''
+        result, pending = set(), [root]
+        while pending:
+            url = pending.pop()
+            if url not in result:
+                result.add(url)
+                pending.extend(self.graph.get(url, ()))
+        return result
+
+    def dependents(self, url):
+        '''
+        Returns the URLs of the stylesheets that import the one at url,
+        directly or not.
+        '''
+        importers = {}
+        for parent, children in self.graph.items():
+            for child in children:
+                importers.setdefault(child, set()).add(parent)
+        result, pending = set(), [url]
+        while pending:
+            for parent in importers.get(pending.pop(), ()):
+                if parent not in result:
+                    result.add(parent)
+                    pending.append(parent)
+        result.discard(url)
+        return result
+
+    def changed(self):
+        '''Returns the URLs of the stylesheets changed since parsed.'''
+        return [url for url in self._mtimes
+                if _mtime(url) != self._mtimes[url]]
+
+    def poll(self):
+        '''
+        Parses the stylesheets that changed again, and returns the roots
+        that import them, directly or not, or are them.
+        '''
+        changed = self.changed()
+        if not changed:
+            return []
+        self._update(changed)
+        affected = set(changed)
+        for url in changed:
+            affected |= self.dependents(url)
+        roots = [x for x in self.roots if x in affected]
+
+        # Forget stylesheets no longer imported.
+        used = set()
+        for root in self.roots:
+            used |= self._reachable(root)
+        for url in set(self._mtimes) - used:
+            del self.graph[url], self._mtimes[url]
+            self.sheets.pop(url, None)
+            self.errors.pop(url, None)
+        return roots
+
+    def output(self, root):
+        '''
+        Returns the stylesheet at root with its imports inlined, or
+        raises the error of a stylesheet among them that did not parse.
+        '''
+        for url in self._reachable(root):
+            if url in self.errors:
+                raise self.errors[url]
+        return inline.combine(self.sheets, root)
+
+    def watch(self, callback, interval=1.0):
+        '''
+        Calls callback(root, stylesheet) with the output of each root
+        stylesheet, then again whenever it changes, checking every
+        `interval` seconds, until interrupted.  Errors are reported on
+        stderr and the output is left as it was.
+        '''
+        roots = self.roots
+        while True:
+            for root in roots:
+                try:
+                    callback(root, self.output(root))
+                except Exception, e:
+                    print >>sys.stderr, '%s: %s' % (root, e)
+            time.sleep(interval)
+            roots = self.poll()
+
+
+if '__main__' == __name__:
+    from optparse import OptionParser
+    import serialize
+    opts = OptionParser("usage: %prog [options] url...")
+    opts.add_option('-i', '--interval', type='float', default=1.0,
+                    help='seconds between checks for changes')
+
+    options, args = opts.parse_args()
+
+    if not args:
+        opts.error("no url given")
+
+    def emit(root, stylesheet):
+        sys.stdout.write(serialize.encode(stylesheet))
+        sys.stdout.flush()
+
+    try:
+        Watcher(args).watch(emit, options.interval)
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,6 @@
+# -*- coding: utf-8 -*-
+'''
+Tests of the css package, run from the top of the tree with
+
+    python -m unittest discover tests
+'''
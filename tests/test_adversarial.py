@@ -0,0 +1,109 @@
+# -*- coding: utf-8 -*-
+'''
+Lexing time of adversarial inputs, with bounds that must hold.
+
+Each input is built at a base size and at `scale` times it, and lexed
+in a worker process of its own.  An input fails if lexing it takes
+longer than `limit` seconds at either size, or if the time grows by
+more than `growth` times the factor of the size, as it would if the
+token patterns backtracked more than linearly.
+'''
+
+import multiprocessing
+import os
+import re
+import sys
+import timeit
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir))
+
+from css import csslex
+
+# name => input of a size n
+cases = (
+    ('unclosed comment', lambda n: u'a { }\n/*' + u' x*' * n),
+    ('comment openers', lambda n: u'/*' * n),
+    ('stars in comment', lambda n: u'/*' + u'*' * n + u'x'),
+    ('comments after !', lambda n: u'a { b: c !' + u'/**/ ' * n + u'}'),
+    ('spaces after !', lambda n: u'a { b: c !' + u' ' * n + u'x }'),
+    ('escapes in unclosed string', lambda n: u'"' + u'\\abc ' * n),
+    ('hex runs in string', lambda n: u'"' + u'\\1234567' * n + u'"'),
+    ('backslashes in url', lambda n: u'a { b: url(' + u'\\\\' * n + u' }'),
+    ('unclosed strings', lambda n: (u"'" + u'x' * 50 + u'\n') * n),
+    ('spaces before no brace', lambda n: u'a' + u' ' * n + u'b'),
+    ('escapes in ident', lambda n: u'a' + u'\\41 ' * n),
+)
+
+def lex(data):
+    '''Returns the number of tokens in data.'''
+    lexer = csslex.lex()
+    lexer.input(data)
+    n = 0
+    while lexer.token():
+        n += 1
+    return n
+
+def _time(job):
+    # Runs in a worker process: the lexer's error messages are dropped.
+    index, size = job
+    sys.stdout = open(os.devnull, 'w')
+    data = cases[index][1](size)
+    return len(data), min(timeit.repeat(lambda: lex(data), number=10,
+                                        repeat=5)) / 10
+
+def measure(index, size, limit):
+    '''
+    Returns the (length, seconds) of lexing an input of the given
+    size, or None if it takes longer than the limit.
+    '''
+    pool = multiprocessing.Pool(1)
+    try:
+        result = pool.apply_async(_time, ((index, size),))
+        try:
+            return result.get(limit)
+        except multiprocessing.TimeoutError:
+            return None
+    finally:
+        pool.terminate()
+
+# base size of each input, in repetitions.  The inputs are kept small:
+# once a token outgrows the allocator's small blocks, lexing it takes
+# about three times longer for a while, and a step between the two
+# sizes would look like a growth faster than linear.
+size = 1000
+
+# factor of the larger size
+scale = 4
+
+# seconds allowed to lex an input
+limit = 10
+
+# allowed growth in time over growth in size: a 4 times larger input
+# may take at most 6 times as long
+growth = 1.5
+
+class LinearTimeTest(unittest.TestCase):
+    pass
+
+def _test(index):
+    def test(self):
+        small = measure(index, size, limit)
+        self.assertTrue(small is not None, 'takes over %ds' % (limit,))
+        large = measure(index, size * scale, limit)
+        self.assertTrue(large is not None, 'takes over %ds at %dx the size'
+                        % (limit, scale))
+        ratio = large[1] / max(small[1], 1e-6)
+        self.assertTrue(ratio <= growth * scale,
+                        'takes %.1fx as long at %dx the size' %
+                        (ratio, scale))
+    return test
+
+for _i, (_name, _generate) in enumerate(cases):
+    setattr(LinearTimeTest,
+            'test_%02d_%s' % (_i, re.sub(r'\W+', '_', _name).strip('_')),
+            _test(_i))
+del _i, _name, _generate
+
+if '__main__' == __name__:
+    unittest.main()
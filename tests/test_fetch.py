@@ -0,0 +1,175 @@
+# -*- coding: utf-8 -*-
+'''
+Requests made by css.fetch.Cache, seen by a stub HTTP server.
+
+The server serves one stylesheet with an ETag, answers a request
+carrying it with 304 Not Modified, and redirects other paths to it, to
+a missing one or to themselves.  Each test fetches through a Cache in
+a temporary directory and compares the requests the server received,
+and the connections they came on, with those that should have been
+made.
+'''
+
+import BaseHTTPServer
+import SocketServer
+import os
+import sys
+import shutil
+import tempfile
+import threading
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir))
+
+from css import fetch
+
+content = 'a { color: red }\n'
+etag = '"v1"'
+
+# path => where it redirects to
+redirects = {'/old.css': '/site.css', '/gone.css': '/missing.css',
+             '/loop.css': '/loop.css'}
+
+class Handler(BaseHTTPServer.BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    # (path, If-None-Match header or None) of each request received
+    requests = []
+
+    # (host, port) of the client of each request
+    clients = []
+
+    def do_GET(self):
+        validator = self.headers.getheader('if-none-match')
+        self.requests.append((self.path, validator))
+        self.clients.append(self.client_address)
+        if self.path in redirects:
+            self.send_response(301)
+            self.send_header('Location', redirects[self.path])
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+        elif '/site.css' != self.path:
+            self.send_response(404)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+        elif etag == validator:
+            self.send_response(304)
+            self.send_header('ETag', etag)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+        else:
+            self.send_response(200)
+            self.send_header('ETag', etag)
+            self.send_header('Content-Type', 'text/css')
+            self.send_header('Content-Length', str(len(content)))
+            self.end_headers()
+            self.wfile.write(content)
+
+    def log_message(self, *args):
+        pass
+
+class Server(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    # Each Cache keeps its connection open, so each is served by a
+    # thread of its own.
+    daemon_threads = True
+
+class CacheTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.server = Server(('127.0.0.1', 0), Handler)
+        thread = threading.Thread(target=cls.server.serve_forever)
+        thread.daemon = True
+        thread.start()
+        cls.base = 'http://127.0.0.1:%d' % (cls.server.server_address[1],)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        del Handler.requests[:], Handler.clients[:]
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def cache(self, **kw):
+        cache = fetch.Cache(self.directory, **kw)
+        self.addCleanup(cache.close)
+        return cache
+
+    def fetched(self, cache, path):
+        '''Fetches a path, and returns the requests it made.'''
+        del Handler.requests[:]
+        self.assertEqual(cache(self.base + path), content)
+        return list(Handler.requests)
+
+    def test_download(self):
+        cache = self.cache(max_age=3600)
+        self.assertEqual(self.fetched(cache, '/site.css'),
+                         [('/site.css', None)])
+        self.assertEqual(cache.downloaded, 1)
+
+    def test_fresh_hit(self):
+        cache = self.cache(max_age=3600)
+        self.fetched(cache, '/site.css')
+        self.assertEqual(self.fetched(cache, '/site.css'), [])
+        self.assertEqual(cache.hits, 1)
+
+    def test_revalidated(self):
+        self.fetched(self.cache(), '/site.css')
+        cache = self.cache(max_age=0)
+        # The 304 response has no body: the cached one is returned.
+        self.assertEqual(self.fetched(cache, '/site.css'),
+                         [('/site.css', etag)])
+        self.assertEqual((cache.revalidated, cache.downloaded), (1, 0))
+
+    def test_keep_alive(self):
+        cache = self.cache(max_age=0)
+        for i in xrange(3):
+            self.fetched(cache, '/site.css')
+        self.assertEqual(len(Handler.clients), 3)
+        self.assertEqual(len(set(Handler.clients)), 1)
+
+    def test_offline_hit(self):
+        self.fetched(self.cache(), '/site.css')
+        cache = self.cache(offline=True)
+        self.assertEqual(self.fetched(cache, '/site.css'), [])
+
+    def test_offline_miss(self):
+        cache = self.cache(offline=True)
+        for url in (self.base + '/site.css', self.base + u'/caf\xe9.css'):
+            self.assertRaises(fetch.FetchError, cache, url)
+        self.assertEqual(Handler.requests, [])
+
+    def test_redirect(self):
+        cache = self.cache(max_age=0)
+        self.assertEqual(self.fetched(cache, '/old.css'),
+                         [('/old.css', None), ('/site.css', None)])
+        # The stylesheet is cached under the URL asked for.
+        self.assertEqual(self.fetched(self.cache(offline=True), '/old.css'),
+                         [])
+
+    def test_redirect_validators(self):
+        cache = self.cache(max_age=0)
+        self.fetched(cache, '/old.css')
+        # The validators are those of /old.css, and are not sent on to
+        # /site.css, which would answer 304 to them.
+        self.assertEqual(self.fetched(cache, '/old.css'),
+                         [('/old.css', etag), ('/site.css', None)])
+        self.assertEqual(cache.downloaded, 2)
+
+    def test_redirect_to_missing(self):
+        cache = self.cache()
+        self.assertRaises(fetch.FetchError, cache, self.base + '/gone.css')
+        self.assertEqual(Handler.requests,
+                         [('/gone.css', None), ('/missing.css', None)])
+
+    def test_redirect_loop(self):
+        cache = self.cache()
+        self.assertRaises(fetch.FetchError, cache, self.base + '/loop.css')
+        self.assertEqual(len(Handler.requests), fetch.max_redirects + 1)
+
+if '__main__' == __name__:
+    unittest.main()
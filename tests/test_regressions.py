@@ -0,0 +1,201 @@
+# -*- coding: utf-8 -*-
+'''
+Inputs that have been handled wrongly before, each with the output it
+must give.
+'''
+
+import os
+import re
+import sys
+import tempfile
+import unittest
+import StringIO
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir))
+
+from css import parse, serialize, optimize, events, rulefilter, stats
+from css import shorthand, minify, document, prune, critical, index, colors
+from css import sourcemap
+
+def optimized(data):
+    return serialize.serialize(optimize.optimize(parse.parse(data)), unicode)
+
+class _Recorder(events.Handler):
+    '''Records the names of the events, but for declarations.'''
+    def __init__(self):
+        self.names = []
+        for name in ('start_media', 'end_media', 'start_page', 'end_page',
+                     'start_ruleset', 'end_ruleset', 'error'):
+            setattr(self, name, self._recorder(name))
+
+    def _recorder(self, name):
+        return lambda *args: self.names.append(name)
+
+def exported(data):
+    '''Returns what parse.py prints of a stylesheet, decoded.'''
+    stdout = sys.stdout
+    sys.stdout = output = StringIO.StringIO()
+    try:
+        parse.export(None, parse.parse(data))
+    finally:
+        sys.stdout = stdout
+    return output.getvalue().decode('utf-8')
+
+def minified(data):
+    return minify.encode(parse.parse(data)).decode('utf-8')
+
+def coalesced(data):
+    return serialize.serialize(shorthand.coalesce(parse.parse(data)),
+                               unicode)
+
+def only_c(data):
+    stylesheet = rulefilter.parse(data, selectors=lambda x: u'c' == x)
+    return serialize.serialize(stylesheet, unicode)
+
+def rulesets_recorded(data):
+    recorded = stats.Stats()
+    parse.parse(data, stats=recorded, selectors=lambda x: u'c' == x)
+    return recorded.nodes.get('Ruleset')
+
+def unused(data):
+    stylesheet = parse.parse(u'html{x:y}\nbody p{x:y}\ntbody td{x:y}\n'
+                             u'thead th{x:y}')
+    return sorted(prune.prune(stylesheet, [document.parse(data)]))
+
+def above_fold(data):
+    stylesheet = parse.parse(u'html{x:y}\nli+li{x:y}\ntbody td{x:y}\n'
+                             u'footer{x:y}')
+    rules, deferred = critical.split(stylesheet, document.parse(data))
+    return serialize.serialize(rules, unicode)
+
+def mappings(data):
+    text, generated = sourcemap.serialize(parse.parse(data), 'a.css', data)
+    return generated.mappings
+
+def remapped(data):
+    stylesheet = parse.parse(data)
+    c = colors.extract(stylesheet)
+    c.remap({u'rgb(255, 0, 0)': u'#00f', u'#0f0': u'rgba(0,0,0,.5)'})
+    c.store()
+    return serialize.serialize(stylesheet, unicode)
+
+def indexed(data):
+    '''Returns the rules of an index of a stylesheet as parsed again.'''
+    fd, filename = tempfile.mkstemp(suffix='.idx')
+    os.close(fd)
+    try:
+        index.write(parse.parse(data), filename)
+        idx = index.Index(filename)
+        try:
+            return u'\n'.join(serialize.serialize(rule.node(), unicode)
+                              for rule in idx.lookup(u'a'))
+        finally:
+            idx.close()
+    finally:
+        os.remove(filename)
+
+def event_names(data):
+    return u' '.join(events.parse(data, _Recorder()).names)
+
+# (name, function, input, expected output)
+cases = (
+    ('prefixed value before its fallback', optimized,
+     u'a{display:-webkit-box;display:flex}',
+     u'a{display:-webkit-box;display:flex}'),
+    ('prefixed value in a merged ruleset', optimized,
+     u'a{display:-webkit-box}\na{display:flex}',
+     u'a{display:-webkit-box;display:flex}'),
+    ('overridden declaration', optimized,
+     u'a{color:red;color:blue}', u'a{color:blue}'),
+    ('hack suffix kept', optimized,
+     u'a{width:100px;width:100px\\9}', u'a{width:100px;width:100px\\9}'),
+    ('keyword fallback kept', optimized,
+     u'a{display:block;display:grid}', u'a{display:block;display:grid}'),
+    ('exact duplicate dropped', optimized,
+     u'a{display:grid;color:red;display:grid}',
+     u'a{color:red;display:grid}'),
+    ('font family overrides', optimized,
+     u'a{font-family:Arial;font-family:Georgia,serif}',
+     u'a{font-family:Georgia,serif}'),
+    ('printed as serialized', exported,
+     u'a { background : url(img/x.png) }\nb{color:red;  margin:0}',
+     u'a { background : url(img/x.png) }\nb{color:red;  margin:0}\n'),
+    ('small number kept', minified,
+     u'a{width:.00000001px}', u'a{width:.00000001px}'),
+    ('long decimal kept', minified,
+     u'a{width:0.12345678px}', u'a{width:.12345678px}'),
+    ('alpha kept', minified,
+     u'a{color:rgba(0,0,0,.125)}', u'a{color:rgba(0,0,0,0.125)}'),
+    ('border not merged over border-image', coalesced,
+     u'a{border-image:url(x) 30;border-top:1px solid red;'
+     u'border-right:1px solid red;border-bottom:1px solid red;'
+     u'border-left:1px solid red}',
+     u'a{border-image:url(x) 30;border-top:1px solid red;'
+     u'border-right:1px solid red;border-bottom:1px solid red;'
+     u'border-left:1px solid red}'),
+    ('border merged before border-image', coalesced,
+     u'a{border-top:1px solid red;border-right:1px solid red;'
+     u'border-bottom:1px solid red;border-left:1px solid red;'
+     u'border-image:url(x) 30}',
+     u'a{border:1px solid red;border-image:url(x) 30}'),
+    ('prefixed pseudo-class not joined', optimized,
+     u'a:-moz-placeholder{color:red}\nb{color:red}',
+     u'a:-moz-placeholder{color:red}\nb{color:red}'),
+    ('pseudo-class not of CSS 2.1 not joined', optimized,
+     u'a:checked{color:red}\nb{color:red}',
+     u'a:checked{color:red}\nb{color:red}'),
+    ('CSS 2.1 pseudo-class joined', optimized,
+     u'a:hover{color:red}\nb{color:red}', u'a:hover,b{color:red}'),
+    ('colon in an attribute value', optimized,
+     u'a[title="x:y"]{color:red}\nb{color:red}',
+     u'a[title="x:y"],b{color:red}'),
+    ('ruleset ended after a syntax error', event_names,
+     u'a{color:}b{c:d}',
+     u'start_ruleset error end_ruleset start_ruleset end_ruleset'),
+    ('@media ended after a syntax error', event_names,
+     u'@media print{a{color:}}b{c:d}',
+     u'start_media start_ruleset error end_ruleset end_media '
+     u'start_ruleset end_ruleset'),
+    ('@media with every ruleset filtered out', only_c,
+     u'@media print{b{x:z}}\nc{x:w}', u'c{x:w}'),
+    ('@media with a ruleset filtered out', only_c,
+     u'@media print{b{x:z}c{x:y}}\nc{x:w}',
+     u'@media print{c{x:y}}\nc{x:w}'),
+    ('empty @media dropped', only_c,
+     u'@media print{}\nc{x:w}', u'c{x:w}'),
+    ('stats recorded with a predicate', rulesets_recorded,
+     u'b{x:z}\nc{x:w}', 1),
+    ('source map of CRLF lines', mappings,
+     u'a{x:y}\r\nb{x:z;\r\n  c:d}\r\n', u'AAAA,EAAE;AACF,EAAE;EACA'),
+    ('source map of CR and form feed lines', mappings,
+     u'a{x:y}\rb{x:z;\f  c:d}\f', u'AAAA,EAAE;AACF,EAAE;EACA'),
+    ('functional colors and shadows remapped', remapped,
+     u'a{color:rgb(255,0,0);box-shadow:0 0 2px red;fill:lime}',
+     u'a{color:rgb(0,0,255);box-shadow:0 0 2px blue;fill:rgba(0,0,0,0.5)}'),
+    ('indexed rule kept in its @media', indexed,
+     u'a{x:y}\n@media print,screen{a{x:z}}',
+     u'a{x:y}\n@media print,screen{a{x:z}}'),
+    ('implied elements used', unused,
+     u'<p>a</p><table><tr><td>b</table>', [u'thead th']),
+    ('implied end tags and elements above the fold', above_fold,
+     u'<div data-above-fold><ul><li>a<li>b</ul>'
+     u'<table><tr><td>c</table></div><footer>d</footer>',
+     u'html{x:y}\nli+li{x:y}\ntbody td{x:y}'),
+)
+
+class RegressionTest(unittest.TestCase):
+    pass
+
+def _test(function, data, expected):
+    def test(self):
+        self.assertEqual(function(data), expected)
+    return test
+
+for _i, (_name, _function, _data, _expected) in enumerate(cases):
+    setattr(RegressionTest,
+            'test_%02d_%s' % (_i, re.sub(r'\W+', '_', _name).strip('_')),
+            _test(_function, _data, _expected))
+del _i, _name, _function, _data, _expected
+
+if '__main__' == __name__:
+    unittest.main()
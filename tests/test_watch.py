@@ -0,0 +1,60 @@
+# -*- coding: utf-8 -*-
+'''
+Watching a stylesheet given by a relative path, as `parse.py --watch`
+does.
+'''
+
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir))
+
+from css import parse, serialize, watch
+
+class RelativePathTest(unittest.TestCase):
+    def setUp(self):
+        self.cwd = os.getcwd()
+        self.directory = tempfile.mkdtemp()
+        os.chdir(self.directory)
+        self.write('a.css', 'a{color:red}')
+
+    def tearDown(self):
+        os.chdir(self.cwd)
+        shutil.rmtree(self.directory)
+
+    def write(self, name, data, mtime=None):
+        f = open(name, 'wb')
+        try:
+            f.write(data)
+        finally:
+            f.close()
+        if mtime is not None:
+            os.utime(name, (mtime, mtime))
+
+    def test_url(self):
+        url = parse._url('a.css')
+        self.assertTrue(url.startswith('file://'))
+        self.assertEqual(parse._filename(url),
+                         os.path.join(os.path.realpath(self.directory),
+                                      'a.css'))
+
+    def test_url_of_url(self):
+        for url in ('http://example.com/a.css?v=1', 'file:///srv/a.css'):
+            self.assertEqual(parse._url(url), url)
+
+    def test_change_detected(self):
+        url = parse._url('a.css')
+        watcher = watch.Watcher([url])
+        self.assertEqual(serialize.serialize(watcher.output(url), unicode),
+                         u'a{color:red}')
+        self.write('a.css', 'a{color:blue}',
+                   os.stat('a.css').st_mtime + 10)
+        self.assertEqual(watcher.poll(), [url])
+        self.assertEqual(serialize.serialize(watcher.output(url), unicode),
+                         u'a{color:blue}')
+
+if '__main__' == __name__:
+    unittest.main()